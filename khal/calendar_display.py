@@ -21,7 +21,7 @@
 
 import calendar
 import datetime
-from locale import getlocale, setlocale, LC_ALL, LC_TIME
+from locale import getlocale, LC_TIME
 
 from click import style
 
@@ -29,9 +29,6 @@ from .terminal import colored
 from .utils import get_month_abbr_len
 
 
-setlocale(LC_ALL, '')
-
-
 def get_weekheader(firstweekday):
     try:
         mylocale = '.'.join(getlocale(LC_TIME))
@@ -52,20 +49,25 @@ def getweeknumber(date):
     return datetime.date.isocalendar(date)[1]
 
 
-def get_event_color(event, default_color):
-    """Because multi-line lambdas would be un-Pythonic
+def get_calendar_colors(collection, default_color):
+    """return the color of each calendar in `collection`, `default_color` for
+    calendars without a color of their own
+
+    :rtype: dict(str, str)
     """
-    if event.color == '':
-        return default_color
-    return event.color
+    return {calendar['name']: calendar['color'] or default_color
+            for calendar in collection.calendars}
 
 
-def str_highlight_day(day, devents, hmethod, default_color, multiple, color, bold_for_light_color):
+def str_highlight_day(day, dcolors, hmethod, default_color, multiple, color, bold_for_light_color):
     """returns a string with day highlighted according to configuration
+
+    :param dcolors: the colors of the calendars with events on `day`
+    :type dcolors: list(str)
     """
     dstr = str(day.day).rjust(2)
     if color == '':
-        dcolors = list(set(map(lambda x: get_event_color(x, default_color), devents)))
+        dcolors = sorted(set(dcolors))
         if len(dcolors) > 1:
             if multiple == '':
                 if hmethod == "foreground" or hmethod == "fg":
@@ -79,10 +81,7 @@ def str_highlight_day(day, devents, hmethod, default_color, multiple, color, bol
             else:
                 dcolor = multiple
         else:
-            if devents[0].color == '':
-                dcolor = default_color
-            else:
-                dcolor = devents[0].color
+            dcolor = dcolors[0]
     else:
         dcolor = color
     if dcolor != '':
@@ -95,7 +94,8 @@ def str_highlight_day(day, devents, hmethod, default_color, multiple, color, bol
 
 def str_week(week, today, collection=None,
              hmethod=None, default_color=None, multiple=None, color=None,
-             highlight_event_days=False, locale=None, bold_for_light_color=True):
+             highlight_event_days=False, locale=None, bold_for_light_color=True,
+             calendars_by_day=None, calendar_colors=None):
     """returns a string representing one week,
     if for day == today color is reversed
 
@@ -103,18 +103,30 @@ def str_week(week, today, collection=None,
     :type day: list()
     :param today: the date of today
     :type today: datetime.date
+    :param calendars_by_day: names of the calendars with events on each day of
+        `week` (and possibly others), if not given, they are fetched from
+        `collection`
+    :type calendars_by_day: dict(datetime.date, set(str))
+    :param calendar_colors: color of each calendar, see get_calendar_colors()
+    :type calendar_colors: dict(str, str)
     :return: string, which if printed on terminal appears to have length 20,
              but may contain ascii escape sequences
     :rtype: str
     """
+    if highlight_event_days:
+        if calendars_by_day is None:
+            calendars_by_day = collection.get_calendars_by_day(week[0], week[-1])
+        if calendar_colors is None:
+            calendar_colors = get_calendar_colors(collection, default_color)
     strweek = ''
     for day in week:
         if day == today:
             day = style(str(day.day).rjust(2), reverse=True)
         elif highlight_event_days:
-            devents = list(collection.get_events_on(day, minimal=True))
-            if len(devents) > 0:
-                day = str_highlight_day(day, devents, hmethod, default_color,
+            calendars = calendars_by_day.get(day)
+            if calendars:
+                dcolors = [calendar_colors[calendar] for calendar in calendars]
+                day = str_highlight_day(day, dcolors, hmethod, default_color,
                                         multiple, color, bold_for_light_color)
             else:
                 day = str(day.day).rjust(2)
@@ -141,6 +153,37 @@ def vertical_month(month=None,
     """
     returns a list() of str() of weeks for a vertical arranged calendar
 
+    see iter_vertical_month() for a description of the parameters
+
+    :returns: calendar strings,  may also include some
+              ANSI (color) escape strings
+    :rtype: list() of str()
+    """
+    return list(iter_vertical_month(
+        month=month, year=year, today=today, weeknumber=weeknumber, count=count,
+        firstweekday=firstweekday, collection=collection, hmethod=hmethod,
+        default_color=default_color, multiple=multiple, color=color,
+        highlight_event_days=highlight_event_days, locale=locale,
+        bold_for_light_color=bold_for_light_color))
+
+
+def iter_vertical_month(month=None,
+                        year=None,
+                        today=None,
+                        weeknumber=False,
+                        count=3,
+                        firstweekday=0,
+                        collection=None,
+                        hmethod='fg',
+                        default_color='',
+                        multiple='',
+                        color='',
+                        highlight_event_days=False,
+                        locale=None,
+                        bold_for_light_color=True):
+    """
+    yields str() of weeks for a vertical arranged calendar, one week at a time
+
     :param month: first month of the calendar,
                   if non given, current month is assumed
     :type month: int
@@ -156,7 +199,7 @@ def vertical_month(month=None,
     :type weeknumber: str/bool
     :returns: calendar strings,  may also include some
               ANSI (color) escape strings
-    :rtype: list() of str()
+    :rtype: iterator of str()
     """
     if month is None:
         month = datetime.date.today().month
@@ -165,18 +208,27 @@ def vertical_month(month=None,
     if today is None:
         today = datetime.date.today()
 
-    khal = list()
     w_number = '  ' if weeknumber == 'right' else ''
     calendar.setfirstweekday(firstweekday)
     weekheaders = get_weekheader(firstweekday)
     month_abbr_len = get_month_abbr_len()
-    khal.append(style(' ' * month_abbr_len + weekheaders + ' ' + w_number, bold=True))
+    last = style(' ' * month_abbr_len + weekheaders + ' ' + w_number, bold=True)
+    yield last
     _calendar = calendar.Calendar(firstweekday)
+    calendars_by_day = calendar_colors = None
+    if highlight_event_days:
+        # fetch the calendars with events for all displayed days at once
+        last_month = (year * 12 + month - 1) + count - 1
+        calendars_by_day = collection.get_calendars_by_day(
+            _calendar.monthdatescalendar(year, month)[0][0],
+            _calendar.monthdatescalendar(last_month // 12, last_month % 12 + 1)[-1][-1])
+        calendar_colors = get_calendar_colors(collection, default_color)
     for _ in range(count):
         for week in _calendar.monthdatescalendar(year, month):
             new_month = len([day for day in week if day.day == 1])
             strweek = str_week(week, today, collection, hmethod, default_color,
-                               multiple, color, highlight_event_days, locale, bold_for_light_color)
+                               multiple, color, highlight_event_days, locale, bold_for_light_color,
+                               calendars_by_day, calendar_colors)
             if new_month:
                 m_name = style(calendar.month_abbr[week[6].month].ljust(month_abbr_len), bold=True)
             elif weeknumber == 'left':
@@ -189,10 +241,10 @@ def vertical_month(month=None,
                 w_number = ''
 
             sweek = m_name + strweek + w_number
-            if sweek != khal[-1]:
-                khal.append(sweek)
+            if sweek != last:
+                last = sweek
+                yield sweek
         month = month + 1
         if month > 12:
             month = 1
             year = year + 1
-    return khal
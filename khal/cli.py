@@ -21,9 +21,9 @@
 #
 import logging
 import sys
-import textwrap
+from datetime import timedelta
 from shutil import get_terminal_size
-import datetime
+from locale import setlocale, LC_ALL
 
 try:
     from setproctitle import setproctitle
@@ -33,12 +33,13 @@ except ImportError:
 
 import click
 
-from . import controllers, khalendar, __version__
+from . import __version__
 from .log import logger
-from .settings import get_config, InvalidSettingsError
-from .settings.exceptions import NoConfigFile
 from .exceptions import FatalError
-from .terminal import colored
+
+# month and weekday names (and all other date formatting) should follow the
+# user's locale
+setlocale(LC_ALL, '')
 
 
 days_option = click.option('--days', default=None, type=int,
@@ -48,6 +49,12 @@ week_option = click.option('--week', '-w',
 events_option = click.option('--events', default=None, type=int,
                              help='How many events to include.')
 dates_arg = click.argument('dates', nargs=-1)
+sync_option = click.option('--no-sync', is_flag=True,
+                           help=('Don\'t check the calendars for changes, only use '
+                                 'khal\'s cache.'))
+stream_option = click.option('--stream', is_flag=True,
+                             help=('Print each day as soon as it is ready instead of '
+                                   'printing everything at once.'))
 
 
 def time_args(f):
@@ -121,6 +128,23 @@ def calendar_option(f):
                         callback=_calendar_select_callback)(f)
 
 
+def json_options(f):
+    j = click.option('--json', 'output', flag_value='json',
+                     help=('Print events as a json array, one event per line.'))
+    n = click.option('--ndjson', 'output', flag_value='ndjson',
+                     help=('Print events as newline delimited json, one event per line.'))
+
+    return n(j(f))
+
+
+def _echo_rows(rows, stream):
+    if stream:
+        for row in rows:
+            click.echo(row)
+    else:
+        click.echo('\n'.join(rows))
+
+
 def global_options(f):
     def config_callback(ctx, option, config):
         prepare_context(ctx, config)
@@ -160,8 +184,15 @@ def global_options(f):
     return config(verbose(color(version(f))))
 
 
-def build_collection(conf, selection):
-    """build and return a khalendar.CalendarCollection from the configuration"""
+def build_collection(conf, selection, sync_interval=None, sync=True):
+    """build and return a khalendar.CalendarCollection from the configuration
+
+    :param sync_interval: see CalendarCollection.update_db()'s `max_age`
+    :type sync_interval: datetime.timedelta
+    :param sync: if False, the db is not updated from the vdirs
+    :type sync: bool
+    """
+    from . import khalendar
     try:
         props = dict()
         for name, cal in conf['calendars'].items():
@@ -182,6 +213,8 @@ def build_collection(conf, selection):
             default_color=conf['highlight_days']['default_color'],
             multiple=conf['highlight_days']['multiple'],
             highlight_event_days=conf['default']['highlight_event_days'],
+            sync_interval=sync_interval,
+            sync=sync,
         )
     except FatalError as error:
         logger.fatal(error)
@@ -191,6 +224,31 @@ def build_collection(conf, selection):
     return collection
 
 
+def query(ctx, name, sync=True, **kwargs):
+    """return the output rows of the read-only command `name`
+
+    the rows are computed by `khal serve`, if it is running, and in-process
+    otherwise, see controllers.QUERIES for the possible keyword arguments
+
+    :param sync: if False, the calendars are not checked for changes at all,
+        otherwise only if they have not been checked for [default]
+        sync_interval
+    :type sync: bool
+    """
+    from . import server
+    selection = ctx.obj.get('calendar_selection', None)
+    rows = server.request(ctx.obj['conf'], name, selection, kwargs, sync=sync)
+    if rows is None:
+        from . import controllers
+        if sync:
+            sync_interval = ctx.obj['conf']['default']['sync_interval']
+        else:
+            sync_interval = timedelta.max
+        collection = build_collection(ctx.obj['conf'], selection, sync_interval)
+        rows = controllers.QUERIES[name](collection, ctx.obj['conf'], **kwargs)
+    return rows
+
+
 class _NoConfig(object):
     def __getitem__(self, key):
         logger.fatal(
@@ -200,11 +258,13 @@ class _NoConfig(object):
 
 
 def prepare_context(ctx, config):
+    from .settings import get_config, InvalidSettingsError
+    from .settings.exceptions import NoConfigFile
     assert ctx.obj is None
 
     logger.debug('khal %s' % __version__)
     try:
-        conf = get_config(config)
+        conf = get_config(config, use_cache=True)
     except NoConfigFile:
         conf = _NoConfig()
     except InvalidSettingsError:
@@ -264,31 +324,25 @@ def _get_cli():
         is_flag=True)
     @click.option('--notstarted', help=('Print only events that have not started.'),
                   is_flag=True)
+    @stream_option
     @click.argument('DATERANGE', nargs=-1, required=False)
+    @sync_option
     @click.pass_context
-    def calendar(ctx, daterange, once, notstarted, format, day_format):
+    def calendar(ctx, daterange, once, notstarted, format, day_format, stream, no_sync):
         '''Print calendar with agenda.'''
         try:
-            rows = controllers.calendar(
-                build_collection(ctx.obj['conf'], ctx.obj.get('calendar_selection', None)),
-                agenda_format=format,
-                day_format=day_format,
+            rows = query(
+                ctx, 'calendar',
+                sync=not no_sync,
+                daterange=daterange,
                 once=once,
                 notstarted=notstarted,
-                daterange=daterange,
-                conf=ctx.obj['conf'],
-                firstweekday=ctx.obj['conf']['locale']['firstweekday'],
-                locale=ctx.obj['conf']['locale'],
-                weeknumber=ctx.obj['conf']['locale']['weeknumbers'],
-                hmethod=ctx.obj['conf']['highlight_days']['method'],
-                default_color=ctx.obj['conf']['highlight_days']['default_color'],
-                multiple=ctx.obj['conf']['highlight_days']['multiple'],
-                color=ctx.obj['conf']['highlight_days']['color'],
-                highlight_event_days=ctx.obj['conf']['default']['highlight_event_days'],
-                bold_for_light_color=ctx.obj['conf']['view']['bold_for_light_color'],
-                env={"calendars": ctx.obj['conf']['calendars']}
+                format=format,
+                day_format=day_format,
+                stream=stream,
+                width=get_terminal_size()[0],
             )
-            click.echo('\n'.join(rows))
+            _echo_rows(rows, stream)
         except FatalError as error:
             logger.fatal(error)
             sys.exit(1)
@@ -305,24 +359,28 @@ def _get_cli():
                   )
     @click.option('--notstarted', help=('Print only events that have not started.'),
                   is_flag=True)
+    @stream_option
+    @json_options
     @click.argument('DATERANGE', nargs=-1, required=False,
                     metavar='[DATETIME [DATETIME | RANGE]]')
+    @sync_option
     @click.pass_context
-    def klist(ctx, daterange, once, notstarted, format, day_format):
+    def klist(ctx, daterange, once, notstarted, format, day_format, stream, output, no_sync):
         """List all events between a start (default: today) and (optional)
         end datetime."""
         try:
-            event_column = controllers.khal_list(
-                build_collection(ctx.obj['conf'], ctx.obj.get('calendar_selection', None)),
-                agenda_format=format,
-                day_format=day_format,
+            rows = query(
+                ctx, 'list',
+                sync=not no_sync,
                 daterange=daterange,
                 once=once,
                 notstarted=notstarted,
-                conf=ctx.obj['conf'],
-                env={"calendars": ctx.obj['conf']['calendars']}
+                format=format,
+                day_format=day_format,
+                stream=stream,
+                output=output,
             )
-            click.echo('\n'.join(event_column))
+            _echo_rows(rows, stream or output)
         except FatalError as error:
             logger.fatal(error)
             sys.exit(1)
@@ -355,6 +413,7 @@ def _get_cli():
         assumed to be the event's summary, if two colons (::) are present,
         everything behind them is taken as the event's description.
         '''
+        from . import controllers
         if not info and not interactive:
                 raise click.BadParameter(
                     'no details provided, '
@@ -422,6 +481,7 @@ def _get_cli():
         each calendar's name or any unique prefix of a calendar's name.
 
         '''
+        from . import controllers
         if include_calendar:
             ctx.obj['calendar_selection'] = {include_calendar, }
         collection = build_collection(ctx.obj['conf'], ctx.obj.get('calendar_selection', None))
@@ -437,7 +497,8 @@ def _get_cli():
                 ics_strs = (sys.stdin.read(),)
                 sys.stdin = open('/dev/tty', 'r')
             else:
-                ics_strs = (ics_file.read() for ics_file in ics)
+                # the files' lines are read lazily while splitting them
+                ics_strs = ics
 
             for ics_str in ics_strs:
                 controllers.import_ics(
@@ -457,8 +518,11 @@ def _get_cli():
     @click.pass_context
     def interactive(ctx):
         '''Interactive UI. Also launchable via `ikhal`.'''
+        from . import controllers
+        # ikhal updates the db in the background
         controllers.interactive(
-            build_collection(ctx.obj['conf'], ctx.obj.get('calendar_selection', None)),
+            build_collection(
+                ctx.obj['conf'], ctx.obj.get('calendar_selection', None), sync=False),
             ctx.obj['conf']
         )
 
@@ -468,8 +532,11 @@ def _get_cli():
     @click.pass_context
     def interactive_cli(ctx):
         '''Interactive UI. Also launchable via `khal interactive`.'''
+        from . import controllers
+        # ikhal updates the db in the background
         controllers.interactive(
-            build_collection(ctx.obj['conf'], ctx.obj.get('calendar_selection', None)),
+            build_collection(
+                ctx.obj['conf'], ctx.obj.get('calendar_selection', None), sync=False),
             ctx.obj['conf'])
 
     @cli.command()
@@ -511,20 +578,22 @@ def _get_cli():
     @click.argument('ics', type=click.File('rb'), required=False)
     @click.option('--format', '-f',
                   help=('The format to print the event.'))
+    @json_options
     @click.pass_context
-    def printics(ctx, ics, format):
+    def printics(ctx, ics, format, output):
         '''Print an ics file (or read from stdin) without importing it.
 
         Just print the ics file, do nothing else.'''
+        from . import controllers
         try:
             if ics:
-                ics_str = ics.read()
+                ics_str = ics
                 name = ics.name
             else:
                 ics_str = sys.stdin.read()
                 name = 'stdin input'
                 sys.stdin = open('/dev/tty', 'r')
-            controllers.print_ics(ctx.obj['conf'], name, ics_str, format)
+            controllers.print_ics(ctx.obj['conf'], name, ics_str, format, output)
         except FatalError as error:
             logger.fatal(error)
             sys.exit(1)
@@ -533,31 +602,32 @@ def _get_cli():
     @multi_calendar_option
     @click.option('--format', '-f',
                   help=('The format of the events.'))
+    @json_options
+    @click.option('--from', 'start', metavar='DATETIME',
+                  help=('Only show events taking place (or ending) after DATETIME.'))
+    @click.option('--to', 'end', metavar='DATETIME',
+                  help=('Only show events taking place (or starting) before DATETIME.'))
     @click.argument('search_string')
+    @sync_option
     @click.pass_context
-    def search(ctx, format, search_string):
+    def search(ctx, format, search_string, output, start, end, no_sync):
         '''Search for events matching SEARCH_STRING.
 
         For repetitive events only one event is currently shown.
         '''
-        # TODO support for time ranges, location, description etc
-        if format is None:
-            format = ctx.obj['conf']['view']['event_format']
+        # TODO support for location, description etc
         try:
-            collection = build_collection(ctx.obj['conf'], ctx.obj.get('calendar_selection', None))
-            events = sorted(collection.search(search_string))
-            event_column = list()
-            term_width, _ = get_terminal_size()
-            now = datetime.datetime.now()
-            env = {"calendars": ctx.obj['conf']['calendars']}
-            for event in events:
-                desc = textwrap.wrap(event.format(format, relative_to=now, env=env), term_width)
-                event_column.extend(
-                    [colored(d, event.color,
-                             bold_for_light_color=ctx.obj['conf']['view']['bold_for_light_color'])
-                     for d in desc]
-                )
-            click.echo('\n'.join(event_column))
+            rows = query(
+                ctx, 'search',
+                sync=not no_sync,
+                search_string=search_string,
+                format=format,
+                output=output,
+                width=get_terminal_size()[0],
+                start=start.split() if start else None,
+                end=end.split() if end else None,
+            )
+            _echo_rows(rows, output)
         except FatalError as error:
             logger.fatal(error)
             sys.exit(1)
@@ -572,6 +642,7 @@ def _get_cli():
     @click.pass_context
     def edit(ctx, format, search_string, show_past):
         '''Interactively edit (or delete) events matching the search string.'''
+        from . import controllers
         try:
             controllers.edit(
                 build_collection(ctx.obj['conf'], ctx.obj.get('calendar_selection', None)),
@@ -593,24 +664,41 @@ def _get_cli():
                   help=('The format of the day line.'))
     @click.option('--notstarted', help=('Print only events that have not started'),
                   is_flag=True)
+    @json_options
     @click.argument('DATETIME', nargs=-1, required=False, metavar='[[START DATE] TIME | now]')
+    @sync_option
     @click.pass_context
-    def at(ctx, datetime, notstarted, format, day_format):
+    def at(ctx, datetime, notstarted, format, day_format, output, no_sync):
         '''Print all events at a specific datetime (defaults to now).'''
         if not datetime:
             datetime = ("now",)
         try:
-            rows = controllers.khal_list(
-                build_collection(ctx.obj['conf'], ctx.obj.get('calendar_selection', None)),
-                agenda_format=format,
-                day_format=day_format,
-                datepoint=list(datetime),
-                once=True,
+            rows = query(
+                ctx, 'at',
+                sync=not no_sync,
+                datetime=datetime,
                 notstarted=notstarted,
-                conf=ctx.obj['conf'],
-                env={"calendars": ctx.obj['conf']['calendars']}
+                format=format,
+                day_format=day_format,
+                output=output,
             )
-            click.echo('\n'.join(rows))
+            _echo_rows(rows, output)
+        except FatalError as error:
+            logger.fatal(error)
+            sys.exit(1)
+
+    @cli.command()
+    @click.pass_context
+    def serve(ctx):
+        '''Answer queries of other khal instances.
+
+        Keeps the calendars in memory and answers the `calendar`, `list`, `at`
+        and `search` commands of all other khal instances using the same
+        configuration, which are much faster that way. Runs until interrupted.
+        '''
+        from . import server
+        try:
+            server.serve(ctx.obj['conf'], build_collection)
         except FatalError as error:
             logger.fatal(error)
             sys.exit(1)
@@ -28,21 +28,28 @@ from .exceptions import ConfigurationError
 
 import pytz
 
-from collections import defaultdict, OrderedDict
+from collections import OrderedDict
+from itertools import islice
 from shutil import get_terminal_size
 
 from datetime import time, timedelta, datetime, date
+import json
 import os
 import textwrap
+from time import monotonic
 
 from khal import utils, calendar_display
 from khal.khalendar.exceptions import ReadOnlyCalendarError, DuplicateUid
 from khal.exceptions import FatalError
 from khal.khalendar.event import Event
 from khal.khalendar.backend import sort_key
+from khal.khalendar.utils import merge_events, to_unix_time
 from khal import __version__, __productname__
 from khal.log import logger
-from .terminal import merge_columns
+from .terminal import colored, merge_columns, iter_merge_columns
+
+# number of days fetched from the database at once when streaming output
+STREAM_CHUNKSIZE = 7
 
 
 def format_day(day, format_string, locale, attributes=None):
@@ -79,8 +86,18 @@ def calendar(collection, agenda_format=None, notstarted=False, once=False, dater
              full=False,
              bold_for_light_color=True,
              env=None,
+             stream=False,
+             width=None,
              ):
-    term_width, _ = get_terminal_size()
+    """returns the rows of the calendar and the agenda next to it
+
+    if `stream` is True, an iterator is returned instead of a list, which
+    produces the rows day by day (and week by week) while they are printed
+
+    :param width: width of the output, defaults to the terminal's width
+    :type width: int
+    """
+    term_width = width or get_terminal_size()[0]
     lwidth = 27 if conf['locale']['weeknumbers'] == 'right' else 25
     rwidth = term_width - lwidth - 4
 
@@ -93,7 +110,7 @@ def calendar(collection, agenda_format=None, notstarted=False, once=False, dater
     except ValueError as error:
         raise FatalError(error)
 
-    event_column = khal_list(
+    event_column = iter_khal_list(
         collection,
         daterange,
         conf=conf,
@@ -103,8 +120,9 @@ def calendar(collection, agenda_format=None, notstarted=False, once=False, dater
         notstarted=notstarted,
         width=rwidth,
         env=env,
+        chunksize=STREAM_CHUNKSIZE if stream else None,
     )
-    calendar_column = calendar_display.vertical_month(
+    calendar_column = calendar_display.iter_vertical_month(
         month=start.month,
         year=start.year,
         count=max(3, (end.year - start.year) * 12 + end.month - start.month + 1),
@@ -117,7 +135,9 @@ def calendar(collection, agenda_format=None, notstarted=False, once=False, dater
         highlight_event_days=highlight_event_days,
         locale=locale,
         bold_for_light_color=bold_for_light_color)
-    return merge_columns(calendar_column, event_column, width=lwidth)
+    if stream:
+        return iter_merge_columns(calendar_column, event_column, width=lwidth)
+    return merge_columns(list(calendar_column), list(event_column), width=lwidth)
 
 
 def start_end_from_daterange(daterange, locale,
@@ -166,11 +186,6 @@ def get_events_between(
     :returns: a list to be printed as the agenda for the given days
     :rtype: list(str)
     """
-    assert not (notstarted and not original_start)
-
-    event_list = []
-    if env is None:
-        env = {}
     assert start
     assert end
     start_local = locale['local_timezone'].localize(start)
@@ -179,20 +194,33 @@ def get_events_between(
     start = start_local.replace(tzinfo=None)
     end = end_local.replace(tzinfo=None)
 
-    events = sorted(collection.get_localized(start_local, end_local))
-    events_float = sorted(collection.get_floating(start, end))
-    events = sorted(events + events_float)
-    for event in events:
-        # yes the logic could be simplified, but I believe it's easier
-        # to understand what's going on here this way
-        if notstarted:
-            if event.allday and event.start < original_start.date():
-                    continue
-            elif not event.allday and event.start_local < original_start:
-                    continue
-        if seen is not None and event.uid in seen:
-            continue
+    events = collection.get_localized(start_local, end_local)
+    events_float = collection.get_floating(start, end)
+    return _format_events(
+        events, events_float, start, end, locale, agenda_format=agenda_format,
+        notstarted=notstarted, env=env, width=width, seen=seen,
+        original_start=original_start,
+    )
+
 
+def _format_events(events, events_float, start, end, locale, agenda_format=None,
+                   notstarted=False, env=None, width=None, seen=None, original_start=None):
+    """merge, filter and format the localized and floating events of a time range
+
+    see get_events_between() for an explanation of the parameters
+
+    :param events: localized events between start and end, sorted by start
+    :type events: iterable(Event)
+    :param events_float: floating events between start and end, sorted by start
+    :type events_float: iterable(Event)
+    :rtype: list(str)
+    """
+    event_list = []
+    if env is None:
+        env = {}
+
+    for event in _filter_events(events, events_float, locale, notstarted=notstarted,
+                                seen=seen, original_start=original_start):
         try:
             event_string = event.format(agenda_format, relative_to=(start, end), env=env)
         except KeyError as error:
@@ -202,17 +230,112 @@ def get_events_between(
             event_list += utils.color_wrap(event_string, width)
         else:
             event_list.append(event_string)
+
+    return event_list
+
+
+def _filter_events(events, events_float, locale, notstarted=False, seen=None,
+                   original_start=None):
+    """merge the localized and floating events of a time range and drop
+    those that have already started (if `notstarted`) or been `seen`
+
+    :rtype: iterator(Event)
+    """
+    assert not (notstarted and not original_start)
+
+    for event in merge_events(events, events_float, locale['local_timezone']):
+        # yes the logic could be simplified, but I believe it's easier
+        # to understand what's going on here this way
+        if notstarted:
+            if event.allday and event.start < original_start.date():
+                    continue
+            elif not event.allday and event.start_local < original_start:
+                    continue
+        if seen is not None and event.uid in seen:
+            continue
         if seen is not None:
             seen.add(event.uid)
+        yield event
 
-    return event_list
+
+def event_record(event, local_timezone):
+    """return the fields of `event` used for json output
+
+    start and end are given in unix time, allday events start and end at
+    midnight in `local_timezone`, end is exclusive
+
+    :type event: khal.khalendar.event.Event
+    :type local_timezone: pytz.timezone
+    :rtype: OrderedDict
+    """
+    if event.allday:
+        start = local_timezone.localize(datetime.combine(event.start, time.min))
+        end = local_timezone.localize(
+            datetime.combine(event.end + timedelta(days=1), time.min))
+    else:
+        start, end = event.start_local, event.end_local
+    return OrderedDict([
+        ('uid', str(event.uid)),
+        ('summary', event.summary),
+        ('start', to_unix_time(start)),
+        ('end', to_unix_time(end)),
+        ('allday', event.allday),
+        ('calendar', event.calendar),
+        ('location', str(event.location)),
+        ('recurring', event.recurring),
+    ])
+
+
+def json_lines(records, ndjson=False):
+    """yield `records` serialized as json, one record per line
+
+    if `ndjson` is True, each line is a json document on its own, otherwise
+    all lines together form one json array
+
+    :type records: iterable(dict)
+    :type ndjson: bool
+    :rtype: iterator(str)
+    """
+    if ndjson:
+        for record in records:
+            yield json.dumps(record, ensure_ascii=False)
+        return
+    yield '['
+    previous = None
+    for record in records:
+        if previous is not None:
+            yield previous + ','
+        previous = json.dumps(record, ensure_ascii=False)
+    if previous is not None:
+        yield previous
+    yield ']'
 
 
 def khal_list(collection, daterange=None, conf=None, agenda_format=None,
               day_format=None, once=False, notstarted=False, width=False,
               env=None, datepoint=None):
-    assert daterange is not None or datepoint is not None
     """returns a list of all events in `daterange`"""
+    return list(iter_khal_list(
+        collection, daterange=daterange, conf=conf, agenda_format=agenda_format,
+        day_format=day_format, once=once, notstarted=notstarted, width=width,
+        env=env, datepoint=datepoint,
+    ))
+
+
+def iter_khal_list(collection, daterange=None, conf=None, agenda_format=None,
+                   day_format=None, once=False, notstarted=False, width=False,
+                   env=None, datepoint=None, chunksize=None, records=False):
+    """yields the lines of khal_list() day by day
+
+    :param chunksize: number of days to fetch from the database at once, if
+        None, all days are fetched with a single query before the first line
+        is yielded
+    :type chunksize: int
+    :param records: if True, yield an event_record() for each event instead of
+        formatted lines (and no day headings)
+    :type records: bool
+    """
+    assert daterange is not None or datepoint is not None
     # because empty strings are also Falsish
     if agenda_format is None:
         agenda_format = conf['view']['agenda_event_format']
@@ -245,32 +368,176 @@ def khal_list(collection, daterange=None, conf=None, agenda_format=None,
             )
         logger.debug('Getting all events between {} and {}'.format(start, end))
 
-    event_column = []
+    empty = True
     once = set() if once else None
     if env is None:
         env = {}
 
     original_start = conf['locale']['local_timezone'].localize(start)
+    days = _day_bounds(start, end)
+    while True:
+        chunk = list(islice(days, chunksize))
+        if not chunk:
+            break
+        # events spanning several days of a chunk are only fetched and parsed once
+        by_day = collection.get_events_by_day(chunk)
+        for (start, day_end), (events, events_float) in zip(chunk, by_day):
+            if records:
+                for event in _filter_events(
+                        events, events_float, conf['locale'], notstarted=notstarted,
+                        seen=once, original_start=original_start):
+                    yield event_record(event, conf['locale']['local_timezone'])
+                continue
+            current_events = _format_events(
+                events, events_float, start=start, end=day_end, locale=conf['locale'],
+                agenda_format=agenda_format,
+                notstarted=notstarted, original_start=original_start,
+                env=env,
+                seen=once,
+                width=width,
+            )
+            if day_format and (conf['default']['show_all_days'] or current_events):
+                empty = False
+                yield format_day(start.date(), day_format, conf['locale'])
+            for line in current_events:
+                empty = False
+                yield line
+
+    if empty and not records:
+        yield style('No events', bold=True)
+
+
+def _day_bounds(start, end):
+    """yield (start, end) of each day between `start` and `end`
+
+    the first day starts at `start`, the last one ends at `end`, all others
+    span the whole day
+
+    :type start: datetime.datetime
+    :type end: datetime.datetime
+    """
     while start < end:
         if start.date() == end.date():
             day_end = end
         else:
             day_end = datetime.combine(start.date(), time.max)
-        current_events = get_events_between(
-            collection, locale=conf['locale'], agenda_format=agenda_format, start=start,
-            end=day_end, notstarted=notstarted, original_start=original_start,
-            env=env,
-            seen=once,
-            width=width,
-        )
-        if day_format and (conf['default']['show_all_days'] or current_events):
-            event_column.append(format_day(start.date(), day_format, conf['locale']))
-        event_column.extend(current_events)
+        yield start, day_end
         start = datetime(*start.date().timetuple()[:3]) + timedelta(days=1)
 
-    if event_column == []:
-        event_column = [style('No events', bold=True)]
-    return event_column
+
+def query_calendar(collection, conf, daterange=(), once=False, notstarted=False,
+                   format=None, day_format=None, stream=False, width=None):
+    """rows printed by `khal calendar`"""
+    return calendar(
+        collection,
+        agenda_format=format,
+        day_format=day_format,
+        once=once,
+        notstarted=notstarted,
+        daterange=daterange,
+        conf=conf,
+        firstweekday=conf['locale']['firstweekday'],
+        locale=conf['locale'],
+        weeknumber=conf['locale']['weeknumbers'],
+        hmethod=conf['highlight_days']['method'],
+        default_color=conf['highlight_days']['default_color'],
+        multiple=conf['highlight_days']['multiple'],
+        color=conf['highlight_days']['color'],
+        highlight_event_days=conf['default']['highlight_event_days'],
+        bold_for_light_color=conf['view']['bold_for_light_color'],
+        env={"calendars": conf['calendars']},
+        stream=stream,
+        width=width,
+    )
+
+
+def query_list(collection, conf, daterange=(), once=False, notstarted=False,
+               format=None, day_format=None, stream=False, output=None):
+    """rows printed by `khal list`"""
+    rows = iter_khal_list(
+        collection,
+        agenda_format=format,
+        day_format=day_format,
+        daterange=daterange,
+        once=once,
+        notstarted=notstarted,
+        conf=conf,
+        env={"calendars": conf['calendars']},
+        chunksize=STREAM_CHUNKSIZE if stream else None,
+        records=bool(output),
+    )
+    if output:
+        rows = json_lines(rows, ndjson=output == 'ndjson')
+    return rows
+
+
+def query_at(collection, conf, datetime=('now', ), notstarted=False,
+             format=None, day_format=None, output=None):
+    """rows printed by `khal at`"""
+    rows = iter_khal_list(
+        collection,
+        agenda_format=format,
+        day_format=day_format,
+        datepoint=list(datetime),
+        once=True,
+        notstarted=notstarted,
+        conf=conf,
+        env={"calendars": conf['calendars']},
+        records=bool(output),
+    )
+    if output:
+        rows = json_lines(rows, ndjson=output == 'ndjson')
+    return rows
+
+
+def query_search(collection, conf, search_string, format=None, output=None, width=None,
+                 start=None, end=None):
+    """rows printed by `khal search`
+
+    :param start: only show events with an instance ending after `start`
+    :type start: list(str)
+    :param end: only show events with an instance beginning before `end`,
+        if only a date is given, events on that day are still shown
+    :type end: list(str)
+    """
+    def parse(dtime_list):
+        try:
+            return utils.guessdatetimefstr(list(dtime_list), conf['locale'], date.today())
+        except ValueError:
+            raise FatalError('Invalid value of `{}` for a datetime'.format(' '.join(dtime_list)))
+
+    if start:
+        start, _ = parse(start)
+    if end:
+        end, allday = parse(end)
+        if allday:
+            end += timedelta(days=1)
+    events = sorted(collection.search(search_string, start=start or None, end=end or None))
+    if output:
+        records = (event_record(event, conf['locale']['local_timezone']) for event in events)
+        return json_lines(records, ndjson=output == 'ndjson')
+    if format is None:
+        format = conf['view']['event_format']
+    term_width = width or get_terminal_size()[0]
+    now = datetime.now()
+    env = {"calendars": conf['calendars']}
+    rows = list()
+    for event in events:
+        desc = textwrap.wrap(event.format(format, relative_to=now, env=env), term_width)
+        rows.extend(
+            [colored(d, event.color, bold_for_light_color=conf['view']['bold_for_light_color'])
+             for d in desc]
+        )
+    return rows
+
+
+# the read-only commands, which can also be answered by `khal serve`
+QUERIES = {
+    'calendar': query_calendar,
+    'list': query_list,
+    'at': query_at,
+    'search': query_search,
+}
 
 
 def new_interactive(collection, calendar_name, conf, info, location=None,
@@ -505,13 +772,8 @@ def edit(collection, search_string, locale, format=None, allow_past=False, conf=
     term_width, _ = get_terminal_size()
     now = conf['locale']['local_timezone'].localize(datetime.now())
 
-    events = sorted(collection.search(search_string))
+    events = sorted(collection.search(search_string, start=None if allow_past else now))
     for event in events:
-        if not allow_past:
-            if event.allday and event.end < now.date():
-                    continue
-            elif not event.allday and event.end_local < now:
-                    continue
         event_text = textwrap.wrap(event.format(format, relative_to=now), term_width)
         echo(''.join(event_text))
         if not edit_event(event, collection, locale, allow_quit=True, width=term_width):
@@ -533,6 +795,8 @@ def interactive(collection, conf):
 def import_ics(collection, conf, ics, batch=False, random_uid=False, format=None,
                env=None):
     """
+    :param ics: the content of an ics file or an iterable of its lines
+    :type ics: str or bytes or iterable
     :param batch: setting this to True will insert without asking for approval,
                   even when an event with the same uid already exists
     :type batch: bool
@@ -543,11 +807,30 @@ def import_ics(collection, conf, ics, batch=False, random_uid=False, format=None
     """
     if format is None:
         format = conf['view']['event_format']
-    vevents = utils.split_ics(ics, random_uid, conf['locale']['default_timezone'])
+    vevents = utils.iter_split_ics(ics, random_uid)
+    if batch:
+        import_batch(vevents, collection)
+        return
     for vevent in vevents:
         import_event(vevent, collection, conf['locale'], batch, format, env)
 
 
+def import_batch(vevents, collection):
+    """import all events into the default calendar without asking any questions
+
+    all events are written first and synced to disk together, and inserted
+    into the database in one transaction, see CalendarCollection.import_items()
+
+    :type vevents: iterable(str)
+    """
+    calendar_name = _import_calendar_name(collection, batch=True)
+    start = monotonic()
+    count = collection.import_items((Item(vevent) for vevent in vevents), calendar_name)
+    duration = monotonic() - start
+    logger.info('Imported {} events into `{}` in {:.2f}s ({:.0f} events/s)'.format(
+        count, calendar_name, duration, count / duration if duration else count))
+
+
 def import_event(vevent, collection, locale, batch, format=None, env=None):
     """import one event into collection, let user choose the collection
 
@@ -563,7 +846,22 @@ def import_event(vevent, collection, locale, batch, format=None, env=None):
                     [item], calendar=collection.default_calendar_name, locale=locale)
                 echo(event.format(format, datetime.now(), env=env))
 
-    # get the calendar to insert into
+    calendar_name = _import_calendar_name(collection, batch)
+
+    if batch or confirm("Do you want to import this event into `{}`?".format(calendar_name)):
+        try:
+            collection.new(Item(vevent), collection=calendar_name)
+        except DuplicateUid:
+            if batch or confirm(
+                    "An event with the same UID already exists. Do you want to update it?"):
+                collection.force_update(Item(vevent), collection=calendar_name)
+            else:
+                logger.warning("Not importing event with UID `{}`".format(event.uid))
+
+
+def _import_calendar_name(collection, batch):
+    """get the calendar to insert into, ask the user if there is more than
+    one writable calendar and `batch` is not set"""
     if not collection.writable_names:
         raise ConfigurationError('No writable calendars found, aborting import.')
     if len(collection.writable_names) == 1:
@@ -590,31 +888,32 @@ def import_event(vevent, collection, locale, batch, format=None, env=None):
                     break
             echo('invalid choice')
     assert calendar_name in collection.writable_names
+    return calendar_name
 
-    if batch or confirm("Do you want to import this event into `{}`?".format(calendar_name)):
-        try:
-            collection.new(Item(vevent), collection=calendar_name)
-        except DuplicateUid:
-            if batch or confirm(
-                    "An event with the same UID already exists. Do you want to update it?"):
-                collection.force_update(Item(vevent), collection=calendar_name)
-            else:
-                logger.warning("Not importing event with UID `{}`".format(event.uid))
 
+def print_ics(conf, name, ics, format, output=None):
+    """print the events in `ics`
 
-def print_ics(conf, name, ics, format):
+    :param ics: the content of an ics file or an iterable of its lines
+    :type ics: str or bytes or iterable
+    :param output: 'json' or 'ndjson' to print events as json records instead
+        of formatting them with `format`
+    :type output: str
+    """
     if format is None:
         format = conf['view']['agenda_event_format']
-    cal = icalendar.Calendar.from_ical(ics)
-    events = [item for item in cal.walk() if item.name == 'VEVENT']
-    events_grouped = defaultdict(list)
-    for event in events:
-        events_grouped[event['UID']].append(event)
-
     vevents = list()
-    for uid in events_grouped:
-        vevents.append(sorted(events_grouped[uid], key=sort_key))
-
+    for ics_str in utils.iter_split_ics(ics):
+        cal = icalendar.Calendar.from_ical(ics_str)
+        vevents.append(
+            sorted((item for item in cal.walk() if item.name == 'VEVENT'), key=sort_key))
+
+    if output:
+        events = (Event.fromVEvents(sub_event, locale=conf['locale']) for sub_event in vevents)
+        records = (event_record(event, conf['locale']['local_timezone']) for event in events)
+        for line in json_lines(records, ndjson=output == 'ndjson'):
+            echo(line)
+        return
     echo('{} events found in {}'.format(len(vevents), name))
     for sub_event in vevents:
         event = Event.fromVEvents(sub_event, locale=conf['locale'])
@@ -31,6 +31,7 @@ note on naming:
 # TODO remove creating Events from SQLiteDb
 # we currently expect str/CALENDAR objects but return Event(), we should
 # accept and return the same kind of events
+from bisect import bisect_right
 import contextlib
 from datetime import datetime, timedelta
 from os import makedirs, path
@@ -195,6 +196,10 @@ class SQLiteDb(object):
             calendar TEXT NOT NULL,
             primary key (href, rec_inst, calendar)
             );''')
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS synced (
+            calendar TEXT NOT NULL UNIQUE,
+            time REAL NOT NULL
+            );''')
         self.conn.commit()
 
     def _check_calendars_exists(self):
@@ -402,6 +407,22 @@ class SQLiteDb(object):
         self.sql_ex(sql_s, stuple)
         self.conn.commit()
 
+    def get_synced(self, calendar):
+        """return when `calendar` was last synced with its vdir
+
+        :returns: unix time or None, if it was never synced (or the sync
+            wasn't recorded)
+        :rtype: float
+        """
+        sql_s = 'SELECT time FROM synced WHERE calendar = ?;'
+        result = self.sql_ex(sql_s, (calendar, ))
+        return result[0][0] if result else None
+
+    def set_synced(self, time, calendar):
+        """record that `calendar` was synced with its vdir at `time` (unix time)"""
+        sql_s = 'INSERT OR REPLACE INTO synced (calendar, time) VALUES (?, ?);'
+        self.sql_ex(sql_s, (calendar, time))
+
     def get_etag(self, href, calendar):
         """get etag for href
 
@@ -440,6 +461,27 @@ class SQLiteDb(object):
         sql_s = 'SELECT href, etag FROM events WHERE calendar = ?;'
         return list(set(self.sql_ex(sql_s, (calendar, ))))
 
+    def get_instances(self, href, calendar):
+        """return the time ranges of all instances of the event at `href`
+
+        :returns: pairs of naive (local) start and end datetimes
+        :rtype: list(tuple(datetime.datetime, datetime.datetime))
+        """
+        sql_s = ('SELECT dtstart, dtend, 0 FROM recs_loc WHERE href = ? AND calendar = ? '
+                 'UNION ALL '
+                 'SELECT dtstart, dtend, 1 FROM recs_float WHERE href = ? AND calendar = ?;')
+        result = self.sql_ex(sql_s, (href, calendar, href, calendar))
+        local_tz = self.locale['local_timezone']
+        instances = list()
+        for start, end, is_floating in result:
+            start = datetime.utcfromtimestamp(start)
+            end = datetime.utcfromtimestamp(end)
+            if not is_floating:
+                start = pytz.UTC.localize(start).astimezone(local_tz).replace(tzinfo=None)
+                end = pytz.UTC.localize(end).astimezone(local_tz).replace(tzinfo=None)
+            instances.append((start, end))
+        return instances
+
     def get_localized(self, start, end, minimal=False):
         """returns
         :type start: datetime.datetime
@@ -525,6 +567,113 @@ class SQLiteDb(object):
                 end = datetime.utcfromtimestamp(end)
                 yield self.construct_event(item, href, start, end, ref, etag, calendar, dtype)
 
+    def get_by_day(self, days):
+        """return localized and floating events for each time range in `days`
+
+        this returns the same events (and in the same order) for each time range
+        as get_localized() and get_floating() would, but needs only one query
+        per instance table for all time ranges and every event is only
+        constructed once, even if it takes place in several of them
+
+        :param days: sorted and non-overlapping time ranges (e.g., days) as
+            pairs of aware start and end datetimes
+        :type days: list(tuple(datetime.datetime, datetime.datetime))
+        :returns: localized and floating events for each time range in `days`
+        :rtype: list(tuple(list(Event), list(Event)))
+        """
+        localized = [list() for _ in days]
+        floating = [list() for _ in days]
+        if not days:
+            return list(zip(localized, floating))
+
+        bounds, bounds_float = _unix_bounds(days)
+        sql_s = (
+            'SELECT item, recs_loc.href, dtstart, dtend, ref, etag, dtype, events.calendar '
+            'FROM recs_loc JOIN events ON '
+            'recs_loc.href = events.href AND '
+            'recs_loc.calendar = events.calendar WHERE '
+            '(dtstart >= ? AND dtstart <= ? OR '
+            'dtend > ? AND dtend <= ? OR '
+            'dtstart <= ? AND dtend >= ?) AND events.calendar in ({0}) '
+            'ORDER BY dtstart')
+        start, end = bounds[0][0], bounds[-1][1]
+        stuple = (start, end, start, end, start, end)
+        result = self.sql_ex(sql_s.format(self._select_calendars), stuple)
+        for item, href, start, end, ref, etag, dtype, calendar in result:
+            event = None
+            for num in _overlapping(bounds, start, end, _overlaps_localized):
+                if event is None:
+                    event = self.construct_event(
+                        item, href,
+                        pytz.UTC.localize(datetime.utcfromtimestamp(start)),
+                        pytz.UTC.localize(datetime.utcfromtimestamp(end)),
+                        ref, etag, calendar, dtype)
+                localized[num].append(event)
+
+        sql_s = (
+            'SELECT item, recs_float.href, dtstart, dtend, ref, etag, dtype, events.calendar '
+            'FROM recs_float JOIN events ON '
+            'recs_float.href = events.href AND '
+            'recs_float.calendar = events.calendar WHERE '
+            '(dtstart >= ? AND dtstart < ? OR '
+            'dtend > ? AND dtend <= ? OR '
+            'dtstart <= ? AND dtend > ? ) AND events.calendar in ({0}) '
+            'ORDER BY dtstart')
+        start, end = bounds_float[0][0], bounds_float[-1][1]
+        stuple = (start, end, start, end, start, end)
+        result = self.sql_ex(sql_s.format(self._select_calendars), stuple)
+        for item, href, start, end, ref, etag, dtype, calendar in result:
+            event = None
+            for num in _overlapping(bounds_float, start, end, _overlaps_floating):
+                if event is None:
+                    event = self.construct_event(
+                        item, href,
+                        datetime.utcfromtimestamp(start),
+                        datetime.utcfromtimestamp(end),
+                        ref, etag, calendar, dtype)
+                floating[num].append(event)
+
+        return list(zip(localized, floating))
+
+    def get_calendars_by_day(self, days):
+        """return the names of the calendars with events in each time range
+
+        all time ranges are covered by a single query, see get_by_day()
+
+        :param days: sorted and non-overlapping time ranges (e.g., days) as
+            pairs of aware start and end datetimes
+        :type days: list(tuple(datetime.datetime, datetime.datetime))
+        :rtype: list(set(str))
+        """
+        calendars = [set() for _ in days]
+        if not days:
+            return calendars
+
+        bounds, bounds_float = _unix_bounds(days)
+        sql_s = (
+            'SELECT dtstart, dtend, calendar, 0 FROM recs_loc WHERE '
+            '(dtstart >= ? AND dtstart <= ? OR '
+            'dtend > ? AND dtend <= ? OR '
+            'dtstart <= ? AND dtend >= ?) AND calendar in ({0}) '
+            'UNION ALL '
+            'SELECT dtstart, dtend, calendar, 1 FROM recs_float WHERE '
+            '(dtstart >= ? AND dtstart < ? OR '
+            'dtend > ? AND dtend <= ? OR '
+            'dtstart <= ? AND dtend > ? ) AND calendar in ({0})')
+        start, end = bounds[0][0], bounds[-1][1]
+        start_float, end_float = bounds_float[0][0], bounds_float[-1][1]
+        stuple = (start, end, start, end, start, end,
+                  start_float, end_float, start_float, end_float, start_float, end_float)
+        result = self.sql_ex(sql_s.format(self._select_calendars), stuple)
+        for start, end, calendar, is_floating in result:
+            if is_floating:
+                matches = _overlapping(bounds_float, start, end, _overlaps_floating)
+            else:
+                matches = _overlapping(bounds, start, end, _overlaps_localized)
+            for num in matches:
+                calendars[num].add(calendar)
+        return calendars
+
     def get(self, href, start=None, end=None, ref=None, dtype=None, calendar=None):
         """returns the Event matching href
 
@@ -562,15 +711,172 @@ class SQLiteDb(object):
                                 ref=ref,
                                 )
 
-    def search(self, search_string):
-        """search for events matching `search_string`"""
-        sql_s = ('SELECT href, calendar FROM events '
-                 'WHERE item LIKE (?) and calendar in ({0});')
+    def search(self, search_string, start=None, end=None, calendars=None):
+        """search for events matching `search_string`
+
+        :param start: if given, only events with an instance ending after
+            `start` are returned
+        :type start: datetime.datetime
+        :param end: if given, only events with an instance beginning before
+            `end` are returned
+        :type end: datetime.datetime
+        :param calendars: if given, only search these calendars (of the ones
+            this db was set up with)
+        :type calendars: iterable(str)
+        """
+        for page in self.search_pages(search_string, None, start, end, calendars):
+            for event in page:
+                yield event
+
+    def search_pages(self, search_string, page_size, start=None, end=None, calendars=None):
+        """search for events matching `search_string`, page by page
+
+        every page is fetched with a query of its own, which continues after
+        the last event of the previous page, so the db is only searched (and
+        events are only parsed) as far as the pages are asked for
+
+        :param page_size: maximal number of events per page, if None, all
+            events are returned as a single page
+        :type page_size: int or None
+        :returns: lists of at most `page_size` events, see search() for the
+            other parameters
+        :rtype: iterator(list(Event))
+        """
+        assert start is None or start.tzinfo is not None
+        assert end is None or end.tzinfo is not None
+        if calendars is None:
+            calendars = self.calendars
+        else:
+            calendars = [calendar for calendar in self.calendars if calendar in calendars]
+        where = 'item LIKE (?) AND events.calendar IN ({0}) AND events.rowid > ?'.format(
+            ', '.join('?' * len(calendars)))
+        stuple = ('%{0}%'.format(search_string), ) + tuple(calendars)
+        if start is None and end is None:
+            sql_s = 'SELECT events.rowid, href, calendar FROM events WHERE ' + where
+        else:
+            # only look at events with at least one instance in the range, so
+            # we don't need to parse (and sort) all matching events
+            recs_where, params, params_float = list(), tuple(), tuple()
+            if start is not None:
+                recs_where.append('(dtend > ? OR dtstart >= ?)')
+                params += (utils.to_unix_time(start), ) * 2
+                params_float += (utils.to_unix_time(start.replace(tzinfo=None)), ) * 2
+            if end is not None:
+                recs_where.append('dtstart < ?')
+                params += (utils.to_unix_time(end), )
+                params_float += (utils.to_unix_time(end.replace(tzinfo=None)), )
+            sql_s = (
+                'SELECT DISTINCT events.rowid, events.href, events.calendar FROM events JOIN ('
+                'SELECT href, calendar FROM recs_loc WHERE {0} UNION '
+                'SELECT href, calendar FROM recs_float WHERE {0}) AS recs ON '
+                'events.href = recs.href AND events.calendar = recs.calendar '
+                'WHERE {1}').format(' AND '.join(recs_where), where)
+            stuple = params + params_float + stuple
+        sql_s += ' ORDER BY events.rowid'
+        if page_size is not None:
+            sql_s += ' LIMIT {0:d}'.format(page_size)
+        last_rowid = 0
+        while True:
+            result = self.sql_ex(sql_s + ';', stuple + (last_rowid, ))
+            if not result:
+                return
+            yield [self.get(href, calendar=calendar) for _, href, calendar in result]
+            if page_size is None or len(result) < page_size:
+                return
+            last_rowid = result[-1][0]
+
+    def search_ids(self, search_string, candidates=None):
+        """return the ids of all events matching `search_string`
+
+        only the ids are fetched, no events are constructed, see get_by_ids()
+
+        :param candidates: if given, only these events are searched, e.g., the
+            results of an earlier search for a part of `search_string`
+        :type candidates: list(int)
+        :returns: the ids of the matching events, in ascending order
+        :rtype: list(int)
+        """
+        sql_s = 'SELECT rowid FROM events WHERE item LIKE (?) AND calendar IN ({0})'.format(
+            self._select_calendars)
         stuple = ('%{0}%'.format(search_string), )
-        result = self.sql_ex(sql_s.format(self._select_calendars), stuple)
-        for href, calendar in result:
-            event = self.get(href, calendar=calendar)
-            yield event
+        if candidates is None:
+            return [rowid for rowid, in self.sql_ex(sql_s + ' ORDER BY rowid;', stuple)]
+        ids = list()
+        candidates = sorted(candidates)
+        # stay well below sqlite's limit on the number of parameters
+        for num in range(0, len(candidates), 500):
+            chunk = tuple(candidates[num:num + 500])
+            result = self.sql_ex(
+                sql_s + ' AND rowid IN ({0}) ORDER BY rowid;'.format(', '.join('?' * len(chunk))),
+                stuple + chunk)
+            ids.extend(rowid for rowid, in result)
+        return ids
+
+    def get_by_ids(self, ids):
+        """return the events with the given ids (as returned by search_ids())
+
+        events which have been deleted (or updated) since their ids were
+        looked up are skipped
+
+        :param ids: a few (e.g., a page of) ids
+        :type ids: list(int)
+        :rtype: list(Event)
+        """
+        if not ids:
+            return list()
+        sql_s = 'SELECT rowid, href, calendar FROM events WHERE rowid IN ({0});'.format(
+            ', '.join('?' * len(ids)))
+        rows = dict((rowid, (href, calendar))
+                    for rowid, href, calendar in self.sql_ex(sql_s, tuple(ids)))
+        return [self.get(rows[rowid][0], calendar=rows[rowid][1])
+                for rowid in ids if rowid in rows]
+
+
+def _overlaps_localized(dtstart, dtend, start, end):
+    """python version of the WHERE clause used in SQLiteDb.get_localized()"""
+    return (start <= dtstart <= end or
+            start < dtend <= end or
+            dtstart <= start and dtend >= end)
+
+
+def _overlaps_floating(dtstart, dtend, start, end):
+    """python version of the WHERE clause used in SQLiteDb.get_floating()"""
+    return (start <= dtstart < end or
+            start < dtend <= end or
+            dtstart <= start and dtend > end)
+
+
+def _unix_bounds(days):
+    """convert aware time ranges to unix time, once for comparing them to
+    localized and once for comparing them to floating instances
+
+    :type days: list(tuple(datetime.datetime, datetime.datetime))
+    :rtype: tuple(list(tuple(int, int)), list(tuple(int, int)))
+    """
+    bounds = [(utils.to_unix_time(start), utils.to_unix_time(end))
+              for start, end in days]
+    bounds_float = [(utils.to_unix_time(start.replace(tzinfo=None)),
+                     utils.to_unix_time(end.replace(tzinfo=None)))
+                    for start, end in days]
+    return bounds, bounds_float
+
+
+def _overlapping(bounds, dtstart, dtend, overlaps):
+    """yield the indices of all time ranges in `bounds` the instance from
+    `dtstart` to `dtend` is shown in
+
+    :param bounds: sorted and non-overlapping time ranges in unix time
+    :type bounds: list(tuple(int, int))
+    :param overlaps: either _overlaps_localized or _overlaps_floating
+    :type overlaps: callable
+    """
+    first = max(bisect_right(bounds, (dtstart, )) - 1, 0)
+    for num in range(first, len(bounds)):
+        start, end = bounds[num]
+        if start > dtend:
+            break
+        if overlaps(dtstart, dtend, start, end):
+            yield num
 
 
 def check_support(vevent, href, calendar):
@@ -22,6 +22,7 @@
 """This module contains the event model with all relevant subclasses and some
 helper functions."""
 
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
 from datetime import date, datetime, time, timedelta
 
@@ -748,35 +749,24 @@ def create_timezone(tz, first_date=None, last_date=None):
 
     first_date = datetime.today() if not first_date else to_naive_utc(first_date)
     last_date = datetime.today() if not last_date else to_naive_utc(last_date)
+
+    # looking for the first and last transition time we need to include,
+    # transition times are sorted, so we can bisect
+    transition_times = tz._utc_transition_times
+    first_num = max(bisect_left(transition_times, first_date) - 1, 0)
+    last_num = min(bisect_right(transition_times, last_date), len(transition_times) - 1)
+
+    key = (tz.zone, first_num, last_num)
+    if key in _VTIMEZONES:
+        return _VTIMEZONES[key]
+
     timezone = icalendar.Timezone()
     timezone.add('TZID', tz)
 
-    dst = {
-        one[2]: 'DST' in two.__repr__()
-        for one, two in iter(tz._tzinfos.items())
-    }
-    bst = {
-        one[2]: 'BST' in two.__repr__()
-        for one, two in iter(tz._tzinfos.items())
-    }
-
-    # looking for the first and last transition time we need to include
-    first_num, last_num = 0, len(tz._utc_transition_times) - 1
-    first_tt = tz._utc_transition_times[0]
-    last_tt = tz._utc_transition_times[-1]
-    for num, dt in enumerate(tz._utc_transition_times):
-        if dt > first_tt and dt < first_date:
-            first_num = num
-            first_tt = dt
-        if dt < last_tt and dt > last_date:
-            last_num = num
-            last_tt = dt
-
     timezones = dict()
-    for num in range(first_num, last_num + 1):
-        name = tz._transition_info[num][2]
+    for name, ttime, offset_to, offset_from, daylight in \
+            _get_transitions(tz, first_num, last_num):
         if name in timezones:
-            ttime = tz.fromutc(tz._utc_transition_times[num]).replace(tzinfo=None)
             if 'RDATE' in timezones[name]:
                 timezones[name]['RDATE'].dts.append(
                     icalendar.prop.vDDDTypes(ttime))
@@ -784,25 +774,81 @@ def create_timezone(tz, first_date=None, last_date=None):
                 timezones[name].add('RDATE', ttime)
             continue
 
-        if dst[name] or bst[name]:
+        if daylight:
             subcomp = icalendar.TimezoneDaylight()
         else:
             subcomp = icalendar.TimezoneStandard()
 
-        subcomp.add('TZNAME', tz._transition_info[num][2])
-        subcomp.add(
-            'DTSTART',
-            tz.fromutc(tz._utc_transition_times[num]).replace(tzinfo=None))
-        subcomp.add('TZOFFSETTO', tz._transition_info[num][0])
-        subcomp.add('TZOFFSETFROM', tz._transition_info[num - 1][0])
+        subcomp.add('TZNAME', name)
+        subcomp.add('DTSTART', ttime)
+        subcomp.add('TZOFFSETTO', offset_to)
+        subcomp.add('TZOFFSETFROM', offset_from)
         timezones[name] = subcomp
 
     for subcomp in timezones.values():
         timezone.add_component(subcomp)
 
+    _VTIMEZONES[key] = timezone
     return timezone
 
 
+# Generating VTIMEZONEs is rather costly, but most events (e.g., when importing
+# a large .ics file) share the same few timezones and similar date ranges.
+# _TRANSITIONS maps a timezone's name to the range of transitions (first and
+# last index into `_utc_transition_times`) we have looked at so far and those
+# transitions, _VTIMEZONES maps (name, first index, last index) to the
+# generated VTIMEZONE. The VTIMEZONEs returned by `create_timezone()` are
+# shared and therefore must not be modified.
+_TRANSITIONS = dict()
+_VTIMEZONES = dict()
+
+
+def _get_transitions(tz, first_num, last_num):
+    """return all transitions of `tz` from `first_num` to `last_num`
+
+    if the cached range of transitions for `tz` does not include the requested
+    range, it is widened to include it
+
+    :param tz: the timezone
+    :type tz: pytz.tzinfo.DstTzInfo
+    :type first_num: int
+    :type last_num: int
+    :returns: name, local transition time, offset to and offset from and if
+        this is a daylight saving time transition, for each transition
+    :rtype: list(tuple(str, datetime.datetime, timedelta, timedelta, bool))
+    """
+    try:
+        cached_first, cached_last, transitions = _TRANSITIONS[tz.zone]
+    except KeyError:
+        cached_first, cached_last, transitions = first_num, first_num - 1, []
+
+    if first_num < cached_first or last_num > cached_last:
+        daylight = {
+            one[2]: 'DST' in two.__repr__() or 'BST' in two.__repr__()
+            for one, two in iter(tz._tzinfos.items())
+        }
+
+        def transition(num):
+            name = tz._transition_info[num][2]
+            return (
+                name,
+                tz.fromutc(tz._utc_transition_times[num]).replace(tzinfo=None),
+                tz._transition_info[num][0],
+                tz._transition_info[num - 1][0],
+                daylight[name],
+            )
+
+        transitions = \
+            [transition(num) for num in range(first_num, cached_first)] + \
+            transitions + \
+            [transition(num) for num in range(cached_last + 1, last_num + 1)]
+        cached_first = min(first_num, cached_first)
+        cached_last = max(last_num, cached_last)
+        _TRANSITIONS[tz.zone] = cached_first, cached_last, transitions
+
+    return transitions[first_num - cached_first:last_num - cached_first + 1]
+
+
 def _create_timezone_static(tz):
     """create an icalendar vtimezone from a pytz.tzinfo.StaticTzInfo
 
@@ -25,10 +25,12 @@ CalendarCollection should enable modifying and querying a collection of
 calendars. Each calendar is defined by the contents of a vdir, but uses an
 SQLite db for caching (see backend if you're interested).
 """
+from collections import defaultdict
 import datetime
 import os
 import os.path
 import itertools
+import time
 
 from .vdir import CollectionNotFoundError, AlreadyExistingError, Vdir, \
     get_etag_from_file
@@ -67,7 +69,17 @@ class CalendarCollection(object):
                  highlight_event_days=0,
                  locale=None,
                  dbpath=None,
+                 sync_interval=None,
+                 sync=True,
                  ):
+        """
+        :param sync_interval: passed on to update_db() as `max_age`
+        :type sync_interval: datetime.timedelta
+        :param sync: if False, the db is not updated from the vdirs on
+            creation, call update_db() (or update it via a fork()) before
+            relying on it
+        :type sync: bool
+        """
         assert dbpath is not None
         assert calendars is not None
         self._calendars = calendars
@@ -97,7 +109,37 @@ class CalendarCollection(object):
         self._backend = backend.SQLiteDb(
             calendars=self.names, db_path=dbpath, locale=self._locale)
         self._last_ctags = dict()
-        self.update_db()
+        if sync:
+            self.update_db(max_age=sync_interval)
+
+    def fork(self):
+        """return a collection of the same calendars and db, but with a db
+        connection of its own
+
+        sqlite connections may only be used in the thread they were created
+        in, the fork should therefore be created in the thread it is going to
+        be used in. The fork does not update the db on creation.
+        """
+        return CalendarCollection(
+            calendars=self._calendars,
+            hmethod=self.hmethod,
+            default_color=self.default_color,
+            multiple=self.multiple,
+            color=self.color,
+            highlight_event_days=self.highlight_event_days,
+            locale=self._locale,
+            dbpath=self._backend.db_path,
+            sync=False,
+        )
+
+    @property
+    def sync_state(self):
+        """the ctags of the vdirs, as the db has last been updated to"""
+        return dict(self._last_ctags)
+
+    def set_sync_state(self, sync_state):
+        """take over the `sync_state` of a fork which updated the db"""
+        self._last_ctags.update(sync_state)
 
     @property
     def writable_names(self):
@@ -161,6 +203,47 @@ class CalendarCollection(object):
 
         return itertools.chain(floating_events, localized_events)
 
+    def get_events_by_day(self, days):
+        """return all localized and floating events for each time range in `days`
+
+        All events are fetched with a single query per instance table, an
+        event taking place in several time ranges is the same object in all
+        of them.
+
+        :param days: sorted and non-overlapping time ranges as pairs of naive
+            (local) start and end datetimes
+        :type days: list(tuple(datetime.datetime, datetime.datetime))
+        :rtype: list(tuple(list(Event), list(Event)))
+        """
+        localize = self._locale['local_timezone'].localize
+        by_day = self._backend.get_by_day(
+            [(localize(start), localize(end)) for start, end in days])
+        for events, events_float in by_day:
+            for event in itertools.chain(events, events_float):
+                self._cover_event(event)
+        return by_day
+
+    def get_calendars_by_day(self, start, end):
+        """return the names of the calendars with events on each day from
+        `start` to `end` (inclusive)
+
+        This needs only one query for all days, e.g., for highlighting all
+        days of a (multi-)month calendar.
+
+        :type start: datetime.date
+        :type end: datetime.date
+        :returns: the names of the calendars with events on that day, for each
+            day
+        :rtype: dict(datetime.date, set(str))
+        """
+        days = [start + datetime.timedelta(days=num)
+                for num in range((end - start).days + 1)]
+        localize = self._locale['local_timezone'].localize
+        bounds = [(localize(datetime.datetime.combine(day, datetime.time.min)),
+                   localize(datetime.datetime.combine(day, datetime.time.max)))
+                  for day in days]
+        return dict(zip(days, self._backend.get_calendars_by_day(bounds)))
+
     def update(self, event):
         """update `event` in vdir and db"""
         assert event.etag
@@ -210,12 +293,94 @@ class CalendarCollection(object):
             self._backend.update(event.raw, event.href, event.etag, calendar=calendar)
             self._backend.set_ctag(self._local_ctag(calendar), calendar=calendar)
 
+    def import_items(self, items, collection):
+        """save many new items to the vdir and the database at once
+
+        Unlike calling new() for each item, files are only synced to disk
+        once all of them have been written, all instances are inserted into
+        the database in a single transaction and the ctag is only updated at
+        the very end. Items with a UID that already exists in `collection`
+        replace the existing event, as force_update() does.
+
+        :param items: the items to import
+        :type items: iterable(vdir.Item)
+        :param collection: name of the calendar to import into
+        :type collection: str
+        :returns: number of imported items
+        :rtype: int
+        """
+        if self._calendars[collection]['readonly']:
+            raise ReadOnlyCalendarError()
+        storage = self._storages[collection]
+
+        count = 0
+        new_hrefs = list()
+        with self._backend.at_once():
+            for item in items:
+                try:
+                    href, etag = storage.upload(item, sync=False)
+                    new_hrefs.append(href)
+                except AlreadyExistingError as error:
+                    href = error.existing_href
+                    _, etag = storage.get(href)
+                    etag = storage.update(href, item, etag)
+                self._backend.update(item.raw, href, etag, calendar=collection)
+                count += 1
+            storage.sync(new_hrefs)
+            self._backend.set_ctag(self._local_ctag(collection), calendar=collection)
+        return count
+
     def delete(self, href, etag, calendar):
         if self._calendars[calendar]['readonly']:
             raise ReadOnlyCalendarError()
         self._storages[calendar].delete(href, etag)
         self._backend.delete(href, calendar=calendar)
 
+    def delete_many(self, events, instances=()):
+        """delete many events and instances of recurring events at once
+
+        Unlike calling delete() (or update() after deleting an instance) for
+        each of them, files are only synced to disk once all of them have been
+        deleted or rewritten, each event is only rewritten once, no matter how
+        many of its instances are deleted, the database is changed in a single
+        transaction and the ctags are only updated at the very end. Instances
+        of events which are deleted as well are ignored.
+
+        :param events: the events to delete
+        :type events: iterable(tuple(str, str, str)) of href, etag and calendar
+        :param instances: the instances to delete
+        :type instances: iterable(tuple(str, str, datetime)) of href,
+            calendar and the instance's recurrence id
+        """
+        events = list(events)
+        recurrence_ids = defaultdict(list)
+        for href, calendar, rec_id in instances:
+            recurrence_ids[(href, calendar)].append(rec_id)
+        for href, _, calendar in events:
+            recurrence_ids.pop((href, calendar), None)
+        calendars = set(calendar for _, _, calendar in events) | \
+            set(calendar for _, calendar in recurrence_ids)
+        for calendar in calendars:
+            if self._calendars[calendar]['readonly']:
+                raise ReadOnlyCalendarError()
+
+        updated = defaultdict(list)
+        with self._backend.at_once():
+            for href, etag, calendar in events:
+                self._storages[calendar].delete(href, etag, sync=False)
+                self._backend.delete(href, calendar=calendar)
+            for (href, calendar), rec_ids in recurrence_ids.items():
+                event = self.get_event(href, calendar)
+                for rec_id in rec_ids:
+                    event.delete_instance(rec_id)
+                event.etag = self._storages[calendar].update(
+                    href, event, event.etag, sync=False)
+                self._backend.update(event.raw, href, event.etag, calendar=calendar)
+                updated[calendar].append(href)
+            for calendar in calendars:
+                self._storages[calendar].sync(updated[calendar])
+                self._backend.set_ctag(self._local_ctag(calendar), calendar=calendar)
+
     def get_event(self, href, calendar):
         return self._cover_event(self._backend.get(href, calendar=calendar))
 
@@ -231,14 +396,43 @@ class CalendarCollection(object):
         calendar = collection or self.writable_names[0]
         return Event.fromString(ical, locale=self._locale, calendar=calendar)
 
-    def update_db(self):
+    def update_db(self, max_age=None):
         """update the db from the vdir,
 
         should be called after every change to the vdir
+
+        :param max_age: if given, calendars which have been synced less than
+            `max_age` ago are not checked for changes (but calendars which have
+            never been synced always are) and the time of the sync is recorded
+            in the db
+        :type max_age: datetime.timedelta
+        :returns: the instances which have been added, removed or changed (as
+            they were before and as they are now), as triples of the
+            calendar's name and the instance's naive (local) start and end
+        :rtype: list(tuple(str, datetime.datetime, datetime.datetime))
         """
+        now = time.time()
+        synced = list()
+        changes = list()
         for calendar in self._calendars:
+            if max_age:
+                db_ctag = self._backend.get_ctag(calendar)
+                # if the time of the last sync wasn't recorded, it was synced
+                # without `max_age`, a long time ago for all we know
+                last_synced = self._backend.get_synced(calendar) or 0
+                if db_ctag is not None and now - last_synced < max_age.total_seconds():
+                    logger.debug('Not syncing {}'.format(calendar))
+                    # pretend we have seen the vdir in the state the db has
+                    self._last_ctags[calendar] = db_ctag
+                    continue
+                synced.append(calendar)
             if self._needs_update(calendar, remember=True):
-                self._db_update(calendar)
+                changes.extend(self._db_update(calendar))
+        if synced:
+            with self._backend.at_once():
+                for calendar in synced:
+                    self._backend.set_synced(now, calendar)
+        return changes
 
     def needs_update(self):
         """Check if you need to call update_db.
@@ -262,7 +456,7 @@ class CalendarCollection(object):
         # and the API would be made even uglier than it already is...
         for calendar in self._calendars:
             if self._needs_update(calendar) or \
-                    self._last_ctags[calendar] != self._local_ctag(calendar):
+                    self._last_ctags.get(calendar) != self._local_ctag(calendar):
                 return True
         return False
 
@@ -274,10 +468,14 @@ class CalendarCollection(object):
         return local_ctag != self._backend.get_ctag(calendar)
 
     def _db_update(self, calendar):
-        """implements the actual db update on a per calendar base"""
+        """implements the actual db update on a per calendar base
+
+        :returns: the changed instances, see update_db()
+        """
         local_ctag = self._local_ctag(calendar)
         db_hrefs = set(href for href, etag in self._backend.list(calendar))
         storage_hrefs = set()
+        instances = list()
 
         with self._backend.at_once():
             for href, etag in self._storages[calendar].list():
@@ -285,11 +483,16 @@ class CalendarCollection(object):
                 db_etag = self._backend.get_etag(href, calendar=calendar)
                 if etag != db_etag:
                     logger.debug('Updating {0} because {1} != {2}'.format(href, etag, db_etag))
+                    if href in db_hrefs:
+                        instances.extend(self._backend.get_instances(href, calendar))
                     self._update_vevent(href, calendar=calendar)
+                    instances.extend(self._backend.get_instances(href, calendar))
             for href in db_hrefs - storage_hrefs:
+                instances.extend(self._backend.get_instances(href, calendar))
                 self._backend.delete(href, calendar=calendar)
             self._backend.set_ctag(local_ctag, calendar=calendar)
             self._last_ctags[calendar] = local_ctag
+        return [(calendar, start, end) for start, end in instances]
 
     def _update_vevent(self, href, calendar):
         """should only be called during db_update, only updates the db,
@@ -311,17 +514,66 @@ class CalendarCollection(object):
                 'This event will not be available in khal.'.format(calendar, href, str(e)))
             return False
 
-    def search(self, search_string):
-        """search for the db for events matching `search_string`"""
-        return (self._cover_event(event) for event in self._backend.search(search_string))
+    def search(self, search_string, start=None, end=None, calendars=None):
+        """search for the db for events matching `search_string`
+
+        :param start: only return events with an instance ending after `start`
+        :type start: naive (local) or aware datetime.datetime
+        :param end: only return events with an instance beginning before `end`
+        :type end: naive (local) or aware datetime.datetime
+        :param calendars: only search these calendars
+        :type calendars: iterable(str)
+        """
+        pages = self.search_pages(search_string, None, start, end, calendars)
+        return (event for page in pages for event in page)
+
+    def search_pages(self, search_string, page_size, start=None, end=None, calendars=None):
+        """search the db for events matching `search_string`, page by page
+
+        only as many pages as are asked for get fetched from the db, see
+        search() for the parameters
+
+        :param page_size: maximal number of events per page, if None, all
+            events are returned as a single page
+        :type page_size: int or None
+        :rtype: iterator(list(Event))
+        """
+        if start is not None and start.tzinfo is None:
+            start = self._locale['local_timezone'].localize(start)
+        if end is not None and end.tzinfo is None:
+            end = self._locale['local_timezone'].localize(end)
+        pages = self._backend.search_pages(search_string, page_size, start, end, calendars)
+        return ([self._cover_event(event) for event in page] for page in pages)
+
+    def search_ids(self, search_string, candidates=None):
+        """return the ids of all events matching `search_string`, see
+        backend.SQLiteDb.search_ids()
+
+        ids are only valid until the db is updated the next time
+        """
+        return self._backend.search_ids(search_string, candidates)
+
+    def get_by_ids(self, ids):
+        """return the events with the given ids, see search_ids()
+
+        :rtype: list(Event)
+        """
+        return [self._cover_event(event) for event in self._backend.get_by_ids(ids)]
 
     def get_day_styles(self, day, focus):
-        devents = list(self.get_events_on(day, minimal=True))
-        if len(devents) == 0:
+        devents = self.get_events_on(day, minimal=True)
+        return self._day_styles(set(event.calendar for event in devents))
+
+    def _day_styles(self, calendars):
+        """return the style of a day with events from `calendars`
+
+        :type calendars: set(str)
+        """
+        if len(calendars) == 0:
             return None
         if self.color != '':
             return 'highlight_days_color'
-        dcalendars = list(set(map(lambda event: event.calendar, devents)))
+        dcalendars = sorted(calendars)
         if len(dcalendars) == 1:
             return 'calendar ' + dcalendars[0]
         if self.multiple != '':
@@ -342,3 +594,25 @@ class CalendarCollection(object):
                     return self.get_day_styles(date, focus)
                 else:
                     return None
+
+    def get_styles_by_day(self, start, end):
+        """return the styles of all (not focused) days from `start` to `end`
+        (inclusive), as get_styles() would, but with a single query
+
+        :type start: datetime.date
+        :type end: datetime.date
+        :rtype: dict(datetime.date, str or tuple(str, str) or None)
+        """
+        if self.highlight_event_days:
+            calendars = self.get_calendars_by_day(start, end)
+        styles = dict()
+        day = start
+        while day <= end:
+            if day == datetime.date.today():
+                styles[day] = 'today'
+            elif self.highlight_event_days:
+                styles[day] = self._day_styles(calendars[day])
+            else:
+                styles[day] = None
+            day += datetime.timedelta(days=1)
+        return styles
@@ -20,8 +20,9 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 """collection of utility functions"""
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 import calendar
+import heapq
 
 import dateutil.rrule
 import pytz
@@ -252,6 +253,47 @@ def to_unix_time(dtime):
     return unix_time
 
 
+def event_sort_key(event, local_timezone):
+    """return a key sorting events in the same order as Event.__lt__()
+
+    localized events are sorted by their start in unix time, floating (and
+    allday) events are mapped to `local_timezone` first. Allday events come
+    before other events starting at midnight.
+
+    :type event: khal.khalendar.event.Event
+    :type local_timezone: pytz.timezone
+    :rtype: tuple(int, bool)
+    """
+    start = event.start
+    if event.allday:
+        start = local_timezone.localize(datetime.combine(start, time.min))
+    elif start.tzinfo is None:
+        start = local_timezone.localize(start)
+    return to_unix_time(start), not event.allday
+
+
+def merge_events(events, events_float, local_timezone):
+    """merge localized and floating events into one sorted iterator
+
+    both `events` and `events_float` need to be sorted by start already, as
+    they are when coming from the database, so they can be merged in linear
+    time (and lazily), without ever comparing Event objects themselves
+
+    :param events: localized events, sorted by start
+    :type events: iterable(Event)
+    :param events_float: floating events, sorted by start
+    :type events_float: iterable(Event)
+    :type local_timezone: pytz.timezone
+    :rtype: iterator(Event)
+    """
+    streams = [
+        ((event_sort_key(event, local_timezone), num, index, event)
+         for index, event in enumerate(stream))
+        for num, stream in enumerate((events, events_float))
+    ]
+    return (event for _, _, _, event in heapq.merge(*streams))
+
+
 def to_naive_utc(dtime):
     """convert a datetime object to UTC and than remove the tzinfo, if
     datetime is naive already, return it
@@ -5,6 +5,7 @@ vdirsyncer.
 
 import os
 import errno
+import tempfile
 import uuid
 
 from atomicwrites import atomic_write
@@ -44,6 +45,37 @@ SAFE_UID_CHARS = ('abcdefghijklmnopqrstuvwxyz'
                   '0123456789_.-+')
 
 
+def _write_new_unsynced(fpath, data):
+    '''Atomically write `data` to the new file `fpath`, like
+    `atomic_write(fpath, overwrite=False)` does, but without syncing the file
+    or its directory.
+
+    Raises an OSError with errno EEXIST if `fpath` already exists.
+    '''
+    with tempfile.NamedTemporaryFile(mode='wb', dir=os.path.dirname(fpath),
+                                     prefix='.', suffix='.tmp', delete=False) as f:
+        f.write(data)
+    try:
+        os.link(f.name, fpath)
+    finally:
+        os.unlink(f.name)
+
+
+def _replace_unsynced(fpath, data):
+    '''Atomically replace the file `fpath` with `data`, like
+    `atomic_write(fpath, overwrite=True)` does, but without syncing the file
+    or its directory.
+    '''
+    with tempfile.NamedTemporaryFile(mode='wb', dir=os.path.dirname(fpath),
+                                     prefix='.', suffix='.tmp', delete=False) as f:
+        f.write(data)
+    try:
+        os.replace(f.name, fpath)
+    except OSError:
+        os.unlink(f.name)
+        raise
+
+
 def _href_safe(uid, safe=SAFE_UID_CHARS):
     return not bool(set(uid) - set(safe))
 
@@ -55,12 +87,13 @@ def _generate_href(uid=None, safe=SAFE_UID_CHARS):
         return uid
 
 
-def get_etag_from_file(f):
+def get_etag_from_file(f, sync=True):
     '''Get mtime-based etag from a filepath, file-like object or raw file
     descriptor.
 
     This function will flush/sync the file as much as necessary to obtain a
-    correct mtime.
+    correct mtime. If `sync` is False, the file is only flushed, the caller
+    then has to make sure it gets synced later (see `Vdir.sync`).
     '''
     close_f = False
     if hasattr(f, 'read'):
@@ -76,7 +109,8 @@ def get_etag_from_file(f):
     # assure that all internal buffers associated with this file are
     # written to disk
     try:
-        os.fsync(f)
+        if sync:
+            os.fsync(f)
         stat = os.fstat(f)
     finally:
         if close_f:
@@ -203,13 +237,18 @@ class VdirBase:
             else:
                 raise
 
-    def upload(self, item):
+    def upload(self, item, sync=True):
+        '''Upload a new item.
+
+        If `sync` is False, neither the item's file nor the directory are
+        synced to disk, call `sync` with the returned href later on.
+        '''
         if not isinstance(item.raw, str):
             raise TypeError('item.raw must be a unicode string.')
 
         try:
             href = self._get_href(item.uid)
-            fpath, etag = self._upload_impl(item, href)
+            fpath, etag = self._upload_impl(item, href, sync)
         except OSError as e:
             if e.errno in (
                 errno.ENAMETOOLONG,  # Unix
@@ -217,15 +256,18 @@ class VdirBase:
             ):
                 # random href instead of UID-based
                 href = self._get_href(None)
-                fpath, etag = self._upload_impl(item, href)
+                fpath, etag = self._upload_impl(item, href, sync)
             else:
                 raise
 
         return href, etag
 
-    def _upload_impl(self, item, href):
+    def _upload_impl(self, item, href, sync=True):
         fpath = self._get_filepath(href)
         try:
+            if not sync:
+                _write_new_unsynced(fpath, item.raw.encode(self.encoding))
+                return fpath, get_etag_from_file(fpath, sync=False)
             with atomic_write(fpath, mode='wb', overwrite=False) as f:
                 f.write(item.raw.encode(self.encoding))
                 return fpath, get_etag_from_file(f)
@@ -235,32 +277,60 @@ class VdirBase:
             else:
                 raise
 
-    def update(self, href, item, etag):
+    def update(self, href, item, etag, sync=True):
+        '''Update an existing item.
+
+        If `sync` is False, neither the item's file nor the directory are
+        synced to disk, call `sync` with `href` later on.
+        '''
         fpath = self._get_filepath(href)
         if not os.path.exists(fpath):
             raise NotFoundError(item.uid)
-        actual_etag = get_etag_from_file(fpath)
+        actual_etag = get_etag_from_file(fpath, sync=sync)
         if etag != actual_etag:
             raise WrongEtagError(etag, actual_etag)
 
         if not isinstance(item.raw, str):
             raise TypeError('item.raw must be a unicode string.')
 
+        if not sync:
+            _replace_unsynced(fpath, item.raw.encode(self.encoding))
+            return get_etag_from_file(fpath, sync=False)
         with atomic_write(fpath, mode='wb', overwrite=True) as f:
             f.write(item.raw.encode(self.encoding))
             etag = get_etag_from_file(f)
 
         return etag
 
-    def delete(self, href, etag):
+    def delete(self, href, etag, sync=True):
+        '''Delete an item.
+
+        If `sync` is False, the item's file is not synced before its etag is
+        checked, call `sync` later on to sync the directory to disk.
+        '''
         fpath = self._get_filepath(href)
         if not os.path.isfile(fpath):
             raise NotFoundError(href)
-        actual_etag = get_etag_from_file(fpath)
+        actual_etag = get_etag_from_file(fpath, sync=sync)
         if etag != actual_etag:
             raise WrongEtagError(etag, actual_etag)
         os.remove(fpath)
 
+    def sync(self, hrefs):
+        '''Sync the files of `hrefs` and the directory itself to disk, needed
+        after uploading, updating or deleting with `sync=False`.'''
+        for href in hrefs:
+            fd = os.open(self._get_filepath(href), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        fd = os.open(self.path, os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
     def get_meta(self, key):
         fpath = os.path.join(self.path, key)
         try:
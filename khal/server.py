@@ -0,0 +1,211 @@
+# Copyright (c) 2013-2017 Christian Geier et al.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""`khal serve` keeps the calendar collection (and therefore the database
+connection and the parsed configuration) around and answers the read-only
+commands (see controllers.QUERIES) over a Unix socket.
+
+The protocol is line based, every line is a json document. The client sends a
+single request::
+
+    {"query": "list", "calendars": null, "args": {"daterange": ["today"]},
+     "sync": true}
+
+and the server answers with one line per output row, followed by a final line
+signalling either success or an error::
+
+    {"row": "Today, 01.06.2015"}
+    {"done": true}
+
+    {"error": "Invalid value of `foo` for a datetime"}
+
+This module is imported by every khal command (to find out if there is a
+server running), it should therefore only import the standard library.
+"""
+
+import json
+import os
+import socket
+import socketserver
+
+from .exceptions import FatalError
+from .log import logger
+
+
+def socket_path(conf):
+    """path of the socket the server for `conf` listens on
+
+    the socket lives next to the database, so there is one server per database
+    """
+    return conf['sqlite']['path'] + '.socket'
+
+
+def _write(wfile, message):
+    wfile.write(json.dumps(message).encode('utf-8') + b'\n')
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            query = self.server.queries[request['query']]
+        except (ValueError, KeyError, TypeError) as error:
+            logger.warning('Invalid request: {}'.format(error))
+            _write(self.wfile, {'error': 'invalid request'})
+            return
+        logger.debug('Answering {}'.format(request))
+        try:
+            collection = self.server.get_collection(
+                request['calendars'], sync=request.get('sync', True))
+            for row in query(collection, self.server.conf, **request['args']):
+                _write(self.wfile, {'row': row})
+        except FatalError as error:
+            _write(self.wfile, {'error': str(error)})
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug('Client went away')
+        except Exception:
+            logger.exception('Unknown exception happened.')
+            _write(self.wfile, {'error': 'khal serve failed, see its log for details'})
+        else:
+            _write(self.wfile, {'done': True})
+
+
+class Server(socketserver.UnixStreamServer):
+    """answers one request at a time, so the database connections are only
+    ever used from one thread"""
+
+    def __init__(self, conf, build_collection):
+        """
+        :param conf: khal's configuration
+        :param build_collection: callable returning a CalendarCollection for
+            a configuration and a calendar selection (or None for all
+            calendars)
+        """
+        from . import controllers
+        self.conf = conf
+        self.queries = controllers.QUERIES
+        self._build_collection = build_collection
+        self._collections = dict()
+        path = socket_path(conf)
+        if os.path.exists(path):
+            sock = _connect(path)
+            if sock is not None:
+                sock.close()
+                raise FatalError('khal serve is already running on {}'.format(path))
+            os.remove(path)
+        old_umask = os.umask(0o177)  # only we may talk to the server
+        try:
+            super(Server, self).__init__(path, _RequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def get_collection(self, calendars, sync=True):
+        """return the (cached) collection for the selected calendars,
+
+        if `sync` is True, the collection's database gets updated first if a
+        vdir changed since the last request (and the calendars haven't been
+        checked for [default] sync_interval)
+        """
+        selection = frozenset(calendars) if calendars is not None else None
+        if selection not in self._collections:
+            self._collections[selection] = self._build_collection(self.conf, selection)
+        collection = self._collections[selection]
+        if sync:
+            collection.update_db(max_age=self.conf['default']['sync_interval'])
+        return collection
+
+    def server_close(self):
+        super(Server, self).server_close()
+        try:
+            os.remove(self.server_address)
+        except OSError:
+            pass
+
+
+def serve(conf, build_collection):
+    """run `khal serve` until interrupted"""
+    server = Server(conf, build_collection)
+    try:
+        # build the default collection (and bring the db up to date) before
+        # the first request comes in
+        server.get_collection(None)
+        logger.info('Listening on {}'.format(server.server_address))
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _connect(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def request(conf, query, calendars, args, sync=True):
+    """ask a running `khal serve` to answer `query`
+
+    :param query: name of the query, see controllers.QUERIES
+    :type query: str
+    :param calendars: the names of the selected calendars or None for all
+    :type calendars: set(str)
+    :param args: keyword arguments of the query, must be serializable as json
+    :type args: dict
+    :param sync: if False, the server doesn't check the calendars for changes
+        before answering
+    :type sync: bool
+    :returns: the output rows or None, if no server is running
+    :rtype: iterator(str)
+    """
+    path = socket_path(conf)
+    if not os.path.exists(path):
+        return None
+    sock = _connect(path)
+    if sock is None:
+        logger.debug('Found {} but no server is listening on it'.format(path))
+        return None
+    message = {
+        'query': query,
+        'calendars': sorted(calendars) if calendars is not None else None,
+        'args': args,
+        'sync': sync,
+    }
+    sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+    return _read_rows(sock)
+
+
+def _read_rows(sock):
+    with sock, sock.makefile('rb') as rfile:
+        for line in rfile:
+            answer = json.loads(line.decode('utf-8'))
+            if 'row' in answer:
+                yield answer['row']
+            elif 'error' in answer:
+                raise FatalError(answer['error'])
+            else:
+                return
+    raise FatalError('khal serve closed the connection')
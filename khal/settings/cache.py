@@ -0,0 +1,137 @@
+# Copyright (c) 2013-2017 Christian Geier et al.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+"""cache of the validated configuration
+
+Parsing and validating the configuration file (and discovering calendars)
+takes a considerable part of khal's startup time, therefore the validated
+configuration is pickled to $XDG_DATA_HOME/khal/ (where the database lives by
+default). The cache is only used as long as none of the files the
+configuration was built from (the configuration file itself, khal.spec, the
+`color` and `displayname` files of all calendars and /etc/localtime) have
+changed, the globs of all `discover` calendars still match the same vdirs and
+none of the environment variables in ENVIRON have changed.
+
+This module is used before any of the (slow to import) modules needed to
+validate the configuration are loaded and should not import them itself.
+"""
+
+from collections import OrderedDict
+import glob
+import hashlib
+import os
+import pickle
+import tempfile
+
+import xdg.BaseDirectory
+
+from khal import __version__
+from ..log import logger
+
+SPECPATH = os.path.join(os.path.dirname(__file__), 'khal.spec')
+LOCALTIME = '/etc/localtime'
+# environment variables which may influence the validated configuration
+ENVIRON = ['HOME', 'TZ', 'XDG_CONFIG_HOME', 'XDG_DATA_HOME']
+
+
+def cache_path(config_path):
+    """path of the cache for the configuration file at `config_path`"""
+    name = hashlib.sha1(os.path.abspath(config_path).encode('utf-8')).hexdigest()
+    return os.path.join(xdg.BaseDirectory.xdg_data_home, 'khal', 'config-{}.pickle'.format(name))
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _key(config_path):
+    return (__version__, os.path.abspath(config_path),
+            tuple(os.environ.get(name) for name in ENVIRON))
+
+
+def _to_dict(section):
+    """convert a (validated) ConfigObj into nested OrderedDicts"""
+    return OrderedDict(
+        (key, _to_dict(value) if isinstance(value, dict) else value)
+        for key, value in section.items())
+
+
+def load(config_path):
+    """return the cached configuration for `config_path`, if it is still valid
+
+    :rtype: dict or None
+    """
+    try:
+        with open(cache_path(config_path), 'rb') as cache:
+            cached = pickle.load(cache)
+    except FileNotFoundError:
+        return None
+    except Exception as error:
+        logger.debug('Could not load cached configuration: {}'.format(error))
+        return None
+    if cached['key'] != _key(config_path):
+        return None
+    for path, stat in cached['files']:
+        if _stat(path) != stat:
+            logger.debug('{} changed, reloading the configuration'.format(path))
+            return None
+    for pattern, vdirs in cached['globs']:
+        if sorted(glob.glob(pattern)) != vdirs:
+            logger.debug('vdirs matching {} changed, reloading the configuration'.format(pattern))
+            return None
+    logger.debug('using cached configuration from {}'.format(cache_path(config_path)))
+    return cached['config']
+
+
+def dump(config_path, config, globs):
+    """cache the validated `config` for `config_path`
+
+    :param config: the validated configuration
+    :type config: configobj.ConfigObj
+    :param globs: the paths of all calendars of type `discover`
+    :type globs: list(str)
+    :returns: `config` as nested dicts, as it will be returned by load()
+    :rtype: dict
+    """
+    config = _to_dict(config)
+    files = [config_path, SPECPATH, LOCALTIME]
+    for calendar in config['calendars'].values():
+        files.append(os.path.join(calendar['path'], 'color'))
+        files.append(os.path.join(calendar['path'], 'displayname'))
+    cached = {
+        'key': _key(config_path),
+        'files': [(path, _stat(path)) for path in files],
+        'globs': [(pattern, sorted(glob.glob(pattern))) for pattern in globs],
+        'config': config,
+    }
+    path = cache_path(config_path)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as cache:
+            pickle.dump(cached, cache, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(cache.name, path)
+    except (OSError, pickle.PicklingError) as error:
+        logger.debug('Could not cache the configuration: {}'.format(error))
+    return config
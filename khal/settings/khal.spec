@@ -191,6 +191,15 @@ print_new = option('event', 'path', 'False', default=False)
 # highlighting are in [highlight_days] section.
 highlight_event_days = boolean(default=False)
 
+# Before answering `calendar`, `list`, `at` or `search`, khal checks all
+# calendars for changes (and updates its cache if necessary). If this is set,
+# calendars which have been checked less than `sync_interval` ago are not
+# checked again, which makes these commands faster, but changes made to the
+# calendars by other programs (e.g., vdirsyncer) only show up after up to
+# `sync_interval`. All other commands always check all calendars. Use
+# `--no-sync` to skip the check for a single invocation.
+sync_interval = timedelta(default='0s')
+
 # Controls for how many days into the future we show events (for example, in
 # `khal list`) by default.
 timedelta = timedelta(default='2d')
@@ -212,6 +221,18 @@ event_view_weighting = integer(default=1)
 # Set to true to always show the event view window when looking at the event list
 event_view_always_visible = boolean(default=False)
 
+# If `True`, ikhal's search dialog already searches while the search term is
+# being typed and shows the number of matching events and the first of them.
+# If `False`, ikhal only searches once the search term has been entered.
+incremental_search = boolean(default=True)
+
+# The number of days before and after the selected one ikhal keeps in memory,
+# both in the list of events and (rounded up to whole weeks) in the calendar
+# column. Days (and months) further away are removed and rebuilt once they are
+# needed again. Lower values save memory, higher values make ikhal rebuild
+# days less often when moving back and forth.
+loaded_days = integer(min=7, default=42)
+
 # Choose a color theme for khal.
 #
 # This is very much work in progress. Help is really welcome! The two currently
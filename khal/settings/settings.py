@@ -22,18 +22,14 @@
 
 import os
 
-from configobj import ConfigObj, flatten_errors, get_extra_values, \
-    ConfigObjError
-from validate import Validator
 import xdg.BaseDirectory
 
 from .exceptions import InvalidSettingsError, CannotParseConfigFileError, NoConfigFile
+from . import cache
 from khal import __productname__
 from ..log import logger
-from .utils import is_timezone, is_timedelta, weeknumber_option, config_checks, \
-    expand_path, expand_db_path, is_color, get_vdir_type, get_color_from_vdir
 
-SPECPATH = os.path.join(os.path.dirname(__file__), 'khal.spec')
+SPECPATH = cache.SPECPATH
 
 
 def find_configuration_file():
@@ -89,8 +85,9 @@ def find_configuration_file():
 
 def get_config(
         config_path=None,
-        _get_color_from_vdir=get_color_from_vdir,
-        _get_vdir_type=get_vdir_type):
+        _get_color_from_vdir=None,
+        _get_vdir_type=None,
+        use_cache=False):
     """reads the config file, validates it and return a config dict
 
     :param config_path: path to a custom config file, if none is given the
@@ -98,6 +95,9 @@ def get_config(
     :type config_path: str
     :param _get_color_from_vdir: override get_color_from_vdir for testing purposes
     :param _get_vdir_type: override get_vdir_type for testing purposes
+    :param use_cache: if True, return the cached configuration if it is still
+        valid (and cache the configuration otherwise), see khal.settings.cache
+    :type use_cache: bool
     :returns: configuration
     :rtype: dict
     """
@@ -106,6 +106,23 @@ def get_config(
     if config_path is None or not os.path.exists(config_path):
         raise NoConfigFile()
 
+    if use_cache:
+        config = cache.load(config_path)
+        if config is not None:
+            return config
+
+    # importing these (and the validation functions) takes a while, which is
+    # not necessary if the configuration is cached
+    from configobj import ConfigObj, flatten_errors, get_extra_values, \
+        ConfigObjError
+    from validate import Validator
+    from .utils import is_timezone, is_timedelta, weeknumber_option, config_checks, \
+        expand_path, expand_db_path, is_color, get_vdir_type, get_color_from_vdir
+    if _get_color_from_vdir is None:
+        _get_color_from_vdir = get_color_from_vdir
+    if _get_vdir_type is None:
+        _get_vdir_type = get_vdir_type
+
     logger.debug('using the config file at {}'.format(config_path))
 
     try:
@@ -151,6 +168,8 @@ def get_config(
     if abort or not results:
         raise InvalidSettingsError()
 
+    globs = [calendar['path'] for calendar in user_config['calendars'].values()
+             if calendar['type'] == 'discover']
     config_checks(user_config, _get_color_from_vdir, _get_vdir_type)
 
     extras = get_extra_values(user_config)
@@ -161,6 +180,8 @@ def get_config(
             section = sectionize(section)
             logger.warning(
                 'unknown key or subsection "{}" in section "{}"'.format(value, section))
+    if use_cache:
+        return cache.dump(config_path, user_config, globs)
     return user_config
 
 
@@ -147,3 +147,17 @@ def merge_columns(lcolumn, rcolumn, width=25):
     rows = ['    '.join(one) for one in zip_longest(
         lcolumn, rcolumn, fillvalue='')]
     return rows
+
+
+def iter_merge_columns(lcolumn, rcolumn, width=25):
+    """like merge_columns, but lazily merges two iterables of lines
+
+    Lines are only taken from `lcolumn` and `rcolumn` when the row they
+    belong to is requested, so both may be (slow) generators.
+    """
+    for left, right in zip_longest(lcolumn, rcolumn):
+        if left is None:
+            left = width * ' '
+        if right is None:
+            right = ''
+        yield left + '    ' + right
@@ -19,8 +19,15 @@
 # OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime, time, timedelta
+import functools
+import logging
+from operator import methodcaller
 import signal
+import string
 import sys
 
 import click
@@ -28,12 +35,13 @@ import urwid
 
 from .. import utils
 from ..khalendar.event import Event
-from ..khalendar.exceptions import ReadOnlyCalendarError
+from ..log import logger
 from . import colors
 from .widgets import ExtendedEdit as Edit, NPile, NColumns, NListBox, linebox
 from .base import Pane, Window
 from .editor import EventEditor, ExportDialog
 from .calendarwidget import CalendarWidget
+from .timing import RENDER_TIMES, timed
 
 
 #  Overview of how this all meant to fit together:
@@ -172,12 +180,15 @@ class U_Event(urwid.Text):
         self.this_date = this_date
         self._conf = conf
         self.relative = relative
+        # what the current title was rendered from, see set_title()
+        self._title_key = None
         super().__init__('', wrap='clip')
         self.set_title()
 
     def get_cursor_coords(self, size):
         return 0, 0
 
+    @timed
     def render(self, size, focus=False):
         canv = super().render(size, focus)
         if focus:
@@ -199,7 +210,19 @@ class U_Event(urwid.Text):
         return (self.uid, self.event.recurrence_id)
 
     def set_title(self, mark=' '):
+        """render the title, unless the event (instance) and its delete status
+        are unchanged since the last time"""
         mark = {ALL: 'D', INSTANCES: 'd', False: ''}[self.delete_status(self.recuid)]
+        # the format and the date the title is relative to never change, the
+        # etag changes whenever the event gets edited (events which are not
+        # saved yet don't have one)
+        if self.event.etag is None:
+            key = None
+        else:
+            key = (self.event.etag, self.event.start, self.event.end, mark)
+        if key is not None and key == self._title_key:
+            return
+        self._title_key = key
         if self.relative:
             format_ = self._conf['view']['agenda_event_format']
         else:
@@ -267,6 +290,114 @@ class EventListBox(urwid.ListBox):
         self.focus.original_widget.set_title()
 
 
+class SearchWalker(urwid.SimpleFocusListWalker):
+    """lazily fetches the results of a search, one page at a time
+
+    the next page is only fetched (and its widgets are only constructed) once
+    the list box asks for the result after the last one already loaded
+    """
+
+    page_size = 50
+
+    def __init__(self, pages, make_widget):
+        """
+        :param pages: the search results, see
+            CalendarCollection.search_pages()
+        :type pages: iterator(list(Event))
+        :param make_widget: returns the widget displaying an event
+        :type make_widget: callable
+        """
+        self._pages = pages
+        self._make_widget = make_widget
+        super().__init__([])
+        if self._fetch_page():
+            # the focus moves along when the first results get inserted
+            self.set_focus(0)
+
+    def _fetch_page(self):
+        """append the next page of results, return False if there is none"""
+        if self._pages is None:
+            return False
+        try:
+            page = next(self._pages)
+        except StopIteration:
+            self._pages = None
+            return False
+        self.extend([self._make_widget(event) for event in page])
+        return True
+
+    def cancel(self):
+        """stop fetching results, e.g., because another search was started"""
+        if self._pages is not None:
+            self._pages.close()
+            self._pages = None
+
+    def get_next(self, position):
+        while position + 1 >= len(self) and self._fetch_page():
+            pass
+        return super().get_next(position)
+
+
+# sqlite's LIKE only ignores the case of ASCII characters
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+class IncrementalSearch(object):
+    """search for a search term while it is being typed
+
+    As long as the search term only gets extended, every search only looks at
+    the results of the previous one (every event containing the extended term
+    also contains the term it extends), unless there are too many of them.
+    Only the results of searches for terms the current one extends are kept.
+    Going back to a shorter search term (e.g., after deleting a character)
+    therefore needs another query, unless that very term has been searched
+    for before (which, as the search dialog waits for a pause in typing, it
+    rarely has been). That query only looks at the results of the longest
+    kept term the shorter one still extends, if there is one.
+    """
+
+    # looking up more candidates by their ids is not faster than searching
+    # all events
+    max_candidates = 1000
+
+    def __init__(self, collection):
+        """
+        :type collection: khalendar.CalendarCollection
+        """
+        self._collection = collection
+        # pairs of search terms and the ids of the matching events, every
+        # search term contains the one before
+        self._searches = list()
+
+    def search(self, search_term):
+        """return the ids of the events matching `search_term`
+
+        :rtype: list(int)
+        """
+        key = search_term.translate(_ASCII_LOWER)
+        while self._searches and self._searches[-1][0] not in key:
+            self._searches.pop()
+        if self._searches and self._searches[-1][0] == key:
+            return self._searches[-1][1]
+        candidates = self._searches[-1][1] if self._searches else None
+        if candidates is not None and len(candidates) > self.max_candidates:
+            candidates = None
+        ids = self._collection.search_ids(search_term, candidates)
+        self._searches.append((key, ids))
+        return ids
+
+    def pages(self, search_term, page_size=SearchWalker.page_size):
+        """return the number of events matching `search_term` and the events
+        themselves, page by page (e.g., for a SearchWalker)
+
+        :rtype: tuple(int, iterator(list(Event)))
+        """
+        ids = self.search(search_term)
+        pages = (self._collection.get_by_ids(ids[num:num + page_size])
+                 for num in range(0, len(ids), page_size))
+        return len(ids), pages
+
+
 class DListBox(EventListBox):
     """Container for a DayWalker"""
     # XXX unfortunate naming, there is also DateListBox
@@ -275,6 +406,7 @@ class DListBox(EventListBox):
         super().__init__(*args, **kwargs)
         self._init = dynamic_days
 
+    @timed
     def render(self, size, focus=False):
         if self._init:
             while 'bottom' in self.ends_visible(size):
@@ -284,7 +416,8 @@ class DListBox(EventListBox):
 
     def clean(self):
         """reset event most recently in focus"""
-        if self._old_focus is not None:
+        # the DayWalker might have unloaded days since we stored the position
+        if self._old_focus is not None and self._old_focus < len(self.body):
             self.body[self._old_focus].body[0].set_attr_map({None: 'date'})
 
     def ensure_date(self, day):
@@ -343,6 +476,15 @@ class DayWalker(urwid.SimpleFocusListWalker):
     """A list Walker that contains a list of DateListBox objects, each representing
     one day and associated events"""
 
+    # when the events of a day are needed, those of this many days (in the
+    # direction we are moving in) are fetched from the database at once
+    prefetch_days = 14
+    # DateListBoxes more than this many days away from the focus are removed
+    # from the walker, they are rebuilt (or taken from the cache) when needed
+    loaded_days = 42
+    # the number of DateListBoxes kept for reuse, including the loaded ones
+    cached_days = 126
+
     def __init__(self, this_date, eventcolumn, conf, collection, delete_status):
         self.eventcolumn = eventcolumn
         self._conf = conf
@@ -351,6 +493,11 @@ class DayWalker(urwid.SimpleFocusListWalker):
         self._last_day = this_date
         self._first_day = this_date
         self._collection = collection
+        self._prefetched = dict()
+        self._cached = OrderedDict()
+        if 'loaded_days' in conf['view']:
+            self.loaded_days = conf['view']['loaded_days']
+            self.cached_days = 3 * self.loaded_days
 
         super().__init__(list())
         self.ensure_date(this_date)
@@ -379,12 +526,38 @@ class DayWalker(urwid.SimpleFocusListWalker):
         assert self[item_no].date == day
         self[item_no].set_selected_date(day)
         self.set_focus(item_no)
+        self._unload_distant_days()
+
+    def _unload_distant_days(self):
+        """remove the DateListBoxes far away from the focus from the walker"""
+        while self.focus > self.loaded_days:
+            del self[0]
+            self._first_day += timedelta(days=1)
+        while len(self) - 1 - self.focus > self.loaded_days:
+            del self[-1]
+            self._last_day -= timedelta(days=1)
 
     def update_events_ondate(self, day):
         """refresh the contents of the day's DateListBox"""
+        self._forget(day, day)
+        self._reload(day)
+
+    def _reload(self, day):
         offset = (day - self[0].date).days
         assert self[offset].date == day
-        self[offset] = self._get_events(day)
+        self[offset] = self._load_day(day)
+
+    def _forget(self, start, end, everything=False):
+        """drop the cached DateListBoxes and prefetched events between `start`
+        and `end` (inclusive), as they might be outdated"""
+        if everything:
+            self._cached.clear()
+            self._prefetched.clear()
+            return
+        for day in [day for day in self._cached if start <= day <= end]:
+            del self._cached[day]
+        for day in [day for day in self._prefetched if start <= day <= end]:
+            del self._prefetched[day]
 
     def refresh_titles(self, start, end, everything):
         """refresh events' titles
@@ -419,6 +592,7 @@ class DayWalker(urwid.SimpleFocusListWalker):
         """
         start = start.date() if isinstance(start, datetime) else start
         end = end.date() if isinstance(end, datetime) else end
+        self._forget(start, end, everything)
 
         if everything:
             start = self[0].date
@@ -429,7 +603,7 @@ class DayWalker(urwid.SimpleFocusListWalker):
 
         day = start
         while day <= end:
-            self.update_events_ondate(day)
+            self._reload(day)
             day += timedelta(days=1)
 
     def update_date_line(self):
@@ -447,7 +621,7 @@ class DayWalker(urwid.SimpleFocusListWalker):
 
     def _autoextend(self):
         self._last_day += timedelta(days=1)
-        pile = self._get_events(self._last_day)
+        pile = self._load_day(self._last_day)
         self.append(pile)
 
     def _autoprepend(self):
@@ -457,10 +631,56 @@ class DayWalker(urwid.SimpleFocusListWalker):
         # be indicated as the currently selected date
         self[self.focus or 0].reset_style()
         self._first_day -= timedelta(days=1)
-        pile = self._get_events(self._first_day)
+        pile = self._load_day(self._first_day, forward=False)
         self.insert(0, pile)
 
-    def _get_events(self, day):
+    def _load_day(self, day, forward=True):
+        """return the DateListBox for `day`, reusing a cached one if possible
+
+        :type day: datetime.date
+        :param forward: the direction we are moving in, see _events_on()
+        :type forward: bool
+        """
+        try:
+            pile = self._cached.pop(day)
+        except KeyError:
+            pile = self._get_events(day, forward)
+        else:
+            # the titles and the date line might be outdated by now
+            pile.original_widget.refresh_titles()
+            pile.original_widget.update_date_line()
+        self._cached[day] = pile
+        while len(self._cached) > self.cached_days:
+            self._cached.popitem(last=False)
+        return pile
+
+    def _events_on(self, day, forward=True):
+        """return the sorted events on `day`
+
+        if they haven't been prefetched yet, the events of the following (or
+        if not `forward`, the preceding) `prefetch_days` days are fetched as well
+
+        :type day: datetime.date
+        :type forward: bool
+        :rtype: list(khal.khalendar.event.Event)
+        """
+        if day not in self._prefetched:
+            if forward:
+                days = [day + timedelta(days=num) for num in range(self.prefetch_days)]
+            else:
+                days = [day - timedelta(days=num) for num in reversed(range(self.prefetch_days))]
+            by_day = self._collection.get_events_by_day(
+                [(datetime.combine(one, time.min), datetime.combine(one, time.max))
+                 for one in days])
+            # prefetched days we moved away from are not needed anymore
+            horizon = timedelta(days=2 * self.prefetch_days)
+            for one in [one for one in self._prefetched if abs(one - day) > horizon]:
+                del self._prefetched[one]
+            for one, (events, events_float) in zip(days, by_day):
+                self._prefetched[one] = sorted(events_float + events)
+        return self._prefetched.pop(day)
+
+    def _get_events(self, day, forward=True):
         """get all events on day, return a DateListBox of `U_Event()`s
 
         :type day: datetime.date
@@ -472,7 +692,7 @@ class DayWalker(urwid.SimpleFocusListWalker):
             conf=self._conf,
         )
         event_list.append(urwid.AttrMap(date_header, 'date'))
-        self.events = sorted(self._collection.get_events_on(day))
+        self.events = self._events_on(day, forward)
         event_list.extend([
             urwid.AttrMap(
                 U_Event(event, conf=self._conf, this_date=day, delete_status=self.delete_status),
@@ -514,6 +734,7 @@ class StaticDayWalker(DayWalker):
 
     def update_events_ondate(self, day):
         """refresh the contents of the day's DateListBox"""
+        self._forget(day, day)
         self[0] = self._get_events(day)
 
     def refresh_titles(self, start, end, everything):
@@ -537,6 +758,7 @@ class StaticDayWalker(DayWalker):
         """
         start = start.date() if isinstance(start, datetime) else start
         end = end.date() if isinstance(end, datetime) else end
+        self._forget(start, end, everything)
 
         update = everything
         for one in self:
@@ -565,6 +787,7 @@ class DateListBox(NListBox):
 
     __str__ = __repr__
 
+    @timed
     def render(self, size, focus):
         if focus:
             self.body[0].set_attr_map({None: 'date focused'})
@@ -667,7 +890,20 @@ class EventColumn(urwid.WidgetWrap):
             min_date = self.pane.calendar.base_widget.walker.earliest_date
             max_date = self.pane.calendar.base_widget.walker.latest_date
         self.pane.base_widget.calendar.base_widget.reset_styles_range(min_date, max_date)
-        self.dlistbox.body.update_range(min_date, max_date)
+        self.dlistbox.body.update_range(min_date, max_date, everything)
+
+    def update_days(self, days):
+        """update only the DateListBoxes and the calendar's Date cells of `days`
+
+        :param days: sorted, non-overlapping ranges of days, start and end
+            inclusive
+        :type days: list(tuple(datetime.date, datetime.date))
+        """
+        walker = self.pane.calendar.base_widget.walker
+        for start, end in days:
+            if start <= walker.latest_date and end >= walker.earliest_date:
+                walker.reset_styles_range(start, end)
+            self.dlistbox.body.update_range(start, end)
 
     def refresh_titles(self, min_date, max_date, everything):
         """refresh titles in DateListBoxes
@@ -745,11 +981,12 @@ class EventColumn(urwid.WidgetWrap):
                 calendar=event.calendar,
                 etag=event.etag,
             )
-            self.pane.collection.update(new_event)
-            update_colors(
-                new_event.start_local,
-                new_event.end_local,
-                (event.recurring or new_event.recurring)
+            everything = event.recurring or new_event.recurring
+            self.pane.storage.submit(
+                methodcaller('update', new_event),
+                on_done=lambda _: update_colors(
+                    new_event.start_local, new_event.end_local, everything),
+                message='event saved.',
             )
         else:
             self.editor = True
@@ -841,18 +1078,22 @@ class EventColumn(urwid.WidgetWrap):
         # which are also copied. If the events' summary is edited it will show
         # up on disk but not be displayed in khal
         event = self.focus_event.event.duplicate()
-        try:
-            self.pane.collection.new(event)
-        except ReadOnlyCalendarError:
+        if event.calendar not in self.pane.collection.writable_names:
             event.calendar = self.pane.collection.default_calendar_name or \
                 self.pane.collection.writable_names[0]
             self.edit(event, always_save=True)
-        start_date, end_date = event.start_local, event.end_local
-        if isinstance(start_date, datetime):
-            start_date = start_date.date()
-        if isinstance(end_date, datetime):
-            end_date = end_date.date()
-        self.pane.eventscolumn.base_widget.update(start_date, end_date, event.recurring)
+        else:
+            start_date, end_date = event.start_local, event.end_local
+            if isinstance(start_date, datetime):
+                start_date = start_date.date()
+            if isinstance(end_date, datetime):
+                end_date = end_date.date()
+            self.pane.storage.submit(
+                methodcaller('new', event),
+                on_done=lambda _: self.pane.eventscolumn.base_widget.update(
+                    start_date, end_date, event.recurring),
+                message='event duplicated.',
+            )
         try:
             self._old_focus = self.focus_position
         except IndexError:
@@ -925,6 +1166,7 @@ class EventColumn(urwid.WidgetWrap):
                 self.view(self.focus_event.event)
         return rval
 
+    @timed
     def render(self, a, focus):
         if focus:
             DateListBox.selected_date = None
@@ -986,13 +1228,33 @@ class EventDisplay(urwid.WidgetWrap):
 
 
 class SearchDialog(urwid.WidgetWrap):
-    """A Search Dialog Widget"""
-    def __init__(self, search_func, abort_func):
+    """A Search Dialog Widget
+
+    if a `preview_func` is given, the search already runs while the search
+    term is being typed (as soon as no key has been pressed for `delay`
+    seconds) and the first results are shown in the dialog
+    """
+
+    delay = 0.2
+    preview_rows = 5
+
+    def __init__(self, search_func, abort_func, preview_func=None, loop=None):
+        """
+        :param preview_func: returns the number of events matching a search
+            term and a SearchWalker of those events
+        :type preview_func: callable
+        :param loop: the main loop, needed for delaying the search, without
+            it, the search runs on every keystroke
+        :type loop: urwid.MainLoop
+        """
+
+        dialog = self
 
         class Search(Edit):
 
             def keypress(self, size, key):
                 if key == 'enter':
+                    dialog._cancel_preview()
                     search_func(self.text)
                 else:
                     return super().keypress(size, key)
@@ -1000,17 +1262,76 @@ class SearchDialog(urwid.WidgetWrap):
         search_field = Search('')
 
         def this_func(_):
+            self._cancel_preview()
             search_func(search_field.text)
 
+        def abort(button):
+            self._cancel_preview()
+            if abort_func is not None:
+                abort_func(button)
+
         lines = []
         lines.append(urwid.Text('Please enter a search term (Escape cancels):'))
         lines.append(search_field)
+        self._preview_func = preview_func
+        if preview_func is not None:
+            self._loop = loop
+            self._alarm = None
+            self._walker = None
+            self._count = urwid.Text('')
+            self._preview = urwid.WidgetPlaceholder(self._preview_box(urwid.SimpleListWalker([])))
+            lines.extend([self._count, self._preview])
+            urwid.connect_signal(search_field, 'change', self._schedule_preview)
         buttons = NColumns([urwid.Button('Search', on_press=this_func),
-                            urwid.Button('Abort', on_press=abort_func)])
+                            urwid.Button('Abort', on_press=abort)])
         lines.append(buttons)
         content = NPile(lines, outermost=True)
         urwid.WidgetWrap.__init__(self, urwid.LineBox(content))
 
+    def keypress(self, size, key):
+        if key == 'esc':
+            # the dialog gets closed by the window
+            self._cancel_preview()
+        return super().keypress(size, key)
+
+    def _cancel_preview(self):
+        """make sure no preview gets updated after the dialog has been closed"""
+        if self._preview_func is None:
+            return
+        if self._alarm is not None:
+            self._loop.remove_alarm(self._alarm)
+            self._alarm = None
+        if self._walker is not None:
+            self._walker.cancel()
+
+    def _preview_box(self, walker):
+        listbox = urwid.ListBox(walker)
+        return urwid.BoxAdapter(urwid.WidgetDisable(listbox), self.preview_rows)
+
+    def _schedule_preview(self, _, search_term):
+        """update the preview once no key has been pressed for `delay`
+        seconds, superseding the update scheduled by the previous key"""
+        if self._loop is None:
+            self._update_preview(search_term)
+            return
+        if self._alarm is not None:
+            self._loop.remove_alarm(self._alarm)
+        self._alarm = self._loop.set_alarm_in(
+            self.delay, lambda *_: self._update_preview(search_term))
+
+    def _update_preview(self, search_term):
+        self._alarm = None
+        if self._walker is not None:
+            self._walker.cancel()
+        if search_term:
+            count, self._walker = self._preview_func(search_term)
+            self._count.set_text('{} matching event(s)'.format(count))
+            self._preview.original_widget = self._preview_box(self._walker)
+        else:
+            self._walker = None
+            self._count.set_text('')
+            self._preview.original_widget = self._preview_box(urwid.SimpleListWalker([]))
+
 
 class ClassicView(Pane):
 
@@ -1027,6 +1348,10 @@ class ClassicView(Pane):
         self._conf = conf
         self.collection = collection
         self._deleted = {ALL: [], INSTANCES: []}
+        self._search_results = None
+        self._incremental_search = None
+        # the window is only set once the view has been opened
+        self.storage = StorageTasks(collection, alert=lambda msg: self.window.alert(msg))
 
         ContainerWidget = linebox[self._conf['view']['frame']]
         if self._conf['view']['dynamic_days']:
@@ -1051,7 +1376,9 @@ class ClassicView(Pane):
             on_press={key: self.new_event for key in self._conf['keybindings']['new']},
             firstweekday=self._conf['locale']['firstweekday'],
             weeknumbers=self._conf['locale']['weeknumbers'],
-            get_styles=collection.get_styles
+            get_styles=collection.get_styles,
+            get_styles_range=collection.get_styles_by_day,
+            loaded_weeks=-(-self._conf['view']['loaded_days'] // 7),
         )
         if self._conf['view']['dynamic_days']:
             elistbox.set_focus_date_callback = calendar.set_focus_date
@@ -1089,15 +1416,18 @@ class ClassicView(Pane):
             self._deleted[INSTANCES].append(uid)
 
     def cleanup(self, data):
-        """delete all events marked for deletion"""
+        """delete all events marked for deletion (after all other pending
+        writes, see start_pane())"""
+        events = list()
         for part in self._deleted[ALL]:
             account, href, etag = part.split('\n', 2)
-            self.collection.delete(href, etag, account)
+            events.append((href, etag, account))
+        instances = list()
         for part, rec_id in self._deleted[INSTANCES]:
-            account, href, etag = part.split('\n', 2)
-            event = self.collection.get_event(href, account)
-            event.delete_instance(rec_id)
-            self.collection.update(event)
+            account, href, _ = part.split('\n', 2)
+            instances.append((href, account, rec_id))
+        if events or instances:
+            self.storage.submit(methodcaller('delete_many', events, instances))
 
     def keypress(self, size, key):
         binds = self._conf['keybindings']
@@ -1107,26 +1437,45 @@ class ClassicView(Pane):
 
     def search(self):
         """create a search dialog and display it"""
+        if self._conf['view']['incremental_search']:
+            self._incremental_search = IncrementalSearch(self.collection)
+            dialog = SearchDialog(
+                self._search, self.window.backtrack, preview_func=self._search_preview,
+                loop=getattr(self.window, 'loop', None))
+        else:
+            self._incremental_search = None
+            dialog = SearchDialog(self._search, self.window.backtrack)
         overlay = urwid.Overlay(
-            SearchDialog(self._search, self.window.backtrack), self,
+            dialog, self,
             align='center',
             width=('relative', 70),
             valign=('relative', 50),
             height=None)
         self.window.open(overlay)
 
+    def _search_result(self, event):
+        return urwid.AttrMap(
+            U_Event(event, relative=False, conf=self._conf, delete_status=self.delete_status),
+            'calendar ' + event.calendar, 'reveal focus')
+
+    def _search_preview(self, search_term):
+        """return the number of events matching `search_term` and a
+        SearchWalker of them, for the SearchDialog"""
+        count, pages = self._incremental_search.pages(search_term)
+        return count, SearchWalker(pages, self._search_result)
+
     def _search(self, search_term):
         """search for events matching `search_term"""
         self.window.backtrack()
-        events = list(self.collection.search(search_term))
-        event_list = []
-        event_list.extend([
-            urwid.AttrMap(
-                U_Event(event, relative=False, conf=self._conf, delete_status=self.delete_status),
-                'calendar ' + event.calendar, 'reveal focus')
-            for event in events])
+        if self._search_results is not None:
+            self._search_results.cancel()
+        if self._incremental_search is not None:
+            _, pages = self._incremental_search.pages(search_term)
+        else:
+            pages = self.collection.search_pages(search_term, SearchWalker.page_size)
+        self._search_results = SearchWalker(pages, self._search_result)
         events = EventListBox(
-            urwid.SimpleFocusListWalker(event_list), parent=self.eventscolumn, conf=self._conf,
+            self._search_results, parent=self.eventscolumn, conf=self._conf,
             delete_status=self.delete_status,
             toggle_delete_all=self.toggle_delete_all,
             toggle_delete_instance=self.toggle_delete_instance
@@ -1147,6 +1496,7 @@ class ClassicView(Pane):
         columns.set_focus_column(1)
         self.window.open(pane)
 
+    @timed
     def render(self, size, focus=False):
         rval = super(ClassicView, self).render(size, focus)
         if self.init:
@@ -1253,6 +1603,160 @@ def _add_calendar_colors(palette, collection):
     return palette
 
 
+def _changed_days(changes):
+    """merge the time ranges of changed instances into days
+
+    :param changes: see CalendarCollection.update_db()
+    :returns: sorted, non-overlapping ranges of days, start and end inclusive
+    :rtype: list(tuple(datetime.date, datetime.date))
+    """
+    ranges = list()
+    for _, start, end in changes:
+        # instances end exclusively
+        last = (end - timedelta(microseconds=1)).date() if end > start else start.date()
+        ranges.append((start.date(), last))
+    days = list()
+    for start, end in sorted(ranges):
+        if days and start <= days[-1][1] + timedelta(days=1):
+            days[-1] = (days[-1][0], max(days[-1][1], end))
+        else:
+            days.append((start, end))
+    return days
+
+
+class StorageTasks(object):
+    """runs tasks writing to the vdirs and the db one after the other in a
+    worker thread, so that ikhal stays responsive while files are written
+    and synced to disk
+
+    A task is a callable which gets called with a fork of the collection (see
+    CalendarCollection.fork()), created in and only used by the worker.
+    submit() returns an asyncio future, the callbacks given to it are called
+    from the event loop once the task is done.
+    """
+
+    def __init__(self, collection, alert, loop=None):
+        """
+        :type collection: khalendar.CalendarCollection
+        :param alert: called with status messages and errors
+        :type alert: callable
+        :param loop: the event loop the callbacks are called from, by
+            default the current one
+        :type loop: asyncio.AbstractEventLoop
+        """
+        self._collection = collection
+        self._alert = alert
+        self._loop = loop if loop is not None else asyncio.get_event_loop()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._fork = None
+        self._pending = set()
+
+    @property
+    def pending(self):
+        """the number of tasks which are not done yet"""
+        return len(self._pending)
+
+    def submit(self, task, on_done=None, on_error=None, message=None):
+        """run `task` after all previously submitted tasks
+
+        :param task: called with the worker's collection
+        :type task: callable
+        :param on_done: called with the return value of `task`
+        :type on_done: callable
+        :param on_error: called with the exception if `task` raised one, by
+            default the error is logged and shown as an alert
+        :type on_error: callable
+        :param message: shown as an alert once `task` is done
+        :type message: str
+        :rtype: asyncio.Future
+        """
+        future = self._loop.run_in_executor(self._executor, self._run, task)
+        self._pending.add(future)
+        future.add_done_callback(
+            functools.partial(self._finished, on_done, on_error, message))
+        return future
+
+    def _run(self, task):
+        if self._fork is None:
+            self._fork = self._collection.fork()
+        return task(self._fork)
+
+    def _finished(self, on_done, on_error, message, future):
+        self._pending.discard(future)
+        error = future.exception()
+        if error is not None:
+            if on_error is not None:
+                on_error(error)
+            else:
+                logger.error('Writing to the calendars failed.',
+                             exc_info=(type(error), error, error.__traceback__))
+                self._alert(('alert', 'Error: {}'.format(str(error) or type(error).__name__)))
+            return
+        if on_done is not None:
+            on_done(future.result())
+        if message is not None:
+            self._alert(message)
+
+    def wait(self):
+        """wait until all submitted tasks are done (and their callbacks have
+        been called), e.g., after the main loop has stopped"""
+        if self._pending:
+            self._loop.run_until_complete(asyncio.wait(list(self._pending)))
+
+
+def _update_db(collection):
+    changes = collection.update_db()
+    return changes, collection.sync_state
+
+
+class BackgroundSync(object):
+    """updates the db from the vdirs as a task of a StorageTasks, so that
+    ikhal stays responsive while (potentially large) vdirs are read
+
+    `on_done` is called (from the event loop) with the changed instances (see
+    CalendarCollection.update_db()) or None, if the update failed.
+    """
+
+    def __init__(self, tasks, collection, on_done):
+        """
+        :type tasks: StorageTasks
+        :type collection: khalendar.CalendarCollection
+        :type on_done: callable
+        """
+        self._tasks = tasks
+        self._collection = collection
+        self._on_done = on_done
+        self._future = None
+
+    @property
+    def running(self):
+        return self._future is not None
+
+    def start(self):
+        """start updating the db, unless an update is already running
+
+        :returns: True if a new update was started
+        :rtype: bool
+        """
+        if self.running:
+            return False
+        self._future = self._tasks.submit(
+            _update_db, on_done=self._finished, on_error=self._failed)
+        return True
+
+    def _finished(self, result):
+        self._future = None
+        changes, sync_state = result
+        self._collection.set_sync_state(sync_state)
+        self._on_done(changes)
+
+    def _failed(self, error):
+        self._future = None
+        logger.error('Updating the database failed.',
+                     exc_info=(type(error), error, error.__traceback__))
+        self._on_done(None)
+
+
 def start_pane(pane, callback, program_info='', quit_keys=['q']):
     """Open the user interface with the given initial pane."""
     frame = Window(
@@ -1263,7 +1767,8 @@ def start_pane(pane, callback, program_info='', quit_keys=['q']):
     palette = _add_calendar_colors(
         getattr(colors, pane._conf['view']['theme']), pane.collection)
     loop = urwid.MainLoop(
-        frame, palette, unhandled_input=frame.on_key_press, pop_ups=True)
+        frame, palette, unhandled_input=frame.on_key_press, pop_ups=True,
+        event_loop=urwid.AsyncioEventLoop(loop=asyncio.get_event_loop()))
     frame.loop = loop
 
     def redraw_today(loop, pane, meta={'last_today': None}):
@@ -1279,14 +1784,24 @@ def start_pane(pane, callback, program_info='', quit_keys=['q']):
 
     loop.set_alarm_in(60, redraw_today, pane)
 
+    def synced(changes):
+        if changes is not None:
+            pane.eventscolumn.base_widget.update_days(_changed_days(changes))
+            pane.window.alert('database updated.')
+        else:
+            pane.window.alert('updating the database failed, see the log for details.')
+
+    sync = BackgroundSync(pane.storage, pane.collection, synced)
+
     def check_for_updates(loop, pane):
-        if pane.collection.needs_update():
+        if not sync.running and pane.collection.needs_update():
             pane.window.alert('detected external vdir modification, updating...')
-            pane.collection.update_db()
-            pane.eventscolumn.base_widget.update(None, None, everything=True)
-            pane.window.alert('detected external vdir modification, updated.')
+            sync.start()
         loop.set_alarm_in(60, check_for_updates, pane)
 
+    # the collection has not been synced yet, see cli.interactive
+    sync.start()
+    pane.window.alert('updating the database...')
     loop.set_alarm_in(60, check_for_updates, pane)
     # Make urwid use 256 color mode.
     loop.screen.set_terminal_properties(
@@ -1296,6 +1811,8 @@ def start_pane(pane, callback, program_info='', quit_keys=['q']):
         raise urwid.ExitMainLoop()
 
     signal.signal(signal.SIGINT, ctrl_c)
+    # see ui.timing, logged once the screen has been restored
+    RENDER_TIMES.enabled = logger.isEnabledFor(logging.DEBUG)
     try:
         loop.run()
     except Exception:
@@ -1307,3 +1824,8 @@ def start_pane(pane, callback, program_info='', quit_keys=['q']):
             pass
         print(tb)
         sys.exit(1)
+    finally:
+        # e.g., the deletions from ClassicView.cleanup()
+        pane.storage.wait()
+        if RENDER_TIMES.enabled:
+            logger.debug(RENDER_TIMES.report())
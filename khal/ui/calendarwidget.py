@@ -33,6 +33,8 @@ from khal.utils import get_month_abbr_len
 
 import urwid
 
+from .timing import timed
+
 setlocale(LC_ALL, '')
 
 
@@ -63,6 +65,7 @@ class DatePart(urwid.Text):
     def get_cursor_coords(self, size):
         return 1, 0
 
+    @timed
     def render(self, size, focus=False):
         canv = super().render(size, focus)
         if focus:
@@ -235,12 +238,16 @@ class CListBox(urwid.ListBox):
 
         super(CListBox, self).__init__(walker)
 
+    @timed
     def render(self, size, focus=False):
         if self._init:
             while 'bottom' in self.ends_visible(size):
                 self.body._autoextend()
             self.set_focus_valign('middle')
             self._init = False
+        elif not self._marked:
+            # marking works with row numbers, which removing rows would change
+            self.body.unload_distant_months()
 
         return super(CListBox, self).render(size, focus)
 
@@ -348,16 +355,24 @@ class CListBox(urwid.ListBox):
 
 
 class CalendarWalker(urwid.SimpleFocusListWalker):
+    # months whose weeks are all more than this many weeks away from the
+    # focus are removed, they are rebuilt when needed
+    loaded_weeks = 6
+
     def __init__(self, on_date_change, on_press, keybindings, firstweekday=0,
-                 weeknumbers=False, get_styles=None, initial=None):
+                 weeknumbers=False, get_styles=None, initial=None,
+                 get_styles_range=None, loaded_weeks=None):
         if initial is None:
             initial = date.today()
+        if loaded_weeks is not None:
+            self.loaded_weeks = loaded_weeks
         self.firstweekday = firstweekday
         self.weeknumbers = weeknumbers
         self.on_date_change = on_date_change
         self.on_press = on_press
         self.keybindings = keybindings
         self.get_styles = get_styles
+        self.get_styles_range = get_styles_range
         weeks = self._construct_month(initial.year, initial.month)
         urwid.SimpleFocusListWalker.__init__(self, weeks)
 
@@ -402,11 +417,21 @@ class CalendarWalker(urwid.SimpleFocusListWalker):
         minr, minc = self.get_date_pos(max(min_date, self.earliest_date))
         maxr, maxc = self.get_date_pos(min(max_date, self.latest_date))
         focus_pos = self.focus, self[self.focus].focus_col
+        styles = self._get_styles_range(self[minr][1].date, self[maxr][7].date)
 
         for row in range(minr, maxr + 1):
             for column in range(1, 8):
-                focus = ((row, column) == focus_pos)
-                self[row][column].reset_styles(focus)
+                if (row, column) == focus_pos or styles is None:
+                    self[row][column].reset_styles((row, column) == focus_pos)
+                else:
+                    self[row][column].set_styles(styles[self[row][column].date])
+
+    def _get_styles_range(self, start, end):
+        """return the styles of all dates from `start` to `end` (if a
+        `get_styles_range` function was given), otherwise None"""
+        if self.get_styles_range is None:
+            return None
+        return self.get_styles_range(start, end)
 
     def get_date_pos(self, a_day):
         """get row and column where `a_day` is located
@@ -421,15 +446,16 @@ class CalendarWalker(urwid.SimpleFocusListWalker):
         # in case new_focus is 1 we will later try set the focus to 0 which
         # will lead to an autoprepend which will f*ck up our estimation,
         # therefore better autoprepending anyway, even if it might not be
-        # necessary
-        if new_focus <= 1:
+        # necessary (months far away from the focus might have been removed,
+        # so we might need to prepend several)
+        while new_focus <= 1:
             self._autoprepend()
             week_diff = int((self.focus_date - a_day).days / 7)
             new_focus = self.focus - week_diff
         for offset in [0, -1, 1]:  # we might be off by a week
             row = new_focus + offset
             try:
-                if row >= len(self):
+                while row >= len(self):
                     self._autoextend()
                 column = self[row].get_date_column(a_day)
                 return row, column
@@ -438,6 +464,29 @@ class CalendarWalker(urwid.SimpleFocusListWalker):
         # we didn't find the date we were looking for...
         raise ValueError('something is wrong')
 
+    def unload_distant_months(self):
+        """remove the months far away from the focus
+
+        only whole months are removed, so that _autoprepend() and _autoextend()
+        can rebuild them later on
+        """
+        while True:
+            month = self[0][7].date.month
+            weeks = 0
+            while weeks < len(self) and self[weeks][7].date.month == month:
+                weeks += 1
+            if self.focus - weeks < self.loaded_weeks:
+                break
+            del self[:weeks]
+        while True:
+            month = self[-1][1].date.month
+            weeks = 0
+            while weeks < len(self) and self[-1 - weeks][1].date.month == month:
+                weeks += 1
+            if len(self) - 1 - self.focus - weeks < self.loaded_weeks:
+                break
+            del self[-weeks:]
+
     def _autoextend(self):
         """appends the next month"""
         date_last_month = self[-1][1].date  # a date from the last month
@@ -473,13 +522,16 @@ class CalendarWalker(urwid.SimpleFocusListWalker):
             self.insert(0, one)
         return len(weeks)
 
-    def _construct_week(self, week):
+    def _construct_week(self, week, styles=None):
         """
         constructs a CColumns week from a week of datetime.date objects. Also
         prepends the month name if the first day of the month is included in
         that week.
 
         :param week: list of datetime.date objects
+        :param styles: the styles of the dates (at least) in `week`, if None
+            they are fetched with `get_styles`
+        :type styles: dict(datetime.date, str or tuple(str, str) or None)
         :returns: the week as an CColumns object and True or False depending on
                   if today is in this week
         :rtype: tuple(urwid.CColumns, bool)
@@ -498,7 +550,10 @@ class CalendarWalker(urwid.SimpleFocusListWalker):
         for number, day in enumerate(week):
             new_date = Date(day, self.get_styles)
             this_week.append((2, new_date))
-            new_date.set_styles(self.get_styles(new_date.date, False))
+            if styles is None:
+                new_date.set_styles(self.get_styles(new_date.date, False))
+            else:
+                new_date.set_styles(styles[new_date.date])
         if self.weeknumbers == 'right':
             this_week.append((2, urwid.AttrMap(
                 urwid.Text('{:2}'.format(getweeknumber(week[0]))), 'weeknumber_right')))
@@ -539,9 +594,10 @@ class CalendarWalker(urwid.SimpleFocusListWalker):
 
         plain_weeks = calendar.Calendar(
             self.firstweekday).monthdatescalendar(year, month)
+        styles = self._get_styles_range(plain_weeks[0][0], plain_weeks[-1][-1])
         weeks = list()
         for number, week in enumerate(plain_weeks):
-            week = self._construct_week(week)
+            week = self._construct_week(week, styles)
             weeks.append(week)
         if clean_first_row and weeks[0][1].date.month != weeks[0][7].date.month:
             return weeks[1:]
@@ -554,7 +610,8 @@ class CalendarWalker(urwid.SimpleFocusListWalker):
 
 class CalendarWidget(urwid.WidgetWrap):
     def __init__(self, on_date_change, keybindings, on_press, firstweekday=0,
-                 weeknumbers=False, get_styles=None, initial=None):
+                 weeknumbers=False, get_styles=None, initial=None,
+                 get_styles_range=None, loaded_weeks=None):
         """
         :param on_date_change: a function that is called every time the selected
             date is changed with the newly selected date as a first (and only
@@ -578,6 +635,17 @@ class CalendarWidget(urwid.WidgetWrap):
             pressed keys, which are handed to the widget containing the
             CalendarWidget.
         :type on_press: dict
+        :param get_styles: a function returning the style of a date, it is
+            called with the date and if it is focused or not
+        :type get_styles: function
+        :param get_styles_range: a function returning the styles (as
+            `get_styles` would for unfocused dates) of all dates between its
+            two arguments (inclusive) as a dict, if given it is used instead of
+            `get_styles` when constructing (or restyling) several weeks at once
+        :type get_styles_range: function
+        :param loaded_weeks: months more than this many weeks away from the
+            focus are removed (and rebuilt when needed again)
+        :type loaded_weeks: int
         """
         if initial is None:
             self._initial = date.today()
@@ -625,7 +693,8 @@ class CalendarWidget(urwid.WidgetWrap):
             dividechars=1)
         self.walker = CalendarWalker(
             on_date_change, on_press, default_keybindings, firstweekday, weeknumbers,
-            get_styles, initial=self._initial)
+            get_styles, initial=self._initial, get_styles_range=get_styles_range,
+            loaded_weeks=loaded_weeks)
         self.box = CListBox(self.walker)
         frame = urwid.Frame(self.box, header=dnames)
         urwid.WidgetWrap.__init__(self, frame)
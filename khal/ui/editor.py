@@ -21,6 +21,7 @@
 
 from datetime import datetime, time
 import datetime as dt
+from operator import methodcaller
 
 import urwid
 
@@ -473,19 +474,21 @@ class EventEditor(urwid.WidgetWrap):
             self.event.increment_sequence()
             if self.event.etag is None:  # has not been saved before
                 self.event.calendar = self.calendar_chooser.active['name']
-                self.collection.new(self.event)
+                task = methodcaller('new', self.event)
             elif self.calendar_chooser.changed:
-                self.collection.change_collection(
+                task = methodcaller(
+                    'change_collection',
                     self.event,
                     self.calendar_chooser.active['name']
                 )
             else:
-                self.collection.update(self.event)
+                task = methodcaller('update', self.event)
 
-            self._save_callback(
-                self.event.start_local, self.event.end_local,
-                self.event.recurring or self.recurrenceeditor.changed,
-            )
+            # the views are updated once the event has been written
+            args = (self.event.start_local, self.event.end_local,
+                    self.event.recurring or self.recurrenceeditor.changed)
+            self.pane.storage.submit(
+                task, on_done=lambda _: self._save_callback(*args), message='event saved.')
         self._abort_confirmed = False
         self.pane.window.backtrack()
 
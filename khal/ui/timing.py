@@ -0,0 +1,81 @@
+# Copyright (c) 2013-2017 Christian Geier et al.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""timing of ikhal's rendering
+
+With debug logging enabled (`ikhal -v`), the time spent rendering the widgets
+whose render() method is decorated with `timed` is accumulated per widget
+class and logged when ikhal exits. The times include the time spent
+rendering the contained widgets, e.g., the time for a DateListBox includes
+the time for its U_Events. Canvases which urwid takes from its cache are not
+counted.
+"""
+
+from collections import defaultdict
+import functools
+import time
+
+
+class RenderTimes(object):
+    """accumulates the number and duration of renders per widget class"""
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self._calls = defaultdict(int)
+        self._seconds = defaultdict(float)
+
+    def add(self, name, seconds):
+        self._calls[name] += 1
+        self._seconds[name] += seconds
+
+    def report(self):
+        """return a summary, the slowest widget classes first
+
+        :rtype: str
+        """
+        lines = ['render times:']
+        for name in sorted(self._seconds, key=self._seconds.get, reverse=True):
+            calls, seconds = self._calls[name], self._seconds[name]
+            lines.append('{0}: {1} renders, {2:.3f}s in total, {3:.2f}ms each'.format(
+                name, calls, seconds, seconds / calls * 1000))
+        return '\n'.join(lines)
+
+
+RENDER_TIMES = RenderTimes()
+
+
+def timed(render):
+    """decorator for widgets' render() methods, recording their duration in
+    RENDER_TIMES (if enabled)"""
+    @functools.wraps(render)
+    def timed_render(self, size, focus=False):
+        if not RENDER_TIMES.enabled:
+            return render(self, size, focus)
+        start = time.perf_counter()
+        try:
+            return render(self, size, focus)
+        finally:
+            RENDER_TIMES.add(type(self).__name__, time.perf_counter() - start)
+    return timed_render
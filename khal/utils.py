@@ -25,11 +25,13 @@ strings to date(time) or event objects"""
 from calendar import isleap, month_abbr
 from collections import defaultdict
 from datetime import date, datetime, timedelta, time
+from functools import lru_cache
 import random
 import string
 import re
+import unicodedata
 from time import strptime
-from textwrap import wrap
+from textwrap import TextWrapper
 
 import icalendar
 import pytz
@@ -40,7 +42,8 @@ from .khalendar.utils import sanitize
 
 
 def timefstr(dtime_list, timeformat):
-    """converts the first item of a list (a time as a string) to a datetimeobject
+    """converts the first item(s) of a list (a time as a string, as many
+    items as `timeformat` has parts separated by spaces) to a datetimeobject
 
     where the date is today and the time is given by a string
     removes "used" elements of list
@@ -49,13 +52,14 @@ def timefstr(dtime_list, timeformat):
     :type timeformat: str
     :rtype: datetime.datetime
     """
-    if len(dtime_list) == 0:
+    parts = timeformat.count(' ') + 1
+    if len(dtime_list) < parts:
         raise ValueError()
-    time_start = datetime.strptime(dtime_list[0], timeformat)
+    time_start = datetime.strptime(' '.join(dtime_list[:parts]), timeformat)
     time_start = time(*time_start.timetuple()[3:5])
     day_start = date.today()
     dtstart = datetime.combine(day_start, time_start)
-    dtime_list.pop(0)
+    del dtime_list[:parts]
     return dtstart
 
 
@@ -198,12 +202,88 @@ def datetimefstr_weekday(dtime_list, timeformat):
         raise ValueError()
     day = calc_day(dtime_list[0])
     this_time = timefstr(dtime_list[1:], timeformat)
-    dtime_list.pop(0)
-    dtime_list.pop(0)  # we need to pop twice as timefstr gets a copy
+    # timefstr gets a copy, so we need to remove the day and the time here
+    del dtime_list[:timeformat.count(' ') + 2]
     dtime = datetime.combine(day, this_time.time())
     return dtime
 
 
+_DAYNAMES = {
+    'today', 'tomorrow', 'yesterday',
+    'monday', 'mon', 'tuesday', 'tue', 'wednesday', 'wed', 'thursday', 'thu',
+    'friday', 'fri', 'saturday', 'sat', 'sunday', 'sun',
+}
+
+# regular expressions matching (at least) everything strptime() accepts for a
+# directive, they only serve to rule out strings quickly
+_NUMERIC_DIRECTIVES = 'dfHIjmMSUwWyY'
+
+
+@lru_cache(maxsize=None)
+def _format_re(dtformat):
+    """compile a regular expression matching all strings strptime() can parse
+    with `dtformat` (and some more)
+
+    :type dtformat: str
+    :rtype: compiled regular expression
+    """
+    regex = list()
+    chars = iter(dtformat)
+    for char in chars:
+        if char == '%':
+            directive = next(chars, '%')
+            if directive == '%':
+                regex.append('%')
+            elif directive in _NUMERIC_DIRECTIVES:
+                regex.append(r'\s?\d+')
+            else:
+                regex.append(r'.+?')
+        elif char.isspace():
+            regex.append(r'\s+')
+        else:
+            regex.append(re.escape(char))
+    return re.compile(''.join(regex) + r'\Z', re.IGNORECASE)
+
+
+@lru_cache(maxsize=None)
+def _has_year(dtformat):
+    return '97' in datetime(1997, 10, 11).strftime(dtformat)
+
+
+def _matches(dtime_list, dtformat):
+    """check if the beginning of `dtime_list` might be parsed with `dtformat`
+
+    :type dtime_list: list(str)
+    :type dtformat: str
+    :rtype: bool
+    """
+    parts = dtformat.count(' ') + 1
+    if len(dtime_list) < parts:
+        return False
+    return _format_re(dtformat).match(' '.join(dtime_list[:parts])) is not None
+
+
+def _max_tokens(locale):
+    """the maximal number of elements guessdatetimefstr() can consume"""
+    formats = ['datetimeformat', 'longdatetimeformat', 'dateformat', 'longdateformat',
+               'timeformat']
+    # a weekday's name followed by a time (which might contain spaces, too)
+    return max([locale['timeformat'].count(' ') + 2] +
+               [locale[name].count(' ') + 1 for name in formats])
+
+
+def _is_dayname(dtime_list, _):
+    return len(dtime_list) > 0 and dtime_list[0].lower() in _DAYNAMES
+
+
+def _is_dayname_time(dtime_list, timeformat):
+    return _is_dayname(dtime_list, None) and _matches(dtime_list[1:], timeformat)
+
+
+def _is_now(dtime_list, _):
+    return len(dtime_list) > 0 and dtime_list[0].lower() == 'now'
+
+
 def guessdatetimefstr(dtime_list, locale, default_day=None):
     """
     :type dtime_list: list
@@ -255,17 +335,21 @@ def guessdatetimefstr(dtime_list, locale, default_day=None):
         return a_date
 
     dtstart = None
-    for fun, dtformat, all_day, shortformat in [
-            (datefstr_year, locale['datetimeformat'], False, True),
-            (datetimefstr, locale['longdatetimeformat'], False, False),
-            (timefstr_day, locale['timeformat'], False, False),
-            (datetimefstr_weekday, locale['timeformat'], False, False),
-            (datefstr_year, locale['dateformat'], True, True),
-            (datetimefstr, locale['longdateformat'], True, False),
-            (datefstr_weekday, None, True, False),
-            (datetimefwords, None, False, False),
+    # `check` rules out most formats cheaply before fun() tries to parse
+    # dtime_list, which is expensive if it fails
+    for fun, check, dtformat, all_day, shortformat in [
+            (datefstr_year, _matches, locale['datetimeformat'], False, True),
+            (datetimefstr, _matches, locale['longdatetimeformat'], False, False),
+            (timefstr_day, _matches, locale['timeformat'], False, False),
+            (datetimefstr_weekday, _is_dayname_time, locale['timeformat'], False, False),
+            (datefstr_year, _matches, locale['dateformat'], True, True),
+            (datetimefstr, _matches, locale['longdateformat'], True, False),
+            (datefstr_weekday, _is_dayname, None, True, False),
+            (datetimefwords, _is_now, None, False, False),
     ]:
-        if shortformat and '97' in datetime(1997, 10, 11).strftime(dtformat):
+        if shortformat and _has_year(dtformat):
+            continue
+        if not check(dtime_list, dtformat):
             continue
         try:
             dtstart = fun(dtime_list, dtformat)
@@ -371,7 +455,8 @@ def guessrangefstr(daterange, locale, adjust_reasonably=False,
         end = start + timedelta(days=8)
         return start, end, True
 
-    for i in reversed(range(1, len(range_list) + 1)):
+    max_tokens = _max_tokens(locale)
+    for i in reversed(range(1, min(len(range_list), max_tokens) + 1)):
         start = ' '.join(range_list[:i])
         end = ' '.join(range_list[i:])
         allday = False
@@ -411,6 +496,8 @@ def guessrangefstr(daterange, locale, adjust_reasonably=False,
                     end = start + delta
                 except ValueError:
                     split = end.split(" ")
+                    if len(split) > max_tokens:
+                        continue
                     end, end_allday = guessdatetimefstr(split, locale, default_day=start.date())
                     if len(split) != 0:
                         continue
@@ -622,6 +709,120 @@ def split_ics(ics, random_uid=False, default_timezone=None):
             sorted(events_grouped.items())]
 
 
+_CONTENTLINE_NAME = re.compile(r'(?:[^:"]|"[^"]*")*')
+_TZID_PARAM = re.compile(r';TZID=("[^"]*"|[^;:]*)', re.IGNORECASE)
+
+
+def _unfold(ics):
+    """yield the (unfolded) content lines of `ics` together with their
+    original (folded) text
+
+    :param ics: an ics file's content or an iterable of its lines
+    :type ics: str or bytes or iterable(str) or iterable(bytes)
+    :rtype: iterator(tuple(str, str))
+    """
+    if isinstance(ics, (str, bytes)):
+        ics = ics.splitlines()
+    folded = list()
+    for line in ics:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and folded:
+            folded.append(line)
+            continue
+        if folded:
+            yield folded[0] + ''.join(part[1:] for part in folded[1:]), '\r\n'.join(folded)
+        folded = [line] if line else list()
+    if folded:
+        yield folded[0] + ''.join(part[1:] for part in folded[1:]), '\r\n'.join(folded)
+
+
+def iter_split_ics(ics, random_uid=False):
+    """split an ics file into several according to VEVENT's UIDs
+
+    Unlike split_ics(), this works on the lines of the ics file without
+    parsing it, which keeps memory usage close to the size of the VEVENTs
+    in the file, and only the VTIMEZONEs actually referenced by a group of
+    VEVENTs are added to it. All lines are copied verbatim, VEVENTs without
+    a UID are assigned a random one. All other components are ignored.
+
+    :param ics: an ics file's content or an iterable of its lines, e.g., the
+        file object itself
+    :type ics: str or bytes or iterable(str) or iterable(bytes)
+    :param random_uid: assign random uids to all events
+    :type random_uid: bool
+    :returns: an ics string per UID, sorted by UID
+    :rtype: iterator(str)
+    """
+    tzs = dict()
+    events_grouped = defaultdict(list)
+    tzids_grouped = defaultdict(set)
+
+    stack = list()
+    lines = None
+    for line, raw in _unfold(ics):
+        name_params = _CONTENTLINE_NAME.match(line).group()
+        name = name_params.split(';', 1)[0].upper()
+        value = line[len(name_params) + 1:]
+        if name == 'BEGIN':
+            stack.append(value.upper())
+            if stack[:-1] in ([], ['VCALENDAR']) and stack[-1] in ('VEVENT', 'VTIMEZONE'):
+                lines, uid, tzid, tzids = [raw], None, None, set()
+                continue
+        elif name == 'END' and stack:
+            component = stack.pop()
+            if lines is not None and stack in ([], ['VCALENDAR']):
+                lines.append(raw)
+                if component == 'VEVENT':
+                    if uid is None:
+                        uid = generate_random_uid()
+                        if not random_uid:
+                            lines.insert(1, 'UID:' + uid)
+                    events_grouped[uid].append(lines)
+                    tzids_grouped[uid].update(tzids)
+                elif tzid is not None:
+                    tzs[tzid] = lines
+                lines = None
+                continue
+        if lines is None:
+            continue
+        if stack[-1] == 'VEVENT':
+            if name == 'UID':
+                uid = value.strip()
+                if random_uid:
+                    continue
+            tzids.update(tzid.strip('"') for tzid in _TZID_PARAM.findall(name_params))
+        elif stack[-1] == 'VTIMEZONE' and name == 'TZID':
+            tzid = value.strip()
+        lines.append(raw)
+
+    missing_tz = set()
+    for uid, events in sorted(events_grouped.items()):
+        calendar = [
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            'PRODID:-//PIMUTILS.ORG//NONSGML khal / icalendar //EN',
+        ]
+        for tzid in sorted(tzids_grouped[uid]):
+            if tzid in tzs:
+                calendar.extend(tzs[tzid])
+            elif tzid not in pytz.all_timezones_set and tzid not in missing_tz:
+                logger.warning(
+                    'Cannot find timezone `{}` in .ics file, using default timezone. '
+                    'This can lead to erroneous time shifts'.format(tzid)
+                )
+                missing_tz.add(tzid)
+        new_uid = generate_random_uid() if random_uid else None
+        for lines in events:
+            if new_uid:
+                lines = lines[:1] + ['UID:' + new_uid] + lines[1:]
+            calendar.extend(lines)
+        calendar.append('END:VCALENDAR')
+        yield '\r\n'.join(calendar) + '\r\n'
+        del events[:]
+
+
 def ics_from_list(events, tzs, random_uid=False, default_timezone=None):
     """convert an iterable of icalendar.Events to an icalendar.Calendar
 
@@ -695,6 +896,11 @@ ansi_sgr = re.compile(r'\x1b\['
                       '([0-9]+;?)+'
                       'm')
 
+_SGR = re.compile(r'\x1b\[[0-9;]*m')
+_SGR_SPLIT = re.compile(r'(\x1b\[[0-9;]*m)')
+_NON_ASCII = re.compile(r'[^\x00-\x7f]')
+_WHITESPACE = {ord(char): ' ' for char in '\t\n\x0b\x0c\r'}
+
 
 def find_last_reset(string):
     for match in re.finditer(ansi_reset, string):
@@ -723,22 +929,131 @@ def find_unmatched_sgr(string):
         return False
 
 
+def _char_width(char):
+    if unicodedata.combining(char):
+        return 0
+    if unicodedata.east_asian_width(char) in 'WF':
+        return 2
+    return 1
+
+
+def display_width(text):
+    """the number of columns `text` takes up on a terminal
+
+    SGR codes take up no space, wide (e.g., CJK) characters two columns
+
+    :type text: str
+    :rtype: int
+    """
+    if '\x1b' in text:
+        text = _SGR.sub('', text)
+    if _NON_ASCII.search(text) is None:
+        return len(text)
+    return sum(_char_width(char) for char in text)
+
+
+def _wrap_chunks(text):
+    """split `text` into words and whitespace exactly like textwrap does
+
+    :rtype: list(tuple(str, int))
+    """
+    return [(chunk, len(chunk) if chunk.isspace() else display_width(chunk))
+            for chunk in TextWrapper.wordsep_re.split(text) if chunk]
+
+
+def _split_word(word, space, force):
+    """split `word` so that the first part takes up at most `space` columns
+
+    Like textwrap does (since python 3.10), the word is split after the last
+    hyphen that fits, if there is one (with something else before it).
+
+    :param force: if set, the first part contains at least one character,
+        even if it doesn't fit
+    :type force: bool
+    :rtype: tuple(tuple(str, int), tuple(str, int))
+    """
+    head_width, offset = 0, 0
+    split = hyphen = None
+    letters = False
+    for num, part in enumerate(_SGR_SPLIT.split(word)):
+        if num % 2:  # SGR code
+            offset += len(part)
+            continue
+        for pos, char in enumerate(part, offset):
+            char_width = _char_width(char) if char > '\x7f' else 1
+            if head_width + char_width > space and (head_width or not force):
+                split = pos
+                break
+            head_width += char_width
+            if char != '-':
+                letters = True
+            elif letters:
+                hyphen = pos + 1, head_width
+        if split is not None:
+            break
+        offset += len(part)
+    if split is None:
+        return (word, head_width), ('', 0)
+    if hyphen is not None:
+        split, head_width = hyphen
+    tail = word[split:]
+    return (word[:split], head_width), (tail, display_width(tail))
+
+
+def _apply_sgr(style, chunk):
+    """return the SGR codes in effect after `chunk`, if `style` was in
+    effect before it"""
+    for code in _SGR.findall(chunk):
+        style = '' if code in (RESET, '\x1b[m') else style + code
+    return style
+
+
+@lru_cache(maxsize=1024)
+def _color_wrap(text, width):
+    if width <= 0:
+        raise ValueError('invalid width {} (must be > 0)'.format(width))
+    chunks = _wrap_chunks(text.expandtabs().translate(_WHITESPACE))
+    chunks.reverse()
+    lines = list()
+    style = ''  # the SGR codes in effect at the end of the last line
+    while chunks:
+        line, line_width, line_style = list(), 0, style
+        # whitespace at the beginning of the text is kept, like textwrap does
+        if lines and chunks[-1][0].isspace():
+            chunks.pop()
+        while chunks and line_width + chunks[-1][1] <= width:
+            chunk, chunk_width = chunks.pop()
+            line.append(chunk)
+            line_width += chunk_width
+        if chunks and chunks[-1][1] > width:
+            head, tail = _split_word(chunks[-1][0], width - line_width, not line)
+            chunks[-1] = tail
+            if head[0]:
+                line.append(head[0])
+                line_width += head[1]
+        if line and line[-1].isspace():
+            line.pop()
+        if line:
+            line = ''.join(line)
+            if '\x1b' in line:
+                style = _apply_sgr(style, line)
+            lines.append(line_style + line + (RESET if style else ''))
+    return tuple(lines)
+
+
 def color_wrap(text, width=70):
-    """A variant of wrap that takes SGR codes (somewhat) into account.
+    """A variant of wrap that takes SGR codes into account.
+
+    The width of the lines is measured without SGR codes (and with wide
+    characters taking up two columns). Lines which end with some attributes
+    enabled get a RESET appended, and these attributes are enabled again at
+    the beginning of the next line.
 
-    This doesn't actually adjust the length, but makes sure that
-    lines that enable some attribues also contain a RESET, and also adds
-    that code to the next line
+    :type text: str
+    :type width: int
+    :rtype: list(str)
     """
-    # TODO we really want to ignore all SGR codes when measuring the width
-    lines = wrap(text, width)
-    for num, _ in enumerate(lines):
-        sgr = find_unmatched_sgr(lines[num])
-        if sgr:
-            lines[num] += RESET
-            if num != len(lines):
-                lines[num + 1] = sgr + lines[num + 1]
-    return lines
+    return list(_color_wrap(text, width))
 
 
 def get_weekday_occurrence(day):
@@ -0,0 +1 @@
+version = '0.9.7.dev'
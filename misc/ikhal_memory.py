@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Measure how much memory ikhal's views hold on to while scrolling
+
+Creates a calendar with an event on every day, scrolls ikhal's
+calendar and event columns through a year (day by day) and prints the
+memory allocated by then (as seen by tracemalloc) and the number of weeks
+and days still loaded, once for each of the given values of the
+[view] loaded_days option.
+
+usage: ikhal_memory.py [DAYS [LOADED_DAYS ...]]
+"""
+
+import os
+import sys
+import tempfile
+import tracemalloc
+from datetime import date, timedelta
+
+import khal.khalendar  # noqa
+from khal.khalendar import CalendarCollection
+from khal.settings import get_config
+from khal.ui import ClassicView
+
+EVENT = """BEGIN:VCALENDAR
+BEGIN:VEVENT
+UID:benchmark{num}
+SUMMARY:Event number {num}
+DTSTART:{day:%Y%m%d}T100000
+DTEND:{day:%Y%m%d}T110000
+END:VEVENT
+END:VCALENDAR
+"""
+
+CONFIG = """[calendars]
+[[benchmark]]
+path = {path}
+[locale]
+local_timezone = Europe/Berlin
+default_timezone = Europe/Berlin
+timeformat = %H:%M
+dateformat = %d.%m.
+longdateformat = %d.%m.%Y
+datetimeformat = %d.%m. %H:%M
+longdatetimeformat = %d.%m.%Y %H:%M
+[sqlite]
+path = {dbpath}
+[view]
+loaded_days = {loaded_days}
+"""
+
+
+def scroll(tmpdir, start, days, loaded_days):
+    config = os.path.join(tmpdir, 'config')
+    with open(config, 'w') as config_file:
+        config_file.write(CONFIG.format(
+            path=os.path.join(tmpdir, 'benchmark'), dbpath=os.path.join(tmpdir, 'khal.db'),
+            loaded_days=loaded_days))
+    conf = get_config(config)
+    collection = CalendarCollection(
+        calendars={'benchmark': {'name': 'benchmark',
+                                 'path': os.path.join(tmpdir, 'benchmark'),
+                                 'color': '', 'readonly': False,
+                                 'unicode_symbols': True}},
+        dbpath=conf['sqlite']['path'], locale=conf['locale'])
+
+    tracemalloc.start()
+    view = ClassicView(collection, conf)
+    size = (120, 40)
+    for num in range(days):
+        view.calendar.original_widget.set_focus_date(start + timedelta(days=num))
+        view.render(size, focus=True)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    weeks = len(view.calendar.original_widget.walker)
+    loaded = len(view.eventscolumn.original_widget.dlistbox.body)
+    print('loaded_days = {:>6}: {:6.1f} MiB allocated, {:4} weeks and {:4} days loaded'.format(
+        loaded_days, allocated / 2 ** 20, weeks, loaded))
+
+
+def main(days=365, *loaded_days):
+    days = int(days)
+    loaded_days = loaded_days or (42, 10 * days)
+    start = date.today()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.makedirs(os.path.join(tmpdir, 'benchmark'))
+        for num in range(days):
+            with open(os.path.join(tmpdir, 'benchmark', '{}.ics'.format(num)), 'w') as ics:
+                ics.write(EVENT.format(num=num, day=start + timedelta(days=num)))
+        for one in loaded_days:
+            scroll(tmpdir, start, days, int(one))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -12,7 +12,7 @@ if sys.version_info < (3, 3):
 requirements = [
     'click>=3.2',
     'icalendar',
-    'urwid',
+    'urwid>=1.3.0',
     'pyxdg',
     'pytz',
     'python-dateutil',
@@ -22,6 +22,10 @@ requirements = [
     'tzlocal>=1.0',
 ]
 
+if sys.version_info < (3, 4):
+    # ikhal runs on urwid's asyncio event loop
+    requirements.append('asyncio')
+
 test_requirements = [
     'freezegun'
 ]
@@ -1,6 +1,9 @@
 import datetime
+import json
 import os
+import subprocess
 import sys
+import time
 from unittest import mock
 from datetime import timedelta
 
@@ -12,6 +15,9 @@ from khal.cli import main_khal, main_ikhal
 
 from .utils import _get_text, _get_ics_filepath
 
+# seconds `python -c 'import khal.cli'` may take at most
+STARTUP_BUDGET = 2
+
 
 class CustomCliRunner(CliRunner):
     def __init__(self, config_file, db=None, calendars=None,
@@ -128,6 +134,21 @@ def test_direct_modification(runner):
     assert result.output == 'No events\n'
 
 
+def test_no_sync(runner):
+    runner = runner(default_command='list')
+    args = ['list', '--format', '{title}', '--day-format', '', '09.04.2014']
+    result = runner.invoke(main_khal, args)
+    assert result.output == 'No events\n'
+
+    runner.calendars['one'].join('test.ics').write(_get_text('event_dt_simple'))
+    result = runner.invoke(main_khal, args + ['--no-sync'])
+    assert not result.exception
+    assert result.output == 'No events\n'
+    result = runner.invoke(main_khal, args)
+    assert not result.exception
+    assert result.output == 'An Event\n'
+
+
 def test_simple(runner):
     runner = runner(default_command='list', days=2)
 
@@ -273,6 +294,22 @@ def test_calendar(runner):
         assert result.output == output
 
 
+def test_calendar_stream(runner):
+    with freeze_time('2015-6-1'):
+        runner = runner(default_command='calendar', days=2)
+        result = runner.invoke(main_khal, 'new 01.06.2015 18:00 myevent'.split())
+        assert not result.exception
+        result = runner.invoke(main_khal, ['calendar'])
+        assert not result.exception
+        assert 'myevent' in result.output
+        streamed = runner.invoke(main_khal, ['calendar', '--stream'])
+        assert not streamed.exception
+        assert streamed.output == result.output
+        streamed = runner.invoke(main_khal, ['list', '--stream', '01.06.2015', '10d'])
+        assert not streamed.exception
+        assert streamed.output == runner.invoke(main_khal, ['list', '01.06.2015', '10d']).output
+
+
 def test_long_calendar(runner):
     with freeze_time('2015-6-1'):
         runner = runner(default_command='calendar', days=100)
@@ -373,6 +410,22 @@ def test_printformats(runner):
     assert not result.exception
 
 
+def test_startup_imports():
+    """importing the cli must not pull in the heavy dependencies, they are only
+    imported by the subcommands needing them"""
+    code = ('import sys, khal.cli; '
+            'print(" ".join(sorted(set(m.split(".")[0] for m in sys.modules))))')
+    start = time.monotonic()
+    modules = subprocess.check_output([sys.executable, '-c', code]).decode().split()
+    duration = time.monotonic() - start
+    for heavy in ['icalendar', 'dateutil', 'pytz', 'configobj', 'validate',
+                  'xdg', 'tzlocal', 'sqlite3', 'urwid']:
+        assert heavy not in modules
+    # very generous, this is only meant to catch an eager import of the
+    # whole khalendar stack or similar regressions
+    assert duration < STARTUP_BUDGET
+
+
 def test_repeating(runner):
     runner = runner(default_command='list', days=2)
     now = datetime.datetime.now().strftime('%d.%m.%Y')
@@ -435,6 +488,76 @@ def test_search(runner):
     assert result.output.startswith('\x1b[34m\x1b[31m18:00')
 
 
+def test_search_range(runner):
+    runner = runner(default_command='calendar', days=2)
+    runner.calendars['one'].join('test.ics').write(_get_text('event_dt_simple'))
+    result = runner.invoke(main_khal, ['search', '--format', '{title}', 'Event'])
+    assert not result.exception
+    assert result.output == 'An Event\n'
+    for args, output in [(['--from', 'today'], '\n'),
+                         (['--from', '09.04.2014'], 'An Event\n'),
+                         (['--from', '09.04.2014 10:30'], '\n'),
+                         (['--to', '08.04.2014'], '\n'),
+                         (['--to', '09.04.2014 09:30'], '\n'),
+                         (['--to', '09.04.2014'], 'An Event\n')]:
+        result = runner.invoke(main_khal, ['search', '--format', '{title}'] + args + ['Event'])
+        assert not result.exception
+        assert result.output == output
+    # an all-day event starts at midnight, i.e., right at the end of the day before
+    runner.calendars['one'].join('test.ics').write(_get_text('event_d'))
+    for args, output in [(['--to', '08.04.2014'], '\n'),
+                         (['--to', '09.04.2014'], 'An Event\n')]:
+        result = runner.invoke(main_khal, ['search', '--format', '{title}'] + args + ['Event'])
+        assert not result.exception
+        assert result.output == output
+    result = runner.invoke(main_khal, ['search', '--from', 'foo', 'Event'])
+    assert result.exception
+    assert 'Invalid value of `foo`' in result.output
+
+
+def test_json_output(runner):
+    runner = runner(default_command='calendar', days=2)
+    now = datetime.datetime.now().strftime('%d.%m.%Y')
+    result = runner.invoke(main_khal, 'new {} 18:00 myevent :: foo'.format(now).split())
+    assert not result.exception
+
+    result = runner.invoke(main_khal, ['--color', 'list', '--ndjson'])
+    assert not result.exception
+    assert '\x1b' not in result.output
+    lines = result.output.splitlines()
+    assert len(lines) == 1
+    record = json.loads(lines[0])
+    assert record['summary'] == 'myevent'
+    assert record['calendar'] == 'one'
+    assert record['end'] - record['start'] == 3600
+    assert record['allday'] is False
+    assert record['recurring'] is False
+
+    result = runner.invoke(main_khal, ['list', '--json'])
+    assert not result.exception
+    assert json.loads(result.output) == [record]
+    result = runner.invoke(main_khal, ['at', '--json', '18:30'])
+    assert not result.exception
+    assert json.loads(result.output) == [record]
+    result = runner.invoke(main_khal, ['search', '--json', 'myevent'])
+    assert not result.exception
+    assert json.loads(result.output) == [record]
+    result = runner.invoke(main_khal, ['search', '--json', 'nothing'])
+    assert not result.exception
+    assert json.loads(result.output) == []
+
+
+def test_printics_json(runner):
+    runner = runner(command='printics', days=2)
+    result = runner.invoke(main_khal, ['printics', '--ndjson', _get_ics_filepath('cal_d')])
+    assert not result.exception
+    record = json.loads(result.output)
+    assert record['uid'] == 'V042MJ8B3SJNFXQOJL6P53OFMHJE8Z3VZWOU'
+    assert record['summary'] == 'An Event'
+    assert record['allday'] is True
+    assert record['end'] - record['start'] == 24 * 3600
+
+
 def test_no_default_new(runner):
     runner = runner(default_calendar=False)
     result = runner.invoke(main_khal, 'new 18:00 beer'.split())
@@ -90,6 +90,23 @@ class TestCalendar(object):
                 calendar, coll._local_ctag(calendar), coll._backend.get_ctag(calendar)))
         assert coll._needs_update(cal1) is False
 
+    def test_import_items(self, coll_vdirs):
+        """import several new items and one replacing an existing event"""
+        coll, vdirs = coll_vdirs
+
+        def item(uid, start, end):
+            return Item(event_allday_template.format(start, end).replace('uid3@host1.com', uid))
+
+        vdirs[cal1].upload(item('uid0', '20140409', '20140410'))
+        coll.update_db()
+        assert len(list(coll.get_events_on(aday))) == 1
+        items = [item('uid{}'.format(num), '20140410', '20140411') for num in range(6)]
+        assert coll.import_items(items, cal1) == 6
+        assert len(list(vdirs[cal1].list())) == 6
+        assert coll._needs_update(cal1) is False
+        assert len(list(coll.get_events_on(aday))) == 0
+        assert len(list(coll.get_events_on(bday))) == 6
+
 
 class TestVdirsyncerCompat(object):
     def test_list(self, coll_vdirs):
@@ -205,6 +222,66 @@ class TestCollection(object):
         assert len(list(vdirs[cal3].list())) == 0
         assert list(coll.get_localized(self.bstart_berlin, self.bend_berlin)) == []
 
+    def test_get_events_by_day(self, coll_vdirs):
+        """events spanning several days are fetched once and shared between days"""
+        coll, vdirs = coll_vdirs
+        event = Event.fromString(event_dt, calendar=cal1, locale=utils.LOCALE_BERLIN)
+        coll.new(event, cal1)
+        event = Event.fromString(event_allday_template.format('20140408', '20140412'),
+                                 calendar=cal2, locale=utils.LOCALE_BERLIN)
+        coll.new(event, cal2)
+        days = [(datetime.combine(day, time.min), datetime.combine(day, time.max))
+                for day in [date(2014, 4, 7) + timedelta(days=num) for num in range(6)]]
+        by_day = coll.get_events_by_day(days)
+        assert len(by_day) == 6
+        for (start, _), (events, events_float) in zip(days, by_day):
+            assert [ev.uid for ev in sorted(events + events_float)] == \
+                [ev.uid for ev in sorted(coll.get_events_on(start.date()))]
+        assert [len(events_float) for _, events_float in by_day] == [0, 1, 1, 1, 1, 0]
+        assert [len(events) for events, _ in by_day] == [0, 0, 1, 0, 0, 0]
+        assert by_day[1][1][0] is by_day[4][1][0]
+        assert by_day[1][1][0].color == 'dark blue'
+        assert by_day[2][0][0].color == 'dark blue'
+
+    def test_get_calendars_by_day(self, coll_vdirs):
+        coll, vdirs = coll_vdirs
+        event = Event.fromString(event_dt, calendar=cal1, locale=utils.LOCALE_BERLIN)
+        coll.new(event, cal1)
+        event = Event.fromString(event_allday_template.format('20140408', '20140412'),
+                                 calendar=cal2, locale=utils.LOCALE_BERLIN)
+        coll.new(event, cal2)
+        by_day = coll.get_calendars_by_day(date(2014, 4, 7), date(2014, 4, 12))
+        assert by_day == {
+            date(2014, 4, 7): set(),
+            date(2014, 4, 8): {cal2},
+            date(2014, 4, 9): {cal1, cal2},
+            date(2014, 4, 10): {cal2},
+            date(2014, 4, 11): {cal2},
+            date(2014, 4, 12): set(),
+        }
+        for day, calendars in by_day.items():
+            assert calendars == {event.calendar for event in coll.get_events_on(day)}
+
+    def test_get_styles_by_day(self, coll_vdirs):
+        coll, vdirs = coll_vdirs
+        event = Event.fromString(event_dt, calendar=cal1, locale=utils.LOCALE_BERLIN)
+        coll.new(event, cal1)
+        event = Event.fromString(event_allday_template.format('20140408', '20140412'),
+                                 calendar=cal2, locale=utils.LOCALE_BERLIN)
+        coll.new(event, cal2)
+        start, end = date(2014, 4, 7), date(2014, 4, 12)
+        for highlight, color, multiple in [(True, '', ''), (True, '', 'red'),
+                                           (True, 'red', ''), (False, '', '')]:
+            coll.highlight_event_days = highlight
+            coll.color = color
+            coll.multiple = multiple
+            styles = coll.get_styles_by_day(start, end)
+            assert sorted(styles) == [start + timedelta(days=num) for num in range(6)]
+            for day, style in styles.items():
+                assert style == coll.get_styles(day, False)
+        with freeze_time('2014-04-09'):
+            assert coll.get_styles_by_day(start, end)[date(2014, 4, 9)] == 'today'
+
     def test_get(self, coll_vdirs):
         """test getting an event by its href"""
         coll, vdirs = coll_vdirs
@@ -278,6 +355,78 @@ class TestCollection(object):
         coll.new(event, cal1)
         assert len(list(coll.search('Event'))) == 1
 
+    def test_search_range(self, coll_vdirs):
+        coll, vdirs = coll_vdirs
+        for name, calendar in [('event_dt_simple', cal1), ('event_dt_floating', cal2),
+                               ('event_rrule_recuid', cal1)]:
+            event = Event.fromString(_get_text(name), calendar=calendar,
+                                     locale=utils.LOCALE_BERLIN)
+            coll.new(event, calendar)
+
+        def search(search_string, **kwargs):
+            return sorted((event.summary, event.calendar)
+                          for event in coll.search(search_string, **kwargs))
+
+        assert search('An Event') == [('An Event', cal1), ('An Event', cal2)]
+        assert search('An Event', calendars=[cal2]) == [('An Event', cal2)]
+        assert search('An Event', start=datetime(2014, 4, 9, 10)) == [
+            ('An Event', cal1), ('An Event', cal2)]
+        assert search('An Event', start=datetime(2014, 4, 9, 11)) == []
+        assert search('An Event', end=datetime(2014, 4, 9, 9)) == []
+        # events starting exactly at `end` are not in the range
+        assert search('An Event', end=utils.BERLIN.localize(datetime(2014, 4, 9, 9, 30))) == []
+        assert search('An Event', end=datetime(2014, 4, 9, 9, 30)) == []
+        assert search('An Event', end=utils.BERLIN.localize(datetime(2014, 4, 9, 9, 31))) == [
+            ('An Event', cal1), ('An Event', cal2)]
+        # the master event is returned if any of its instances is in range
+        assert search('Arbeit', start=datetime(2014, 8, 1)) == [('Arbeit', cal1)]
+        assert search('Arbeit', start=datetime(2014, 8, 6)) == []
+        assert search('Arbeit', start=datetime(2014, 7, 1), end=datetime(2014, 7, 2)) == []
+
+    def test_search_pages(self, coll_vdirs):
+        coll, vdirs = coll_vdirs
+        for name, calendar in [('event_dt_simple', cal1), ('event_dt_floating', cal2),
+                               ('event_rrule_recuid', cal1)]:
+            event = Event.fromString(_get_text(name), calendar=calendar,
+                                     locale=utils.LOCALE_BERLIN)
+            coll.new(event, calendar)
+
+        pages = coll.search_pages('VEVENT', 2)
+        assert [len(page) for page in pages] == [2, 1]
+        pages = coll.search_pages('VEVENT', 3)
+        assert [len(page) for page in pages] == [3]
+        assert sorted(event.summary for page in coll.search_pages('VEVENT', 1)
+                      for event in page) == sorted(event.summary for event in coll.search('VEVENT'))
+        pages = coll.search_pages('An Event', 1, start=datetime(2014, 4, 9, 10))
+        assert [[event.summary for event in page] for page in pages] == [
+            ['An Event'], ['An Event']]
+        assert list(coll.search_pages('nothing', 10)) == []
+
+    def test_search_ids(self, coll_vdirs):
+        coll, vdirs = coll_vdirs
+        for name, calendar in [('event_dt_simple', cal1), ('event_dt_floating', cal2),
+                               ('event_rrule_recuid', cal1)]:
+            event = Event.fromString(_get_text(name), calendar=calendar,
+                                     locale=utils.LOCALE_BERLIN)
+            coll.new(event, calendar)
+
+        ids = coll.search_ids('VEVENT')
+        assert len(ids) == 3
+        assert ids == sorted(ids)
+        # LIKE ignores the case
+        events = coll.get_by_ids(coll.search_ids('an event'))
+        assert sorted((event.summary, event.calendar) for event in events) == [
+            ('An Event', cal1), ('An Event', cal2)]
+        assert coll.search_ids('Arbeit', candidates=coll.search_ids('An Event')) == []
+        arbeit = coll.search_ids('Arbeit', candidates=ids)
+        assert arbeit == coll.search_ids('Arbeit')
+        assert [event.summary for event in coll.get_by_ids(arbeit)] == ['Arbeit']
+        assert coll.get_by_ids([]) == []
+        # deleted events are skipped
+        event, = coll.get_by_ids(arbeit)
+        coll.delete(event.href, event.etag, event.calendar)
+        assert coll.get_by_ids(arbeit) == []
+
     def test_delete_two_events(self, coll_vdirs, sleep_time):
             """testing if we can delete any of two events in two different
             calendars with the same filename"""
@@ -398,3 +547,102 @@ def test_only_update_old_event(coll_vdirs, monkeypatch, sleep_time):
     coll.update_db()
     sleep(sleep_time)
     assert updated_hrefs == [href_three]
+
+
+def test_update_db_max_age(coll_vdirs, sleep_time):
+    coll, vdirs = coll_vdirs
+    max_age = timedelta(minutes=5)
+
+    def upload(uid):
+        vdirs[cal1].upload(coll.new_event(dedent("""
+        BEGIN:VEVENT
+        UID:{}
+        DTSTART;VALUE=DATE:20140909
+        DTEND;VALUE=DATE:20140910
+        SUMMARY:meeting
+        END:VEVENT
+        """).format(uid), cal1))
+        sleep(sleep_time)
+
+    def uids():
+        return sorted(event.uid for event in coll.get_events_on(date(2014, 9, 9)))
+
+    # the collection was synced without max_age, so no time was recorded
+    upload('one')
+    coll.update_db(max_age=max_age)
+    assert uids() == ['one']
+    assert coll._backend.get_synced(cal1) is not None
+
+    # we trust the db for `max_age`
+    upload('two')
+    coll.update_db(max_age=max_age)
+    assert uids() == ['one']
+    assert coll.needs_update()
+    # unless asked not to
+    coll.update_db()
+    assert uids() == ['one', 'two']
+
+    upload('three')
+    coll._backend.set_synced(coll._backend.get_synced(cal1) - 600, cal1)
+    coll.update_db(max_age=max_age)
+    assert uids() == ['one', 'three', 'two']
+
+
+def test_update_db_changes(coll_vdirs, sleep_time):
+    coll, vdirs = coll_vdirs
+    simple = _get_text('event_dt_simple')
+    href, etag = vdirs[cal1].upload(Item(simple))
+    sleep(sleep_time)
+    assert coll.update_db() == [(cal1, datetime(2014, 4, 9, 9, 30), datetime(2014, 4, 9, 10, 30))]
+    assert coll.update_db() == []
+
+    # changed events are reported as they were before and as they are now
+    etag = vdirs[cal1].update(href, Item(simple.replace('20140409', '20140410')), etag)
+    sleep(sleep_time)
+    assert coll.update_db() == [
+        (cal1, datetime(2014, 4, 9, 9, 30), datetime(2014, 4, 9, 10, 30)),
+        (cal1, datetime(2014, 4, 10, 9, 30), datetime(2014, 4, 10, 10, 30)),
+    ]
+
+    vdirs[cal1].delete(href, etag)
+    sleep(sleep_time)
+    assert coll.update_db() == [(cal1, datetime(2014, 4, 10, 9, 30), datetime(2014, 4, 10, 10, 30))]
+
+
+def test_delete_many(coll_vdirs):
+    coll, vdirs = coll_vdirs
+    recurring = Event.fromString(_get_text('event_dt_rr'), calendar=cal1,
+                                 locale=utils.LOCALE_BERLIN)
+    allday = Event.fromString(event_allday_template.format('20140409', '20140410'),
+                              calendar=cal1, locale=utils.LOCALE_BERLIN)
+    simple = Event.fromString(event_dt, calendar=cal2, locale=utils.LOCALE_BERLIN)
+    for event in [recurring, allday, simple]:
+        coll.new(event)
+    assert len(list(coll.get_events_on(date(2014, 4, 9)))) == 3
+
+    updates = list()
+    update = coll._storages[cal1].update
+
+    def counting(href, item, etag, sync=True):
+        updates.append((href, sync))
+        return update(href, item, etag, sync)
+    coll._storages[cal1].update = counting
+
+    with pytest.raises(khal.khalendar.exceptions.ReadOnlyCalendarError):
+        coll.delete_many([('doesnt_matter.ics', 'etag', 'a_calendar')])
+    coll.delete_many(
+        [(allday.href, allday.etag, cal1), (simple.href, simple.etag, cal2)],
+        [(recurring.href, cal1, datetime(2014, 4, 10, 9, 30)),
+         (recurring.href, cal1, datetime(2014, 4, 12, 9, 30))],
+    )
+    # the recurring event is rewritten once, for both instances
+    assert updates == [(recurring.href, False)]
+    assert [event.summary for event in coll.get_events_on(date(2014, 4, 9))] == ['An Event']
+    assert list(coll.get_events_on(date(2014, 4, 10))) == []
+    assert len(list(coll.get_events_on(date(2014, 4, 11)))) == 1
+    assert list(coll.get_events_on(date(2014, 4, 12))) == []
+    assert len(list(vdirs[cal1].list())) == 1
+    assert list(vdirs[cal2].list()) == []
+    assert 'EXDATE' in coll.get_event(recurring.href, cal1).raw
+    assert coll._needs_update(cal1) is False
+    assert coll._needs_update(cal2) is False
@@ -3,8 +3,9 @@ import icalendar
 import pytz
 
 from khal.khalendar import utils
+from khal.khalendar.event import Event
 
-from .utils import _get_text, _get_vevent_file
+from .utils import _get_text, _get_vevent_file, LOCALE_BERLIN
 
 # FIXME this file is in urgent need of a clean up
 
@@ -804,3 +805,15 @@ class TestIsAware():
 
     def test_utc(self):
         assert utils.is_aware(pytz.UTC.localize(datetime.now())) is True
+
+
+def test_merge_events():
+    def event(name):
+        return Event.fromString(_get_text(name), locale=LOCALE_BERLIN, calendar='foobar')
+
+    london = event('event_dt_london')  # 15:00 Berlin
+    simple = event('event_dt_simple')  # 09:30 Berlin
+    allday = event('event_d')
+    floating = event('event_dt_floating')  # 09:30 floating
+    merged = list(utils.merge_events([simple, london], [allday, floating], BERLIN))
+    assert merged == [allday, simple, floating, london]
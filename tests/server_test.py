@@ -0,0 +1,77 @@
+import os
+import threading
+
+import pytest
+from click import unstyle
+
+from khal import server
+from khal.cli import build_collection, main_khal
+from khal.exceptions import FatalError
+from khal.settings import get_config
+
+from .cli_test import runner  # noqa
+from .utils import _get_text
+
+
+@pytest.fixture
+def served(runner):  # noqa
+    runner = runner(default_command='list')
+    runner.calendars['one'].join('test.ics').write(_get_text('event_dt_simple'))
+    conf = get_config(str(runner.config_file))
+    built = list()
+
+    def _build_collection(conf, selection):
+        built.append(selection)
+        return build_collection(conf, selection)
+
+    khal_server = server.Server(conf, _build_collection)
+    thread = threading.Thread(target=khal_server.serve_forever)
+    thread.start()
+    yield runner, conf, built
+    khal_server.shutdown()
+    thread.join()
+    khal_server.server_close()
+    assert not os.path.exists(server.socket_path(conf))
+
+
+def test_request(served):
+    _, conf, built = served
+    args = {'daterange': ['09.04.2014'], 'format': '{title}', 'day_format': ''}
+    assert [unstyle(row) for row in server.request(conf, 'list', None, args)] == ['An Event']
+    assert [unstyle(row) for row in server.request(conf, 'list', {'one'}, args)] == ['An Event']
+    assert [unstyle(row) for row in server.request(conf, 'list', None, args)] == ['An Event']
+    # one collection per calendar selection, kept between requests
+    assert built == [None, frozenset({'one'})]
+
+    with pytest.raises(FatalError):
+        list(server.request(conf, 'at', None, {'datetime': ['foo']}))
+
+
+def test_cli_uses_server(served):
+    khal_runner, conf, built = served
+    result = khal_runner.invoke(main_khal, ['list', '-f', '{title}', '-df', '', '09.04.2014'])
+    assert not result.exception
+    assert result.output == 'An Event\n'
+    assert built == [None]
+
+    # changes to the vdirs are picked up by the running server
+    khal_runner.calendars['one'].join('test.ics').remove()
+    result = khal_runner.invoke(main_khal, ['list', '-f', '{title}', '-df', '', '09.04.2014'])
+    assert not result.exception
+    assert result.output == 'No events\n'
+    assert built == [None]
+
+
+def test_no_server(runner):  # noqa
+    runner = runner(default_command='list')
+    conf = get_config(str(runner.config_file))
+    assert server.request(conf, 'list', None, {}) is None
+    # a stale socket, e.g., after khal serve was killed
+    open(server.socket_path(conf), 'w').close()
+    assert server.request(conf, 'list', None, {}) is None
+
+
+def test_already_running(served):
+    _, conf, _ = served
+    with pytest.raises(FatalError):
+        server.Server(conf, build_collection)
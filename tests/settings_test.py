@@ -7,7 +7,7 @@ from tzlocal import get_localzone
 
 from .utils import LOCALE_BERLIN
 
-from khal.settings import get_config
+from khal.settings import get_config, cache
 from khal.settings.exceptions import InvalidSettingsError, \
     CannotParseConfigFileError
 from khal.settings.utils import get_all_vdirs, get_unique_name, config_checks, \
@@ -38,7 +38,8 @@ class TestSettings(object):
                 'print_new': 'False',
                 'highlight_event_days': False,
                 'timedelta': dt.timedelta(days=2),
-                'show_all_days': False
+                'show_all_days': False,
+                'sync_interval': dt.timedelta(0),
             }
         }
         for key in comp_config:
@@ -81,7 +82,8 @@ class TestSettings(object):
                 'print_new': 'False',
                 'highlight_event_days': False,
                 'timedelta': dt.timedelta(days=2),
-                'show_all_days': False
+                'show_all_days': False,
+                'sync_interval': dt.timedelta(0),
             }
         }
         for key in comp_config:
@@ -189,6 +191,44 @@ def test_discover(metavdirs):
     }
 
 
+def test_config_cache(metavdirs, monkeypatch):
+    monkeypatch.setattr('xdg.BaseDirectory.xdg_data_home', metavdirs + '/data')
+    conf_path = metavdirs + '/config'
+    with open(conf_path, 'w') as conf:
+        conf.write('[calendars]\n'
+                   '[[cal1]]\n'
+                   'path = {}/cal1/*\n'
+                   'type = discover\n'
+                   '[sqlite]\n'
+                   'path = {}/khal.db\n'.format(metavdirs, metavdirs))
+    assert cache.load(conf_path) is None
+    config = get_config(conf_path, use_cache=True)
+    assert set(config['calendars']) == {'my calendar', 'my private calendar'}
+    assert os.path.exists(cache.cache_path(conf_path))
+    assert cache.load(conf_path) == config
+    assert get_config(conf_path, use_cache=True) == config
+
+    # a calendar's color changed
+    with open(metavdirs + '/cal1/public/color', 'w') as metafile:
+        metafile.write('dark red')
+    assert cache.load(conf_path) is None
+    config = get_config(conf_path, use_cache=True)
+    assert config['calendars']['my calendar']['color'] == 'dark red'
+    assert cache.load(conf_path) == config
+
+    # a new calendar was discovered
+    os.makedirs(metavdirs + '/cal1/new/')
+    assert cache.load(conf_path) is None
+    config = get_config(conf_path, use_cache=True)
+    assert set(config['calendars']) == {'my calendar', 'my private calendar', 'new'}
+
+    # the configuration file changed
+    with open(conf_path, 'a') as conf:
+        conf.write('[locale]\nfirstweekday = 6\n')
+    assert cache.load(conf_path) is None
+    assert get_config(conf_path, use_cache=True)['locale']['firstweekday'] == 6
+
+
 def test_get_unique_name(metavdirs):
     path = metavdirs
     vdirs = [vdir for vdir in get_all_vdirs(path + '/*/*')]
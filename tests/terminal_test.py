@@ -1,4 +1,4 @@
-from khal.terminal import merge_columns, colored
+from khal.terminal import merge_columns, iter_merge_columns, colored
 
 
 def test_colored():
@@ -29,3 +29,11 @@ class TestMergeColumns:
         right = ['123456', '234567']
         out = ['uiae    123456', 'nrtd    234567', 'xvlc    ']
         assert merge_columns(left, right, width=4) == out
+
+    def test_iter(self):
+        left = ['uiae', 'nrtd', 'xvlc']
+        right = ['123456', '234567']
+        assert list(iter_merge_columns(iter(left), iter(right), width=4)) == \
+            merge_columns(left, right, width=4)
+        assert list(iter_merge_columns(iter(right), iter(left), width=6)) == \
+            merge_columns(right, left, width=6)
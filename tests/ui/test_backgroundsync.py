@@ -0,0 +1,93 @@
+import asyncio
+import os
+from datetime import date, datetime
+from operator import methodcaller
+
+from khal.khalendar import CalendarCollection
+from khal.khalendar.event import Event
+from khal.ui import BackgroundSync, StorageTasks, _changed_days
+
+from ..utils import LOCALE_BERLIN, _get_text, cal1
+
+
+def _collection(tmpdir):
+    path = str(tmpdir.join(cal1))
+    os.makedirs(path)
+    calendars = {cal1: {'name': cal1, 'path': path, 'color': 'dark blue',
+                        'readonly': False, 'unicode_symbols': True}}
+    return CalendarCollection(calendars=calendars, dbpath=str(tmpdir.join('khal.db')),
+                              locale=LOCALE_BERLIN, sync=False)
+
+
+def test_storage_tasks(tmpdir):
+    coll = _collection(tmpdir)
+    loop = asyncio.new_event_loop()
+    alerts = list()
+    tasks = StorageTasks(coll, alerts.append, loop=loop)
+
+    event = Event.fromString(_get_text('event_dt_simple'), calendar=cal1, locale=LOCALE_BERLIN)
+    done = list()
+    future = tasks.submit(methodcaller('new', event), on_done=done.append, message='saved')
+    assert tasks.pending == 1
+    loop.run_until_complete(future)
+    assert tasks.pending == 0
+    assert done == [None]
+    assert alerts == ['saved']
+    assert event.etag is not None
+    # the task's collection has a db connection of its own, but the same db
+    assert [one.summary for one in coll.get_events_on(date(2014, 4, 9))] == ['An Event']
+
+    # tasks are run one after the other, errors are shown as alerts
+    tasks.submit(methodcaller('delete', event.href, event.etag, cal1))
+    tasks.submit(methodcaller('delete', event.href, event.etag, cal1))
+    tasks.wait()
+    assert list(coll.get_events_on(date(2014, 4, 9))) == []
+    assert len(alerts) == 2
+    assert alerts[1][0] == 'alert'
+    loop.close()
+
+
+def test_background_sync(tmpdir):
+    coll = _collection(tmpdir)
+    tmpdir.join(cal1, 'event.ics').write(_get_text('event_dt_simple'))
+    assert coll.needs_update()
+    assert list(coll.get_events_on(date(2014, 4, 9))) == []
+
+    loop = asyncio.new_event_loop()
+    tasks = StorageTasks(coll, lambda _: None, loop=loop)
+    done = list()
+    sync = BackgroundSync(tasks, coll, done.append)
+    assert sync.start()
+    # only one update at a time
+    assert not sync.start()
+    tasks.wait()
+    assert done == [[(cal1, datetime(2014, 4, 9, 9, 30), datetime(2014, 4, 9, 10, 30))]]
+    assert not sync.running
+    assert not coll.needs_update()
+    assert [event.summary for event in coll.get_events_on(date(2014, 4, 9))] == ['An Event']
+
+    # a failing update is reported, too
+    tasks = StorageTasks(coll, lambda _: None, loop=loop)
+    sync = BackgroundSync(tasks, coll, done.append)
+
+    def broken_fork():
+        raise OSError()
+    coll.fork = broken_fork
+    assert sync.start()
+    tasks.wait()
+    assert done[1:] == [None]
+    loop.close()
+
+
+def test_changed_days():
+    assert _changed_days([]) == []
+    assert _changed_days([
+        (cal1, datetime(2017, 3, 5, 10), datetime(2017, 3, 5, 11)),
+        # all-day events end at midnight of the following day
+        (cal1, datetime(2017, 3, 1), datetime(2017, 3, 2)),
+        (cal1, datetime(2017, 3, 2, 23), datetime(2017, 3, 3, 1)),
+        (cal1, datetime(2017, 3, 8, 10), datetime(2017, 3, 8, 10)),
+        (cal1, datetime(2017, 3, 6), datetime(2017, 3, 7)),
+    ]) == [(date(2017, 3, 1), date(2017, 3, 3)),
+           (date(2017, 3, 5), date(2017, 3, 6)),
+           (date(2017, 3, 8), date(2017, 3, 8))]
@@ -61,3 +61,65 @@ def test_set_focus_date_weekstart_6():
             day = today + timedelta(days=diff)
             frame.set_focus_date(day)
             assert frame.focus_date == day
+
+
+def test_get_styles_range():
+    """if a function returning the styles of many dates at once is given, it
+    is used for constructing whole months"""
+    ranges = list()
+    single = list()
+
+    def get_styles(day, focus):
+        single.append(day)
+        return 'reveal focus' if focus else None
+
+    def get_styles_range(start, end):
+        ranges.append((start, end))
+        return {start + timedelta(days=num): 'calendar one' if num % 2 else None
+                for num in range((end - start).days + 1)}
+
+    frame = CalendarWidget(on_date_change=lambda _: None,
+                           keybindings=keybindings,
+                           on_press=on_press,
+                           initial=date(2017, 6, 15),
+                           get_styles=get_styles,
+                           get_styles_range=get_styles_range)
+    assert ranges == [(date(2017, 5, 29), date(2017, 7, 2))]
+    # only for setting the cursor
+    assert len(single) <= 3
+    num_single = len(single)
+    frame.walker._autoextend()
+    assert ranges[-1] == (date(2017, 6, 26), date(2017, 8, 6))
+    assert len(single) == num_single
+
+
+def test_unload_distant_months():
+    frame = CalendarWidget(on_date_change=lambda _: None,
+                           keybindings=keybindings,
+                           on_press=on_press,
+                           initial=date(2017, 1, 15),
+                           weeknumbers='right',
+                           loaded_weeks=2)
+    walker = frame.walker
+    day = date(2017, 1, 15)
+    while day < date(2017, 6, 15):
+        day += timedelta(days=7)
+        frame.set_focus_date(day)
+        walker.unload_distant_months()
+        assert walker.focus_date == day
+        # only whole months are removed, and only if none of their weeks is
+        # less than `loaded_weeks` away
+        assert walker[0][7].date.day <= 7
+        assert day - timedelta(weeks=2 + 6) <= walker.earliest_date
+        assert walker.earliest_date <= max(day - timedelta(weeks=2), date(2016, 12, 26))
+        assert len(walker) < 4 * 5
+    assert walker.earliest_date >= date(2017, 4, 24)
+
+    # removed months are rebuilt without weeks occurring twice or missing
+    frame.set_focus_date(date(2017, 1, 3))
+    days = [week[column].date for week in walker for column in range(1, 8)]
+    assert days == [days[0] + timedelta(days=num) for num in range(len(days))]
+    assert walker.focus_date == date(2017, 1, 3)
+    walker.unload_distant_months()
+    assert walker.latest_date <= date(2017, 3, 5)
+    assert walker.focus_date == date(2017, 1, 3)
@@ -0,0 +1,90 @@
+from datetime import date, timedelta
+
+from khal.khalendar.event import Event
+from khal.ui import ALL, DayWalker, U_Event
+
+from ..utils import LOCALE_BERLIN, _get_text, cal1
+
+CONF = {
+    'locale': LOCALE_BERLIN,
+    'view': {'agenda_event_format': '{start-end-time-style} {title}'},
+}
+
+
+def test_daywalker(coll_vdirs):
+    coll, _ = coll_vdirs
+    coll.new(Event.fromString(_get_text('event_dt_simple'), calendar=cal1,
+                              locale=LOCALE_BERLIN))
+    calls = list()
+    get_events_by_day = coll.get_events_by_day
+
+    def counting(days):
+        calls.append(days)
+        return get_events_by_day(days)
+    coll.get_events_by_day = counting
+
+    start = date(2014, 4, 1)
+    walker = DayWalker(start, None, CONF, coll, delete_status=lambda _: False)
+    # the day before is loaded as well
+    assert len(calls) == 2
+
+    # the following days have been prefetched (the walker always contains
+    # the day after the focused one)
+    walker.ensure_date(start + timedelta(days=walker.prefetch_days - 2))
+    assert len(calls) == 2
+    pile, = [pile for pile in walker if pile.date == date(2014, 4, 9)]
+    assert [uevent.original_widget.event.summary
+            for uevent in pile.original_widget.body[1:]] == ['An Event']
+
+    # days far away from the focus are unloaded, days we have seen are reused
+    walker.ensure_date(start + timedelta(days=100))
+    assert len(walker) == walker.loaded_days + 2
+    assert walker[0].date == start + timedelta(days=100 - walker.loaded_days)
+    assert len(walker._cached) <= walker.cached_days
+    num_calls = len(calls)
+    pile = walker._cached[start + timedelta(days=50)]
+    walker.ensure_date(start + timedelta(days=50))
+    assert len(calls) == num_calls
+    assert walker[walker.focus] is pile
+
+    # after an update, days are fetched again
+    walker.update_range(start, start + timedelta(days=60))
+    assert len(calls) > num_calls
+    assert walker[walker.focus] is not pile
+    assert start + timedelta(days=8) not in walker._cached
+
+
+def test_uevent_title(coll_vdirs):
+    coll, _ = coll_vdirs
+    event = Event.fromString(_get_text('event_dt_simple'), calendar=cal1, locale=LOCALE_BERLIN)
+    coll.new(event)
+    conf = dict(CONF, locale=dict(LOCALE_BERLIN, unicode_symbols=False))
+    deleted = set()
+    formatted = list()
+    format_ = event.format
+
+    def counting(*args, **kwargs):
+        formatted.append(args)
+        return format_(*args, **kwargs)
+    event.format = counting
+
+    uevent = U_Event(event, conf, lambda recuid: ALL if recuid in deleted else False,
+                     this_date=date(2014, 4, 9))
+    assert uevent.text == ' 09:30-10:30 An Event'
+    assert len(formatted) == 1
+    # nothing changed, nothing to do
+    uevent.set_title()
+    assert len(formatted) == 1
+
+    deleted.add(uevent.recuid)
+    uevent.set_title()
+    assert uevent.text == 'D 09:30-10:30 An Event'
+    assert len(formatted) == 2
+
+    # edited events get a new etag
+    deleted.clear()
+    event.update_summary('Another Event')
+    coll.update(event)
+    uevent.set_title()
+    assert uevent.text == ' 09:30-10:30 Another Event'
+    assert len(formatted) == 3
@@ -0,0 +1,168 @@
+import urwid
+
+from khal.khalendar.event import Event
+from khal.ui import IncrementalSearch, SearchDialog, SearchWalker
+
+from ..utils import LOCALE_BERLIN, _get_text, cal1, cal2
+
+
+def test_searchwalker():
+    fetched = list()
+
+    def pages():
+        for num in range(5):
+            fetched.append(num)
+            yield ['result {}'.format(num * 3 + one) for one in range(3)]
+
+    walker = SearchWalker(pages(), urwid.SelectableIcon)
+    # the first page is there right away
+    assert fetched == [0]
+    assert len(walker) == 3
+
+    # only as many pages as are needed to fill the list box (and to see if
+    # there are more results) are fetched
+    listbox = urwid.ListBox(walker)
+    listbox.render((20, 4))
+    assert fetched == [0, 1]
+    assert len(walker) == 6
+
+    for _ in range(5):
+        listbox.keypress((20, 4), 'down')
+    listbox.render((20, 4))
+    assert fetched == [0, 1]
+    assert listbox.focus.text == 'result 5'
+    listbox.keypress((20, 4), 'down')
+    assert fetched == [0, 1, 2]
+    assert listbox.focus.text == 'result 6'
+
+    # nothing is fetched anymore after the search got cancelled
+    walker.cancel()
+    for _ in range(10):
+        listbox.keypress((20, 4), 'down')
+    listbox.render((20, 4))
+    assert fetched == [0, 1, 2]
+    assert listbox.focus.text == 'result 8'
+
+
+def test_searchwalker_exhausted():
+    walker = SearchWalker(iter([['one', 'two']]), urwid.SelectableIcon)
+    listbox = urwid.ListBox(walker)
+    listbox.render((20, 4))
+    assert [text.text for text in walker] == ['one', 'two']
+    assert walker.get_next(1) == (None, None)
+
+
+def test_incremental_search(coll_vdirs):
+    coll, _ = coll_vdirs
+    for name, calendar in [('event_dt_simple', cal1), ('event_dt_floating', cal2),
+                           ('event_rrule_recuid', cal1)]:
+        coll.new(Event.fromString(_get_text(name), calendar=calendar, locale=LOCALE_BERLIN))
+    searches = list()
+    search_ids = coll.search_ids
+
+    def counting(search_string, candidates=None):
+        searches.append((search_string, candidates))
+        return search_ids(search_string, candidates)
+    coll.search_ids = counting
+
+    search = IncrementalSearch(coll)
+    everything = search.search('EVENT')
+    assert len(everything) == 3
+    # extended search terms only look at the previous results
+    assert search.search('vevent') == everything
+    assert searches[-1] == ('vevent', everything)
+    an_event = search.search('an Event')
+    assert searches[-1] == ('an Event', everything)
+    assert len(an_event) == 2
+    assert search.search('An Event') == an_event
+    assert len(searches) == 3
+    # going back to a shorter term needs another query, the results of the
+    # longer terms are dropped (as are those of 'event', which 'an Even'
+    # doesn't extend), so all events are searched
+    assert search.search('an Even') == search_ids('an Even')
+    assert len(searches) == 4
+    assert searches[-1] == ('an Even', None)
+    # extending it again only looks at its results
+    assert search.search('an Event') == an_event
+    assert searches[-1] == ('an Event', search_ids('an Even'))
+
+    count, pages = search.pages('an Event', page_size=1)
+    assert count == 2
+    assert sorted(event.summary for page in pages for event in page) == ['An Event', 'An Event']
+
+
+def test_search_dialog_preview(coll_vdirs):
+    coll, _ = coll_vdirs
+    coll.new(Event.fromString(_get_text('event_dt_simple'), calendar=cal1, locale=LOCALE_BERLIN))
+    search = IncrementalSearch(coll)
+    searched = list()
+
+    def preview(search_term):
+        count, pages = search.pages(search_term)
+        return count, SearchWalker(pages, lambda event: urwid.Text(event.summary))
+
+    dialog = SearchDialog(searched.append, None, preview_func=preview)
+    size = (40, )
+    for key in 'an':
+        dialog.keypress(size, key)
+    assert 'matching event(s)' in _text(dialog.render(size))
+    assert 'An Event' in _text(dialog.render(size))
+    for key in ['backspace', 'backspace']:
+        dialog.keypress(size, key)
+    assert 'An Event' not in _text(dialog.render(size))
+    for key in 'qqq':
+        dialog.keypress(size, key)
+    assert '0 matching event(s)' in _text(dialog.render(size))
+    dialog.keypress(size, 'enter')
+    assert searched == ['qqq']
+
+
+class AlarmLoop(object):
+    """stands in for urwid.MainLoop, alarms only go off when the test says so"""
+
+    def __init__(self):
+        self.alarms = list()
+
+    def set_alarm_in(self, seconds, callback):
+        self.alarms.append(callback)
+        return callback
+
+    def remove_alarm(self, handle):
+        self.alarms.remove(handle)
+        return True
+
+    def ring(self):
+        for callback in self.alarms:
+            callback(self, None)
+        self.alarms = list()
+
+
+def test_search_dialog_delayed_preview():
+    previewed = list()
+
+    def preview(search_term):
+        previewed.append(search_term)
+        return 0, SearchWalker(iter([]), urwid.Text)
+
+    for close in ['enter', 'esc']:
+        loop = AlarmLoop()
+        searched = list()
+        dialog = SearchDialog(searched.append, None, preview_func=preview, loop=loop)
+        size = (40, )
+        for key in 'an':
+            dialog.keypress(size, key)
+        # only the last keypress schedules a preview
+        assert len(loop.alarms) == 1
+        loop.ring()
+        assert previewed[-1] == 'an'
+        dialog.keypress(size, 'd')
+        assert len(loop.alarms) == 1
+        # closing the dialog cancels the pending preview
+        dialog.keypress(size, close)
+        assert loop.alarms == []
+        assert previewed[-1] == 'an'
+        assert searched == (['and'] if close == 'enter' else [])
+
+
+def _text(canvas):
+    return b'\n'.join(canvas.text).decode('utf-8')
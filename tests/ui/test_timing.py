@@ -0,0 +1,31 @@
+import urwid
+
+from khal.ui.timing import RENDER_TIMES, timed
+
+
+class TimedText(urwid.Text):
+
+    @timed
+    def render(self, size, focus=False):
+        return super().render(size, focus)
+
+
+def test_render_times():
+    text = TimedText('some text')
+    RENDER_TIMES.reset()
+    text.render((20, ))
+    assert 'TimedText' not in RENDER_TIMES.report()
+
+    RENDER_TIMES.enabled = True
+    try:
+        text.render((20, ))
+        canvas = text.render((30, ))
+        # unchanged widgets are taken from urwid's canvas cache (as long as
+        # the canvas is still around)
+        assert text.render((30, )) is canvas
+    finally:
+        RENDER_TIMES.enabled = False
+    report = RENDER_TIMES.report().splitlines()
+    assert report[0] == 'render times:'
+    assert report[1].startswith('TimedText: 2 renders, ')
+    RENDER_TIMES.reset()
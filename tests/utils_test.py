@@ -3,6 +3,7 @@ from datetime import date, datetime, time, timedelta
 from collections import OrderedDict
 import textwrap
 import random
+import sys
 
 import icalendar
 from freezegun import freeze_time
@@ -146,6 +147,28 @@ class TestGuessDatetimefstr:
                 '2017-1-1 16:30'.split(), locale=locale, default_day=datetime.today(),
             )
 
+    @pytest.mark.parametrize('dtformat,string', [
+        ('%d.%m.%Y', '1.2.2017'),
+        ('%d.%m.%Y', '01.02.2017'),
+        ('%d.%m.', '28.02.'),
+        ('%m/%d/%Y %I:%M %p', '02/01/2017 10:30 pm'),
+        ('%Y-%m-%dT%H:%M', '2017-02-01t10:30'),
+        ('%d %b %Y', '1 Feb 2017'),
+        ('%d%%%m', '1%2'),
+    ])
+    def test_format_re(self, dtformat, string):
+        """the regular expressions used for ruling out formats must accept
+        everything strptime() accepts"""
+        datetime.strptime(string, dtformat)
+        assert utils._format_re(dtformat).match(string)
+        assert not utils._format_re(dtformat).match('x' + string)
+
+    def test_format_re_rules_out(self):
+        assert not utils._format_re('%d.%m.%Y').match('today')
+        assert not utils._format_re('%d.%m.%Y').match('1.2.2017x')
+        assert not utils._format_re('%d.%m.%Y %H:%M').match('1.2.2017')
+        assert not utils._format_re('%H:%M').match('Europe/Berlin')
+
 
 class TestGuessTimedeltafstr:
 
@@ -209,6 +232,18 @@ class TestGuessRangefstr:
             assert (datetime(2016, 9, 19, 16), datetime(2016, 9, 19, 17), False) == \
                 guessrangefstr('16:00 17:00', locale=LOCALE_BERLIN)
 
+    def test_time_with_spaces(self):
+        """the time after a weekday's name might be more than one element"""
+        locale = dict(LOCALE_BERLIN, timeformat='%I:%M %p',
+                      datetimeformat='%d.%m. %I:%M%p', longdatetimeformat='%d.%m.%Y %I:%M%p')
+        with freeze_time('2016-9-19 13:34'):
+            assert (datetime(2016, 9, 20, 22, 30), datetime(2016, 9, 20, 23, 30), False) == \
+                guessrangefstr('tomorrow 10:30 pm', locale=locale)
+            assert (datetime(2016, 9, 20, 22, 30), datetime(2016, 9, 20, 23), False) == \
+                guessrangefstr('tomorrow 10:30 pm 11:00 pm', locale=locale)
+            assert (datetime(2016, 9, 19, 22, 30), datetime(2016, 9, 19, 23, 30), False) == \
+                guessrangefstr('10:30 pm', locale=locale)
+
     def test_start_and_end_date(self):
         assert (datetime(2016, 1, 1), datetime(2017, 1, 2), True) == \
             guessrangefstr('1.1.2016 1.1.2017', locale=LOCALE_BERLIN)
@@ -612,6 +647,60 @@ def test_split_ics_random_uid():
     assert sorted(vevents1) == sorted(part1)
 
 
+def test_iter_split_ics():
+    cal = _get_text('cal_lots_of_timezones')
+    vevents = list(utils.iter_split_ics(cal))
+    assert len(vevents) == 2
+
+    vevents0 = vevents[0].split('\r\n')
+    vevents1 = vevents[1].split('\r\n')
+    part0 = _get_text('part0').split('\n')
+    part1 = _get_text('part1').split('\n')
+    assert _get_TZIDs(vevents0) == _get_TZIDs(part0)
+    assert _get_TZIDs(vevents1) == _get_TZIDs(part1)
+
+    # the same, but from the lines of a file with folded lines
+    cal = cal.replace('SUMMARY:An Event', 'SUMMARY:An\r\n  Event')
+    cal = cal.replace('UID:abcde', 'UI\r\n D:ab\r\n\tcde')
+    cal = cal.replace('RDATE;TZID=IndianReunion', 'RDATE;TZ\r\n ID=IndianReunion')
+    vevents = list(utils.iter_split_ics(line.encode('utf-8') for line in cal.splitlines(True)))
+    assert _get_TZIDs(vevents[1].split('\r\n')) == _get_TZIDs(part1)
+    for vevent, uid in zip(vevents, ['123', 'abcde']):
+        for event in icalendar.Calendar.from_ical(vevent).walk('VEVENT'):
+            assert event['UID'] == uid
+            assert event['SUMMARY'].startswith('An ')
+
+
+def test_iter_split_ics_random_uid():
+    cal = _get_text('cal_lots_of_timezones')
+    vevents = list(utils.iter_split_ics(cal, random_uid=True))
+    assert len(vevents) == 2
+    uids = set()
+    for vevent in vevents:
+        events = icalendar.Calendar.from_ical(vevent).walk('VEVENT')
+        assert len({str(event['UID']) for event in events}) == 1
+        uids.add(str(events[0]['UID']))
+    assert len(uids) == 2
+    assert not uids & {'123', 'abcde'}
+
+
+def test_iter_split_ics_alarm_and_no_uid():
+    vevents = list(utils.iter_split_ics('\r\n'.join([
+        'BEGIN:VEVENT',
+        'SUMMARY:no uid',
+        'DTSTART;VALUE=DATE:20140409',
+        'BEGIN:VALARM',
+        'UID:alarm',
+        'TRIGGER:-PT15M',
+        'END:VALARM',
+        'END:VEVENT',
+    ])))
+    assert len(vevents) == 1
+    event = icalendar.Calendar.from_ical(vevents[0]).walk('VEVENT')[0]
+    assert event['UID'] != 'alarm'
+    assert event.walk('VALARM')[0]['UID'] == 'alarm'
+
+
 def test_relative_timedelta_str():
     with freeze_time('2016-9-19'):
         assert utils.relative_timedelta_str(date(2016, 9, 24)) == '5 days from now'
@@ -672,15 +761,55 @@ def test_color_wrap_256():
         "elitr, sed diam nonumy\x1b[0m"
     )
     expected = [
-        "\x1b[38;2;17;255;0mLorem ipsum\x1b[0m",
-        "\x1b[38;2;17;255;0mdolor sit amet, consetetur\x1b[0m",
-        "\x1b[38;2;17;255;0msadipscing elitr, sed diam\x1b[0m",
-        "\x1b[38;2;17;255;0mnonumy\x1b[0m"
+        "\x1b[38;2;17;255;0mLorem ipsum dolor sit amet,\x1b[0m",
+        "\x1b[38;2;17;255;0mconsetetur sadipscing elitr,\x1b[0m",
+        "\x1b[38;2;17;255;0msed diam nonumy\x1b[0m"
     ]
 
     assert utils.color_wrap(text, 30) == expected
 
 
+def test_color_wrap_attributes():
+    """all attributes in effect at the end of a line are enabled again on
+    the next one"""
+    text = "\x1b[1mfoo \x1b[31mbar\x1b[0m baz \x1b[32mqux quux\x1b[0m"
+    expected = [
+        "\x1b[1mfoo \x1b[31mbar\x1b[0m",
+        "baz \x1b[32mqux\x1b[0m",
+        "\x1b[32mquux\x1b[0m",
+    ]
+    assert utils.color_wrap(text, 8) == expected
+    assert utils.color_wrap("\x1b[1m" + "x" * 12, 5) == [
+        "\x1b[1mxxxxx\x1b[0m", "\x1b[1mxxxxx\x1b[0m", "\x1b[1mxx\x1b[0m"]
+
+
+def test_color_wrap_wide():
+    assert utils.display_width('\x1b[31m日本語\x1b[0m abc') == 10
+    assert utils.color_wrap('日本語 日本語 日本語', 13) == ['日本語 日本語', '日本語']
+    assert utils.color_wrap('日本語日本語', 5) == ['日本', '語日', '本語']
+
+
+COLOR_WRAP_TEXT = \
+    'A well-known sentence\twith  some spaces, a --option and a-very-long-word-indeed.'
+
+
+@pytest.mark.skipif(sys.version_info < (3, 10),
+                    reason='textwrap only breaks long words after hyphens since python 3.10')
+def test_color_wrap_like_textwrap():
+    for width in range(1, len(COLOR_WRAP_TEXT) + 2):
+        assert utils.color_wrap(COLOR_WRAP_TEXT, width) == [
+            line.rstrip() for line in textwrap.wrap(COLOR_WRAP_TEXT, width) if line.strip()]
+
+
+def test_color_wrap_hyphens():
+    """long words are broken after hyphens"""
+    assert utils.color_wrap(COLOR_WRAP_TEXT, 3)[-10:] == [
+        'and', 'a-', 'ver', 'y-l', 'ong', '-wo', 'rd-', 'ind', 'eed', '.']
+    assert utils.color_wrap('a-very-long', 4) == ['a-', 'very', '-', 'long']
+    # leading hyphens are not enough
+    assert utils.color_wrap('--- a---b', 2) == ['--', '-', 'a-', '--', 'b']
+
+
 def test_get_weekday_occurrence():
     assert get_weekday_occurrence(datetime(2017, 3, 1)) == (2, 1)
     assert get_weekday_occurrence(datetime(2017, 3, 2)) == (3, 1)
@@ -86,3 +86,35 @@ def test_etag_sleep(tmpdir, sleep_time):
     new_etag = vdir.get_etag_from_file(fpath)
 
     assert old_etag != new_etag
+
+
+def test_upload_unsynced(tmpdir):
+    path = str(tmpdir)
+    storage = vdir.Vdir(path, '.ics')
+    item = vdir.Item('BEGIN:VEVENT\nUID:foo\nEND:VEVENT')
+    href, etag = storage.upload(item, sync=False)
+    storage.sync([href])
+    assert href == 'foo.ics'
+    assert os.listdir(path) == ['foo.ics']
+    assert storage.get(href)[0].raw == item.raw
+    assert etag == storage.get(href)[1]
+    with pytest.raises(vdir.AlreadyExistingError):
+        storage.upload(item, sync=False)
+    assert os.listdir(path) == ['foo.ics']
+
+
+def test_update_delete_unsynced(tmpdir):
+    path = str(tmpdir)
+    storage = vdir.Vdir(path, '.ics')
+    href, etag = storage.upload(vdir.Item('BEGIN:VEVENT\nUID:foo\nEND:VEVENT'))
+    item = vdir.Item('BEGIN:VEVENT\nUID:foo\nSUMMARY:bar\nEND:VEVENT')
+    etag = storage.update(href, item, etag, sync=False)
+    storage.sync([href])
+    assert os.listdir(path) == ['foo.ics']
+    assert storage.get(href)[0].raw == item.raw
+    assert etag == storage.get(href)[1]
+    with pytest.raises(vdir.WrongEtagError):
+        storage.delete(href, 'wrong', sync=False)
+    storage.delete(href, etag, sync=False)
+    storage.sync([])
+    assert os.listdir(path) == []
@@ -77,3 +77,22 @@ def test_bogota(pytz_version):
         vbogota.insert(4, b'RDATE:20380118T221407')
 
     assert create_timezone(bogota, atime, atime).to_ical().split(b'\r\n') == vbogota
+
+
+def test_berlin_cached():
+    """generating VTIMEZONEs for overlapping ranges should not change the result"""
+    ctime = datetime(2015, 10, 28, 10, 10)
+    dtime = datetime(2012, 10, 28, 10, 10)
+    vberlin_wide = create_timezone(berlin, dtime, btime)
+    assert create_timezone(berlin, dtime, btime) is vberlin_wide
+
+    vberlin = create_timezone(berlin, ctime, ctime).to_ical()
+    assert b'RDATE' not in vberlin
+    assert b'DTSTART;VALUE=DATE-TIME:20151025T020000' in vberlin
+    assert b'DTSTART;VALUE=DATE-TIME:20160327T030000' in vberlin
+
+    vberlin_rdate = create_timezone(berlin, atime, btime).to_ical()
+    assert b'RDATE:20151025T020000,20161030T020000' in vberlin_rdate
+    assert b'RDATE:20160327T030000' in vberlin_rdate
+    assert b'DTSTART;VALUE=DATE-TIME:2012' not in vberlin_rdate
+    assert b'RDATE:2012' not in vberlin_rdate